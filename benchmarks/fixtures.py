@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from db.conn import DatabaseConnection
+from db.migrate import migrate
+
+# Scratch schema the benchmarks run in, dropped afterwards
+BENCH_SCHEMA = "benchmark"
+
+CATEGORIES = ["Linux", "DevOps", "Docker", "SQL", "Code", "CMS", "Bash", "Kubernetes",
+              "Networking", "Security", "Cloud", "Python"]
+
+# Rows per unit of scale
+BASE_SIZES = {"users": 2000, "questions": 5000, "games": 20000}
+
+def fixture_sizes(scale: float) -> Dict[str, int]:
+    return {name: max(int(count * scale), 1) for name, count in BASE_SIZES.items()}
+
+def load_fixture(cur, users: int, questions: int, games: int, seed: float = 0.42) -> None:
+    """Fill an empty schema with a plausible, reproducible history.
+
+    Player activity is heavily skewed (a few players account for most games),
+    games have 1-10 rounds spread over the last 90 days, difficulties follow
+    an easy-heavy mix, and about 5% of rounds were never answered. Stats are
+    rebuilt at the end so the summary tables match.
+    """
+    cur.execute("SELECT setseed(%s)", (seed,))
+    cur.execute("""
+        INSERT INTO users (username)
+        SELECT 'bench_user_' || i FROM generate_series(1, %(users)s) AS i
+    """, {"users": users})
+    cur.execute("""
+        INSERT INTO questions (question, description, explanation, category, difficulty,
+                               answers, correct_answers, fingerprint)
+        SELECT 'Benchmark question ' || s.i || '?',
+               'Pick the right option for question ' || s.i,
+               'Option ' || (1 + s.i %% 4) || ' is the right one',
+               (%(categories)s::text[])[1 + floor(random() * array_length(%(categories)s::text[], 1))::int],
+               CASE WHEN s.r < 0.5 THEN 'Easy' WHEN s.r < 0.85 THEN 'Medium' ELSE 'Hard' END,
+               '["Option 1", "Option 2", "Option 3", "Option 4"]',
+               (SELECT jsonb_agg(k = 1 + s.i %% 4) FROM generate_series(1, 4) AS k),
+               md5('bench' || s.i) || md5('question' || s.i)
+        FROM (SELECT i, random() AS r FROM generate_series(1, %(questions)s) AS i) AS s
+    """, {"questions": questions, "categories": CATEGORIES})
+    cur.execute("""
+        INSERT INTO games (user_id, rounds, score, created_at)
+        SELECT 1 + floor(%(users)s * power(random(), 3))::int,
+               1 + floor(random() * 10)::int,
+               0,
+               now() - random() * interval '90 days'
+        FROM generate_series(1, %(games)s)
+    """, {"users": users, "games": games})
+    # The correct option of question q is index q %% 4, see above
+    cur.execute("""
+        INSERT INTO game_questions (game_id, question_id, selected_answer_index, is_correct, answered_at)
+        SELECT game_id, question_id,
+               CASE WHEN answered THEN
+                   CASE WHEN correct THEN question_id %% 4
+                        ELSE (question_id %% 4 + 1 + floor(random() * 3)::int) %% 4 END
+               END,
+               CASE WHEN answered THEN correct END,
+               CASE WHEN answered THEN created_at + r * interval '20 seconds' END
+        FROM (
+            SELECT g.id AS game_id, g.created_at, r,
+                   1 + floor(random() * %(questions)s)::int AS question_id,
+                   random() < 0.95 AS answered,
+                   random() < 0.6 AS correct
+            FROM games AS g, generate_series(1, g.rounds) AS r
+        ) AS rounds
+        ON CONFLICT (game_id, question_id) DO NOTHING
+    """, {"questions": questions})
+    cur.execute("""
+        UPDATE games SET score = s.correct
+        FROM (
+            SELECT game_id, count(*) FILTER (WHERE is_correct) AS correct
+            FROM game_questions GROUP BY game_id
+        ) AS s
+        WHERE games.id = s.game_id
+    """)
+    cur.execute("SELECT refresh_quiz_stats()")
+
+@contextmanager
+def bench_database(scale: float = 1.0, seed: float = 0.42, maxconn: int = 10) -> Iterator[DatabaseConnection]:
+    """A pool bound to a freshly migrated and loaded scratch schema"""
+    setup = DatabaseConnection(minconn=1, maxconn=1)
+    try:
+        with setup.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+
+        db = DatabaseConnection(minconn=1, maxconn=maxconn, options=f"-c search_path={BENCH_SCHEMA}")
+        try:
+            migrate(db)
+            with db.connection() as conn, conn.cursor() as cur:
+                load_fixture(cur, seed=seed, **fixture_sizes(scale))
+            conn = db.get_connection()
+            try:
+                # ANALYZE can't run inside the transaction that loaded the rows
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute("ANALYZE")
+            finally:
+                conn.autocommit = False
+                db.return_connection(conn)
+            yield db
+        finally:
+            db.close_all_connections()
+            with setup.connection() as conn, conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    finally:
+        setup.close_all_connections()
\ No newline at end of file
@@ -0,0 +1,221 @@
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List
+from db.conn import DatabaseConnection, LatencyHistogram
+from db import statements
+from db.schema import Question
+from main import QuizApplication
+from .fixtures import bench_database
+from .stub_api import StubQuizAPI
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+OPERATIONS = ("register", "start_game", "play_game", "dashboard")
+
+# Prepared statements listed per level, by total time
+TOP_STATEMENTS = 8
+
+class OperationStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        self.histogram.observe(elapsed)
+        if not ok:
+            with self._lock:
+                self.errors += 1
+
+class ErrorCounter(logging.Handler):
+    """Counts errors the application only logs, e.g. failures inside play_game"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.count += 1
+
+class LoadProfile:
+    def __init__(self, players: int, games_per_player: int = 3, rounds: int = 5,
+                 think_time: float = 0.5, accuracy: float = 0.6, arrival_rate: float = 0.0,
+                 dashboard_every: int = 1):
+        self.players = players
+        self.games_per_player = games_per_player
+        self.rounds = rounds
+        self.think_time = think_time  # mean seconds per answer, exponentially distributed
+        self.accuracy = accuracy
+        self.arrival_rate = arrival_rate  # players per second, 0 starts everyone at once
+        self.dashboard_every = dashboard_every  # games between dashboard views, 0 never
+
+class SimulatedPlayer:
+    """Drives one QuizApplication through register, games and the dashboard without input()"""
+
+    def __init__(self, app: QuizApplication, profile: LoadProfile, stats: Dict[str, OperationStats],
+                 username: str, rng: random.Random):
+        self.app = app
+        self.profile = profile
+        self.stats = stats
+        self.username = username
+        self.rng = rng
+        self.thought = 0.0
+
+    def timed(self, name: str, operation: Callable, deduct_thinking: bool = False):
+        self.thought = 0.0
+        started = time.perf_counter()
+        result, ok = None, False
+        try:
+            result = operation()
+            ok = result is not None or name == "play_game"
+            return result
+        except Exception:
+            return None
+        finally:
+            elapsed = time.perf_counter() - started
+            if deduct_thinking:
+                elapsed -= self.thought
+            self.stats[name].record(elapsed, ok)
+
+    def choose_answer(self, question: Question) -> int:
+        pause = self.rng.expovariate(1 / self.profile.think_time) if self.profile.think_time else 0.0
+        time.sleep(pause)
+        self.thought += pause
+        right = [i for i, correct in enumerate(question.correct_answers[:len(question.answers)]) if correct]
+        wrong = [i for i in range(len(question.answers)) if i not in right]
+        if right and (not wrong or self.rng.random() < self.profile.accuracy):
+            return self.rng.choice(right)
+        return self.rng.choice(wrong)
+
+    def run(self) -> None:
+        user = self.timed("register", lambda: self.app.register_user(self.username))
+        if user is None:
+            return
+        for number in range(1, self.profile.games_per_player + 1):
+            game = self.timed("start_game", lambda: self.app.start_game(user.id, self.profile.rounds))
+            if game is not None:
+                self.timed("play_game", lambda: self.app.play_game(game.id, self.choose_answer),
+                           deduct_thinking=True)
+            if self.profile.dashboard_every and number % self.profile.dashboard_every == 0:
+                self.timed("dashboard", self.app.load_dashboard)
+
+def run_level(dsn: Dict, profile: LoadProfile, pool_size: int, seed: int = 42) -> Dict:
+    """Run one load level on a fresh pool and return its statistics"""
+    db = DatabaseConnection(minconn=0, maxconn=pool_size, **dsn)
+    quiz_api = StubQuizAPI()
+    stats = {name: OperationStats() for name in OPERATIONS}
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    statements.registry.reset_stats()
+    apps: List[QuizApplication] = []
+    threads: List[threading.Thread] = []
+    started = time.perf_counter()
+    try:
+        for i in range(profile.players):
+            if profile.arrival_rate and i:
+                time.sleep(rng.expovariate(profile.arrival_rate))
+            app = QuizApplication("load-test", db=db, quiz_api=quiz_api)
+            apps.append(app)
+            player = SimulatedPlayer(app, profile, stats, f"load_{run_id}_{i}", random.Random(rng.random()))
+            thread = threading.Thread(target=player.run, name=f"player-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    finally:
+        elapsed = time.perf_counter() - started
+        for app in apps:
+            app.answer_recorder.close()
+        logging.getLogger().removeHandler(errors)
+        pool = db.stats()
+        db.close_all_connections()
+    return {"players": profile.players, "elapsed": elapsed, "stats": stats, "pool": pool,
+            "statements": statements.registry.stats(), "logged_errors": errors.count, "api_calls": quiz_api.calls}
+
+def format_histogram(snapshot: Dict) -> str:
+    """Non-empty buckets of a LatencyHistogram snapshot as "<=bound:count" pairs"""
+    parts, previous = [], 0
+    for bound, cumulative in snapshot["buckets"]:
+        if cumulative > previous:
+            label = "+Inf" if bound == float("inf") else f"{bound * 1000:g}ms"
+            parts.append(f"<={label}:{cumulative - previous}")
+        previous = cumulative
+    return " ".join(parts)
+
+def print_level(result: Dict, pool_size: int) -> None:
+    print(f"\n=== {result['players']} players, {result['elapsed']:.1f}s ===")
+    print(f"{'operation':<11} {'count':>6} {'errors':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, op in result["stats"].items():
+        h = op.histogram
+        rate = op.errors / h.count * 100 if h.count else 0.0
+        print(f"{name:<11} {h.count:>6} {op.errors:>7} {rate:>5.1f}% {h.percentile(50) * 1000:>8.1f} "
+              f"{h.percentile(95) * 1000:>8.1f} {h.percentile(99) * 1000:>8.1f} {h.max * 1000:>8.1f}")
+    for name, op in result["stats"].items():
+        if op.histogram.count:
+            print(f"  {name}: {format_histogram(op.histogram.snapshot())}")
+    pool = result["pool"]
+    print(f"pool: max in use {pool['max_in_use']}/{pool_size}, {pool['checkouts']} checkouts, "
+          f"{pool['timeouts']} timeouts, wait max {pool['wait']['max'] * 1000:.1f}ms, "
+          f"mean {pool['wait']['sum'] / pool['wait']['count'] * 1000 if pool['wait']['count'] else 0:.2f}ms")
+    print(f"  wait: {format_histogram(pool['wait'])}")
+    top = sorted(result["statements"].items(), key=lambda item: item[1]["time"]["sum"], reverse=True)
+    if top:
+        print("statements by total time:")
+    for name, statement in top[:TOP_STATEMENTS]:
+        timing = statement["time"]
+        print(f"  {name:<26} {statement['calls']:>7} calls {statement['prepares']:>4} prepares "
+              f"{timing['sum'] / timing['count'] * 1000:>7.2f}ms mean {timing['sum'] * 1000:>9.1f}ms total")
+    print(f"logged errors: {result['logged_errors']}, QuizAPI calls: {result['api_calls']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated players against QuizApplication to find where it falls over")
+    parser.add_argument("--players", default="10,50,100",
+                        help="comma-separated concurrency levels, run one after another")
+    parser.add_argument("--games", type=int, default=3, help="games per player")
+    parser.add_argument("--rounds", type=int, default=5, help="questions per game")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds a player takes per answer")
+    parser.add_argument("--accuracy", type=float, default=0.6, help="share of questions answered correctly")
+    parser.add_argument("--arrival-rate", type=float, default=0.0,
+                        help="players joining per second (0 = all at once)")
+    parser.add_argument("--dashboard-every", type=int, default=1, help="games between dashboard views (0 = never)")
+    parser.add_argument("--pool-size", type=int, default=10, help="database connections shared by all players")
+    parser.add_argument("--scale", type=float, default=1.0, help="fixture size multiplier")
+    parser.add_argument("--max-error-rate", type=float, default=0.05,
+                        help="stop ramping once a level's error rate exceeds this")
+    args = parser.parse_args()
+
+    # Players print like the CLI would and log every game at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    levels = [int(level) for level in args.players.split(",") if level.strip()]
+    summary = []
+    with bench_database(args.scale) as bench_db:
+        for players in levels:
+            profile = LoadProfile(players, args.games, args.rounds, args.think_time, args.accuracy,
+                                  args.arrival_rate, args.dashboard_every)
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                result = run_level(bench_db.dsn, profile, args.pool_size)
+            print_level(result, args.pool_size)
+            calls = sum(op.histogram.count for op in result["stats"].values())
+            failed = sum(op.errors for op in result["stats"].values()) + result["logged_errors"]
+            error_rate = failed / calls if calls else 0.0
+            games = result["stats"]["play_game"].histogram.count
+            summary.append((players, games / result["elapsed"], error_rate,
+                            result["stats"]["start_game"].histogram.percentile(95),
+                            result["pool"]["wait"]["max"], result["pool"]["timeouts"]))
+            if error_rate > args.max_error_rate:
+                print(f"\nError rate {error_rate:.1%} above {args.max_error_rate:.1%}, stopping the ramp")
+                break
+
+    print(f"\n{'players':>8} {'games/s':>8} {'err%':>6} {'start p95':>10} {'pool wait max':>14} {'timeouts':>9}")
+    for players, rate, error_rate, start_p95, wait_max, timeouts in summary:
+        print(f"{players:>8} {rate:>8.1f} {error_rate * 100:>5.1f}% {start_p95 * 1000:>8.1f}ms "
+              f"{wait_max * 1000:>12.1f}ms {timeouts:>9}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
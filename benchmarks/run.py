@@ -0,0 +1,196 @@
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from db.conn import DatabaseConnection
+from db.cache import EntityCache
+from db.repository import UserRepository, QuestionRepository, GameRepository
+from db.stats import StatsRepository
+from main import QuizApplication
+from game_logic import to_question
+from .fixtures import bench_database, fixture_sizes
+from .stub_api import StubQuizAPI
+from .timing import measure, load_baseline, save_baseline, find_regressions
+import argparse
+import logging
+import os
+import random
+import sys
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+# name -> factory(db, app, sizes, rng, runs) returning the timed operation,
+# where runs is the total number of calls it will get (warmup included)
+Benchmark = Callable[[DatabaseConnection, QuizApplication, Dict[str, int], random.Random, int], Callable[[int], object]]
+
+def benchmark_cases() -> List[Tuple[str, Benchmark]]:
+    def pick(rng: random.Random, upper: int, runs: int) -> List[int]:
+        return [rng.randint(1, upper) for _ in range(runs)]
+
+    def user_by_id(db, app, sizes, rng, runs):
+        users, ids = UserRepository(db), pick(rng, sizes["users"], runs)
+        return lambda i: users.get_user_by_id(ids[i])
+
+    def user_by_username(db, app, sizes, rng, runs):
+        users, ids = UserRepository(db), pick(rng, sizes["users"], runs)
+        return lambda i: users.get_user_by_username(f"bench_user_{ids[i]}")
+
+    def user_by_username_cached(db, app, sizes, rng, runs):
+        # Logged-in players are looked up over and over
+        users, ids = UserRepository(db, EntityCache()), pick(rng, 50, runs)
+        return lambda i: users.get_user_by_username(f"bench_user_{ids[i]}")
+
+    def question_by_id(db, app, sizes, rng, runs):
+        questions, ids = QuestionRepository(db), pick(rng, sizes["questions"], runs)
+        return lambda i: questions.get_question_by_id(ids[i])
+
+    def questions_by_ids(db, app, sizes, rng, runs):
+        questions = QuestionRepository(db)
+        batches = [pick(rng, sizes["questions"], 10) for _ in range(runs)]
+        return lambda i: questions.get_questions_by_ids(batches[i])
+
+    def game(db, app, sizes, rng, runs):
+        games, ids = GameRepository(db), pick(rng, sizes["games"], runs)
+        return lambda i: games.get_game(ids[i])
+
+    def game_rounds(db, app, sizes, rng, runs):
+        games, ids = GameRepository(db), pick(rng, sizes["games"], runs)
+        return lambda i: games.get_game_rounds(ids[i])
+
+    def history_first_page(db, app, sizes, rng, runs):
+        # Low ids are the most active players
+        games, ids = GameRepository(db), pick(rng, 20, runs)
+        return lambda i: games.get_games_page(ids[i], 20)
+
+    def history_deep_page(db, app, sizes, rng, runs):
+        games, ids = GameRepository(db), pick(rng, 20, runs)
+        cursors = {}
+        for user_id in set(ids):
+            last = None
+            for last in games.iter_game_pages(user_id, 20):
+                pass
+            # Just past the first game of the last page: the oldest games
+            cursors[user_id] = (last[0].created_at, last[0].id) if last else None
+        return lambda i: games.get_games_page(ids[i], 20, cursors[ids[i]])
+
+    def create_game_with_questions(db, app, sizes, rng, runs):
+        games, users, api = GameRepository(db), pick(rng, sizes["users"], runs), StubQuizAPI()
+        batches = [[to_question(q) for q in api.get_questions(limit=10)] for _ in range(runs)]
+        return lambda i: games.create_game_with_questions(users[i], 10, batches[i])
+
+    def save_answers(db, app, sizes, rng, runs):
+        games, ids = GameRepository(db), pick(rng, sizes["games"], runs)
+        rounds = {game_id: games.get_game_questions(game_id) for game_id in set(ids)}
+
+        def run(i):
+            game_id = ids[i]
+            answers = [(game_id, gq.question_id, 0, gq.question_id % 4 == 0, datetime.now())
+                       for gq in rounds[game_id]]
+            games.save_answers(answers, {game_id: sum(answer[3] for answer in answers)})
+        return run
+
+    def answer_question(db, app, sizes, rng, runs):
+        questions, games, ids = QuestionRepository(db), GameRepository(db), pick(rng, sizes["games"], runs)
+        rounds = {game_id: games.get_game_questions(game_id) for game_id in set(ids)}
+        pairs = [(game_id, rounds[game_id][0].question_id) for game_id in ids if rounds[game_id]]
+        return lambda i: questions.answer_question(*pairs[i % len(pairs)], 1, False)
+
+    def update_score(db, app, sizes, rng, runs):
+        games, ids = GameRepository(db), pick(rng, sizes["games"], runs)
+        return lambda i: games.update_score(ids[i], i % 4)
+
+    def dashboard(db, app, sizes, rng, runs):
+        stats_repo = StatsRepository(db)
+        return lambda i: stats_repo.get_dashboard()
+
+    def leaderboard_around(db, app, sizes, rng, runs):
+        leaderboard, ids = app.load_leaderboard(), pick(rng, sizes["users"], runs)
+        return lambda i: (leaderboard.rank(ids[i]), leaderboard.around(ids[i], 5))
+
+    def start_game(db, app, sizes, rng, runs):
+        users = pick(rng, sizes["users"], runs)
+        return lambda i: app.start_game(users[i], 10)
+
+    def play_game(db, app, sizes, rng, runs):
+        users = pick(rng, sizes["users"], runs)
+        game_ids = [app.start_game(users[i], 10).id for i in range(runs)]
+        # Scripted player: right on every other question
+        choose = lambda question: question.correct_answers.index(True) if question.id % 2 else 0
+        return lambda i: app.play_game(game_ids[i], choose)
+
+    return [
+        ("UserRepository.get_user_by_id", user_by_id),
+        ("UserRepository.get_user_by_username", user_by_username),
+        ("UserRepository.get_user_by_username[cached]", user_by_username_cached),
+        ("QuestionRepository.get_question_by_id", question_by_id),
+        ("QuestionRepository.get_questions_by_ids[10]", questions_by_ids),
+        ("QuestionRepository.answer_question", answer_question),
+        ("GameRepository.get_game", game),
+        ("GameRepository.get_game_rounds", game_rounds),
+        ("GameRepository.get_games_page[first]", history_first_page),
+        ("GameRepository.get_games_page[last]", history_deep_page),
+        ("GameRepository.create_game_with_questions[10]", create_game_with_questions),
+        ("GameRepository.save_answers", save_answers),
+        ("GameRepository.update_score", update_score),
+        ("StatsRepository.get_dashboard", dashboard),
+        ("Leaderboard.rank+around", leaderboard_around),
+        ("QuizApplication.start_game[10]", start_game),
+        ("QuizApplication.play_game[10]", play_game),
+    ]
+
+def run_benchmarks(scale: float, iterations: int, warmup: int, only: str = "",
+                   seed: int = 42) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with bench_database(scale) as db:
+        app = QuizApplication("benchmark", db=db, quiz_api=StubQuizAPI())
+        sizes = fixture_sizes(scale)
+        try:
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                for name, benchmark in benchmark_cases():
+                    if only and only not in name:
+                        continue
+                    operation = benchmark(db, app, sizes, random.Random(f"{seed}:{name}"), warmup + iterations)
+                    results[name] = measure(operation, iterations, warmup)
+                    print(f"{name}: done", file=sys.stderr)
+        finally:
+            app.close()
+    return results
+
+def print_report(results: Dict[str, Dict[str, float]]) -> None:
+    width = max(len(name) for name in results) if results else 10
+    print(f"{'benchmark':<{width}} {'ops/s':>9} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, r in results.items():
+        print(f"{name:<{width}} {r['ops_per_sec']:>9.1f} {r['mean']:>8.2f} {r['p50']:>8.2f} "
+              f"{r['p95']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repositories, game flow and the dashboard on synthetic data")
+    parser.add_argument("--scale", type=float, default=1.0, help="fixture size multiplier (1.0 = 2k users, 5k questions, 20k games)")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed calls before timing")
+    parser.add_argument("--only", default="", help="run only benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50/p95 slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="ignore slowdowns smaller than this many ms")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmarks(args.scale, args.iterations, args.warmup, args.only)
+    print_report(results)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, {"scale": args.scale, "iterations": args.iterations,
+                                               "created_at": datetime.now().isoformat()})
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        regressions = find_regressions(results, load_baseline(args.baseline), args.tolerance, args.min_delta)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+from typing import Dict, List, Optional
+import itertools
+import threading
+import time
+
+class StubQuizAPI:
+    """Stand-in for QuizAPI that makes up questions in the same JSON shape.
+
+    Every question is new (ids keep increasing) so stored games exercise the
+    upsert path the way fresh API questions do. ``latency`` adds a fixed
+    sleep per request to simulate the network.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None) -> List[Dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            ids = [next(self._ids) for _ in range(limit)]
+        return [self._question(question_id, category, difficulty) for question_id in ids]
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _question(question_id: int, category: Optional[str], difficulty: Optional[str]) -> Dict:
+        correct = question_id % 4
+        return {
+            "id": question_id,
+            "question": f"Stub question {question_id}?",
+            "description": f"Generated question {question_id}",
+            "explanation": f"Answer {correct + 1} is correct",
+            "category": category or "Linux",
+            "difficulty": difficulty or "Easy",
+            "answers": {f"answer_{letter}": f"Option {i + 1}" if i < 4 else None
+                        for i, letter in enumerate("abcdef")},
+            "correct_answers": {f"answer_{letter}_correct": "true" if i == correct else "false"
+                                for i, letter in enumerate("abcdef")},
+            "tags": []
+        }
\ No newline at end of file
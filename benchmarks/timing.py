@@ -0,0 +1,70 @@
+from typing import Callable, Dict, List
+import json
+import time
+
+# Metrics compared against the baseline; higher is worse for all of them
+COMPARED_METRICS = ("p50", "p95")
+
+def percentile(samples: List[float], p: float) -> float:
+    """Linear-interpolated p-th percentile (0-100) of unsorted samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """Latencies in milliseconds and throughput in operations per second"""
+    return {
+        "count": len(samples),
+        "ops_per_sec": len(samples) / elapsed if elapsed else 0.0,
+        "mean": sum(samples) / len(samples) * 1000 if samples else 0.0,
+        "p50": percentile(samples, 50) * 1000,
+        "p95": percentile(samples, 95) * 1000,
+        "p99": percentile(samples, 99) * 1000,
+        "max": max(samples) * 1000 if samples else 0.0
+    }
+
+def measure(operation: Callable[[int], object], iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """Time ``iterations`` calls of ``operation(i)`` after ``warmup`` untimed ones.
+
+    ``i`` counts on from the warmup calls, so every call gets its own input.
+    """
+    for i in range(warmup):
+        operation(i)
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        operation(warmup + i)
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples, time.perf_counter() - started)
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]], meta: Dict) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     tolerance: float, min_delta_ms: float = 0.5) -> List[str]:
+    """Benchmarks whose latency grew by more than ``tolerance`` (0.25 = 25%).
+
+    Differences under ``min_delta_ms`` are ignored, since sub-millisecond
+    timings easily jitter by more than the tolerance between runs.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric, 0.0), result[metric]
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{name} {metric}: {before:.2f}ms -> {after:.2f}ms "
+                                   f"(+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
\ No newline at end of file
@@ -0,0 +1,114 @@
+from .conn import DatabaseConnection
+from .leaderboard import Leaderboard
+from .repository import GameRepository
+from datetime import datetime
+from os import environ
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AnswerRecorder:
+    """Write-behind buffer for game answers.
+
+    Answers are kept in memory and written together with the game's final
+    score in one transaction by GameRepository.save_answers. Pending answers
+    are also flushed once ``max_pending`` of them have piled up, when the
+    oldest has waited ``max_delay`` seconds, and on close().
+    ``synchronous_commit`` is the Postgres durability level used for those
+    transactions (see SYNCHRONOUS_COMMIT_LEVELS in db.repository).
+    Scores reach ``leaderboard`` once they are written.
+    """
+
+    def __init__(self, db_connection: DatabaseConnection, max_pending: int = 100,
+                 max_delay: float = 2.0, synchronous_commit: Optional[str] = None,
+                 leaderboard: Optional[Leaderboard] = None):
+        self.game_repo = GameRepository(db_connection, leaderboard)
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.synchronous_commit = synchronous_commit or environ.get('ANSWER_SYNCHRONOUS_COMMIT', 'on')
+        # (game_id, question_id) -> (answer_index, is_correct, answered_at); the
+        # latest answer for a question replaces any earlier pending one
+        self._pending: Dict[Tuple[int, int], Tuple[int, bool, datetime]] = {}
+        self._scores: Dict[int, int] = {}
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def record(self, game_id: int, question_id: int, answer_index: int, is_correct: bool) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("answer recorder is closed")
+            self._pending[(game_id, question_id)] = (answer_index, is_correct, datetime.now())
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._arm_timer()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def finish_game(self, game_id: int, score: int) -> bool:
+        """Queue the final score and flush it with everything pending"""
+        with self._lock:
+            self._scores[game_id] = score
+        return self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._scores)
+
+    def flush(self) -> bool:
+        """Write everything buffered so far; on failure it stays buffered for the next flush"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                scores, self._scores = self._scores, {}
+                self._oldest = None
+                self._cancel_timer()
+            if not pending and not scores:
+                return True
+            answers = [(game_id, question_id, *answer) for (game_id, question_id), answer in pending.items()]
+            try:
+                self.game_repo.save_answers(answers, scores, self.synchronous_commit)
+                self.flushes += 1
+                return True
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Failed to write {len(answers)} answer(s) and {len(scores)} score(s): {e}")
+                with self._lock:
+                    # Anything recorded meanwhile is newer than what failed
+                    for key, answer in pending.items():
+                        self._pending.setdefault(key, answer)
+                    for game_id, score in scores.items():
+                        self._scores.setdefault(game_id, score)
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+                        if not self._closed:
+                            self._arm_timer()
+                return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._cancel_timer()
+        if not self.flush():
+            logger.error(f"Discarding {self.pending()} unsaved answer(s) and score(s) at shutdown")
+
+    def _arm_timer(self) -> None:
+        self._timer = threading.Timer(self.max_delay, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _flush_in_background(self) -> None:
+        self.flush()
\ No newline at end of file
@@ -0,0 +1,80 @@
+from .conn import LatencyHistogram, PoolTimeoutError
+from contextlib import asynccontextmanager
+from os import environ
+from typing import AsyncIterator, Dict, Optional
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+import time
+
+class AsyncDatabaseConnection:
+    """asyncio Postgres pool on psycopg 3, the counterpart of DatabaseConnection.
+
+    Coroutines hold a connection only inside ``connection()``, so many
+    sessions share a few connections instead of a thread each. Settings come
+    from the same POSTGRES_* variables; checkouts that wait longer than
+    ``timeout`` raise PoolTimeoutError like the blocking pool. Call open()
+    from the running event loop before use and close() when done.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 10.0,
+                 max_lifetime: float = 1800.0, max_idle: float = 600.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.dsn = dict(
+            dbname=environ.get('POSTGRES_DB', 'postgres'),
+            user=environ.get('POSTGRES_USER', 'admin'),
+            password=environ.get('POSTGRES_PASSWORD', 'admin'),
+            host=environ.get('POSTGRES_HOST', 'localhost'),
+            port=environ.get('POSTGRES_PORT', '5432')
+        )
+        # Extra psycopg.connect arguments, e.g. options
+        self.dsn.update(connect_kwargs)
+        self._pool = AsyncConnectionPool(kwargs=self.dsn, min_size=minconn, max_size=maxconn,
+                                         timeout=timeout, max_lifetime=max_lifetime, max_idle=max_idle,
+                                         check=AsyncConnectionPool.check_connection, open=False)
+
+        self.wait_histogram = LatencyHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+
+    async def open(self) -> None:
+        await self._pool.open()
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+    @asynccontextmanager
+    async def connection(self, timeout: Optional[float] = None) -> AsyncIterator[AsyncConnection]:
+        """Check out a connection, committing on success and rolling back on error"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        try:
+            conn = await self._pool.getconn(timeout)
+        except PoolTimeout:
+            self.timeouts += 1
+            raise PoolTimeoutError(f"No database connection available after {timeout:.1f}s "
+                                   f"({self.maxconn} in use)")
+        self.checkouts += 1
+        self.wait_histogram.observe(time.monotonic() - started)
+        try:
+            yield conn
+            await conn.commit()
+        except Exception:
+            if not conn.closed:
+                await conn.rollback()
+            raise
+        finally:
+            await self._pool.putconn(conn)
+
+    def stats(self) -> Dict:
+        pool = self._pool.get_stats()
+        return {
+            "size": pool.get("pool_size", 0),
+            "idle": pool.get("pool_available", 0),
+            "waiting": pool.get("requests_waiting", 0),
+            "maxconn": self.maxconn,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait": self.wait_histogram.snapshot()
+        }
\ No newline at end of file
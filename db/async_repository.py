@@ -0,0 +1,281 @@
+from .async_conn import AsyncDatabaseConnection
+from .cache import EntityCache
+from .leaderboard import Leaderboard
+from .repository import (GAME_QUESTIONS_INSERT_SQL, GAME_ROUNDS_SQL, MARK_QUESTIONS_SEEN_SQL, QUESTION_COLUMNS,
+                         UPDATE_SCORE_SQL, games_page_query, question_row)
+from .schema import Question, Game, User, GameQuestion
+from .seen import SeenQuestions
+from . import stats
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+
+# QUESTION_UPSERT_SQL with one array per column instead of execute_values'
+# VALUES list, so any number of questions is a single prepared statement
+QUESTION_UPSERT_ARRAYS_SQL = """
+    INSERT INTO questions (
+        question, description, explanation,
+        category, difficulty, answers, correct_answers, fingerprint
+    )
+    SELECT * FROM unnest(
+        %s::text[], %s::text[], %s::text[], %s::text[],
+        %s::text[], %s::jsonb[], %s::jsonb[], %s::char(64)[]
+    )
+    ON CONFLICT (fingerprint) DO UPDATE SET fingerprint = EXCLUDED.fingerprint
+    RETURNING id, fingerprint, (xmax = 0) AS inserted
+"""
+
+def question_arrays(questions: List[Question]) -> List[list]:
+    """QUESTION_UPSERT_ARRAYS_SQL parameters, one list per column, filling in fingerprints"""
+    return [list(column) for column in zip(*(question_row(question) for question in questions))]
+
+class AsyncUserRepository:
+    """UserRepository for asyncio code, on an AsyncDatabaseConnection"""
+
+    def __init__(self, db_connection: AsyncDatabaseConnection, cache: Optional[EntityCache] = None):
+        self.db = db_connection
+        self.cache = cache
+
+    async def create_user(self, username: str) -> Optional[User]:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO users (username)
+                VALUES (%s)
+                RETURNING id
+            """, (username,))
+            user_id = (await cur.fetchone())[0]
+            await stats.record_user_created_async(cur, user_id)
+        user = User(id=user_id, username=username)
+        self._cache_user(user)
+        return user
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        if self.cache is not None:
+            user = self.cache.get("user", user_id)
+            if user is not None:
+                return user
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT id, username FROM users WHERE id = %s", (user_id,))
+            result = await cur.fetchone()
+        user = User(id=result[0], username=result[1]) if result else None
+        self._cache_user(user)
+        return user
+
+    async def get_user_by_username(self, username: str) -> Optional[User]:
+        if self.cache is not None:
+            user = self.cache.get("username", username)
+            if user is not None:
+                return user
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT id, username FROM users WHERE username = %s", (username,))
+            result = await cur.fetchone()
+        user = User(id=result[0], username=result[1]) if result else None
+        self._cache_user(user)
+        return user
+
+    async def get_seen_questions(self, user_id: int) -> SeenQuestions:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT seen_questions FROM users WHERE id = %s", (user_id,))
+            result = await cur.fetchone()
+        return SeenQuestions(result[0] if result else b"")
+
+    async def get_users_by_ids(self, user_ids: List[int]) -> Dict[int, User]:
+        """Bulk lookup by id; ids that don't exist are left out"""
+        found = self.cache.get_many("user", user_ids) if self.cache is not None else {}
+        missing = [user_id for user_id in user_ids if user_id not in found]
+        if not missing:
+            return found
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("SELECT id, username FROM users WHERE id = ANY(%s)", (missing,))
+            loaded = [User(id=row[0], username=row[1]) for row in await cur.fetchall()]
+        for user in loaded:
+            self._cache_user(user)
+            found[user.id] = user
+        return found
+
+    def _cache_user(self, user: Optional[User]) -> None:
+        if self.cache is not None and user is not None:
+            self.cache.put("user", user.id, user)
+            self.cache.put("username", user.username, user)
+
+class AsyncQuestionRepository:
+    """QuestionRepository for asyncio code, on an AsyncDatabaseConnection"""
+
+    def __init__(self, db_connection: AsyncDatabaseConnection, cache: Optional[EntityCache] = None):
+        self.db = db_connection
+        self.cache = cache
+
+    async def upsert_question(self, question: Question) -> Question:
+        """Store a question unless an identical one exists, returning it with the stored id"""
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(QUESTION_UPSERT_ARRAYS_SQL, question_arrays([question]))
+            question.id, _, inserted = await cur.fetchone()
+            if inserted:
+                await stats.record_questions_created_async(cur, [question.id])
+        if inserted:
+            self._cache_question(question)
+        return question
+
+    async def get_question_by_id(self, question_id: int) -> Optional[Question]:
+        if self.cache is not None:
+            question = self.cache.get("question", question_id)
+            if question is not None:
+                return question
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = %s", (question_id,))
+            result = await cur.fetchone()
+        question = Question(*result) if result else None
+        self._cache_question(question)
+        return question
+
+    async def get_questions_by_ids(self, question_ids: List[int]) -> Dict[int, Question]:
+        """Bulk lookup by id; ids that don't exist are left out"""
+        found = self.cache.get_many("question", question_ids) if self.cache is not None else {}
+        missing = [question_id for question_id in question_ids if question_id not in found]
+        if not missing:
+            return found
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ANY(%s)", (missing,))
+            loaded = [Question(*row) for row in await cur.fetchall()]
+        for question in loaded:
+            self._cache_question(question)
+            found[question.id] = question
+        return found
+
+    async def answer_question(self, game_id: int, question_id: int, answer_index: int, is_correct: bool) -> bool:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("""
+                WITH old AS (
+                    SELECT id, is_correct FROM game_questions
+                    WHERE game_id = %s AND question_id = %s
+                    FOR UPDATE
+                )
+                UPDATE game_questions
+                SET selected_answer_index = %s,
+                    is_correct = %s,
+                    answered_at = %s
+                FROM old
+                WHERE game_questions.id = old.id
+                RETURNING (game_questions.is_correct IS TRUE)::int - (old.is_correct IS TRUE)::int
+            """, (game_id, question_id, answer_index, is_correct, datetime.now()))
+            result = await cur.fetchone()
+            if result:
+                await stats.record_answers_async(cur, [(question_id, result[0])])
+        return result is not None
+
+    def _cache_question(self, question: Optional[Question]) -> None:
+        if self.cache is not None and question is not None:
+            self.cache.put("question", question.id, question)
+
+class AsyncGameRepository:
+    """GameRepository for asyncio code, on an AsyncDatabaseConnection.
+
+    Statements that don't depend on each other's results are sent in a
+    psycopg pipeline, so a game costs a few round trips however many
+    questions and summary tables it touches.
+    """
+
+    def __init__(self, db_connection: AsyncDatabaseConnection, leaderboard: Optional[Leaderboard] = None):
+        self.db = db_connection
+        self.leaderboard = leaderboard
+
+    async def create_game(self, user_id: int, rounds: int) -> Optional[Game]:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO games (user_id, rounds, score)
+                VALUES (%s, %s, 0)
+                RETURNING id, created_at
+            """, (user_id, rounds))
+            game_id, created_at = await cur.fetchone()
+            totals = await stats.record_game_created_async(cur, user_id, rounds)
+        self._rank(totals)
+        return Game(id=game_id, user_id=user_id, rounds=rounds, score=0, created_at=created_at)
+
+    async def create_game_with_questions(self, user_id: int, rounds: int, questions: List[Question]) -> Optional[Game]:
+        """Create a game, upsert its questions and link them in a single transaction"""
+        # ON CONFLICT can't touch the same row twice in one statement,
+        # so collapse duplicates within the batch first, and insert in
+        # fingerprint order like the blocking version
+        unique = {}
+        for question in questions:
+            unique.setdefault(question.compute_fingerprint(), question)
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            # One cursor per statement so all three results come back in one round trip
+            async with conn.pipeline():
+                game = await conn.execute("""
+                    INSERT INTO games (user_id, rounds, score)
+                    VALUES (%s, %s, 0)
+                    RETURNING id, created_at
+                """, (user_id, rounds))
+                user_totals = await conn.execute(stats.GAME_CREATED_SQL, (user_id, rounds))
+                upserted = await conn.execute(QUESTION_UPSERT_ARRAYS_SQL, question_arrays([unique[key] for key in sorted(unique)])) if unique else None
+                game_id, created_at = await game.fetchone()
+                totals = await user_totals.fetchone()
+                stored = await upserted.fetchall() if upserted else []
+            question_ids = {fingerprint: question_id for question_id, fingerprint, _ in stored}
+            for question in questions:
+                question.fingerprint = question.compute_fingerprint()
+                question.id = question_ids[question.fingerprint]
+
+            linked_ids = list(dict.fromkeys(question.id for question in questions))
+            async with conn.pipeline():
+                await stats.record_questions_created_async(
+                    cur, [question_id for question_id, _, inserted in stored if inserted])
+                if linked_ids:
+                    await stats.record_game_questions_async(cur, game_id, linked_ids)
+                    await cur.execute(GAME_QUESTIONS_INSERT_SQL, (game_id, linked_ids))
+                    await cur.execute(MARK_QUESTIONS_SEEN_SQL, (linked_ids, game_id))
+        self._rank(totals)
+        return Game(id=game_id, user_id=user_id, rounds=rounds, score=0, created_at=created_at)
+
+    async def update_score(self, game_id: int, score: int) -> bool:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(UPDATE_SCORE_SQL, (game_id, score))
+            result = await cur.fetchone()
+            totals = await stats.record_score_async(cur, *result) if result else None
+        self._rank(totals)
+        return result is not None
+
+    async def get_game(self, game_id: int) -> Optional[Game]:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute("""
+                SELECT id, user_id, rounds, score, created_at
+                FROM games WHERE id = %s
+            """, (game_id,))
+            result = await cur.fetchone()
+        return Game(*result) if result else None
+
+    async def get_games_page(self, user_id: Optional[int] = None, limit: int = 20,
+                             after: Optional[Tuple[datetime, int]] = None) -> List[Game]:
+        """Newest-first page of games, optionally for one user; see GameRepository.get_games_page"""
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(*games_page_query(user_id, limit, after))
+            return [Game(*row) for row in await cur.fetchall()]
+
+    async def get_game_rounds(self, game_id: int) -> List[Tuple[GameQuestion, Question]]:
+        """A game's questions joined with their full Question rows, in the order they were added"""
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            await cur.execute(GAME_ROUNDS_SQL, (game_id,))
+            return [
+                (GameQuestion(*row[:6]), Question(*row[6:]))
+                for row in await cur.fetchall()
+            ]
+
+    async def delete_game(self, game_id: int) -> bool:
+        async with self.db.connection() as conn, conn.cursor() as cur:
+            # stats.record_game_deleted, with the user's totals read back at the end
+            # so the whole delete is a single round trip
+            user_sql, *other_sql = stats.GAME_DELETED_SQL
+            async with conn.pipeline():
+                user_totals = await conn.execute(user_sql, (game_id,))
+                for sql in other_sql:
+                    await cur.execute(sql, (game_id,))
+                await cur.execute("DELETE FROM game_questions WHERE game_id = %s", (game_id,))
+                await cur.execute("DELETE FROM games WHERE id = %s", (game_id,))
+                totals = await user_totals.fetchone()
+        self._rank(totals)
+        return True
+
+    def _rank(self, totals: Optional[stats.UserTotals]) -> None:
+        """Pass a player's committed totals on to the leaderboard"""
+        if self.leaderboard is not None and totals is not None:
+            self.leaderboard.update(*totals)
\ No newline at end of file
@@ -0,0 +1,364 @@
+from .conn import DatabaseConnection
+from .cache import INVALIDATION_CHANNEL
+from .schema import Question
+from . import stats
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Streaming bulk import and export through COPY. Files are JSONL (one object
+# per line) or CSV with a header row, optionally gzipped; list columns
+# (answers, correct_answers) are JSON inside CSV cells. Imports go through a
+# temporary staging table one chunk per transaction, so memory stays bounded
+# by the chunk size, and exports COPY straight from the server to the file.
+
+FORMATS = ("jsonl", "csv")
+
+DEFAULT_CHUNK_SIZE = 10000
+
+QUESTION_COLUMNS = ("question", "description", "explanation", "category", "difficulty",
+                    "answers", "correct_answers")
+
+# Column limits from the questions table
+MAX_LENGTHS = {"question": 255, "description": 500, "explanation": 500, "category": 255, "difficulty": 255}
+
+# CSV with control characters as quote and delimiter never quotes a JSON
+# document (JSON escapes them) and, unlike COPY's text format, doesn't
+# escape its backslashes, so each row comes out as exactly one JSON line
+JSONL_COPY_OPTIONS = "FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02'"
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.invalid = 0
+        self.duplicates = 0  # repeated within a chunk of the file
+        self.inserted = 0
+        self.updated = 0
+        self.existing = 0  # already stored and left as is
+
+    def __str__(self) -> str:
+        return (f"{self.read} read, {self.inserted} inserted, {self.updated} updated, "
+                f"{self.existing} already stored, {self.duplicates} duplicate(s), {self.invalid} invalid")
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+@contextmanager
+def open_file(path: str, mode: str) -> Iterator[IO[str]]:
+    """Text file by path, gzipped for *.gz, or stdin/stdout for "-" """
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+    elif path.endswith(".gz"):
+        with gzip.open(path, mode + "t", encoding="utf-8", newline="") as f:
+            yield f
+    else:
+        with open(path, mode, encoding="utf-8", newline="") as f:
+            yield f
+
+def read_records(f: IO[str], fmt: str) -> Iterator[Tuple[int, object]]:
+    """(line number, record) pairs; records that can't be parsed are yielded as the error"""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError as e:
+            yield line_num, ValueError(f"invalid JSON: {e}")
+
+def parse_question(record: Dict) -> Question:
+    """Validate an imported record, raising ValueError with the reason"""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    values = {}
+    for column in ("answers", "correct_answers"):
+        value = record.get(column)
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise ValueError(f"{column} is not valid JSON")
+        values[column] = value
+    for column, limit in MAX_LENGTHS.items():
+        value = record.get(column)
+        value = "" if value is None else value
+        if not isinstance(value, str):
+            raise ValueError(f"{column} must be a string")
+        value = value.strip()
+        if len(value) > limit:
+            raise ValueError(f"{column} is longer than {limit} characters")
+        values[column] = value
+    for column in ("question", "category", "difficulty"):
+        if not values[column]:
+            raise ValueError(f"{column} is required")
+
+    answers, correct_answers = values["answers"], values["correct_answers"]
+    if not isinstance(answers, list) or not 2 <= len(answers) <= 6:
+        raise ValueError("answers must be a list of 2 to 6 options")
+    if not all(isinstance(answer, str) and answer.strip() for answer in answers):
+        raise ValueError("answers must be non-empty strings")
+    if (not isinstance(correct_answers, list) or len(correct_answers) < len(answers)
+            or not all(isinstance(correct, bool) for correct in correct_answers)):
+        raise ValueError("correct_answers must be a boolean for every answer")
+    if not any(correct_answers[:len(answers)]):
+        raise ValueError("no answer is marked correct")
+
+    question = Question(0, values["question"], values["description"], values["explanation"],
+                        values["category"], values["difficulty"], answers, correct_answers)
+    question.fingerprint = question.compute_fingerprint()
+    return question
+
+def stage_questions(cur, questions: List[Question]) -> None:
+    """COPY a chunk into the question_import staging table"""
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS question_import (
+            question TEXT, description TEXT, explanation TEXT, category TEXT, difficulty TEXT,
+            answers JSONB, correct_answers JSONB, fingerprint CHAR(64)
+        ) ON COMMIT DELETE ROWS
+    """)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for q in questions:
+        writer.writerow((q.question, q.description, q.explanation, q.category, q.difficulty,
+                         json.dumps(q.answers), json.dumps(q.correct_answers), q.fingerprint))
+    buffer.seek(0)
+    cur.copy_expert(f"COPY question_import ({', '.join(QUESTION_COLUMNS)}, fingerprint) FROM STDIN WITH (FORMAT csv)",
+                    buffer)
+    # Temporary tables are never auto-analyzed; without statistics the
+    # planner guesses their size and may scan questions instead of probing it
+    cur.execute("ANALYZE question_import")
+
+def store_chunk(db: DatabaseConnection, questions: List[Question], update: bool, result: ImportStats) -> None:
+    """Insert new questions and, with ``update``, refresh the details of stored ones"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            stage_questions(cur, questions)
+            updated = 0
+            if update:
+                # The fingerprint covers the question, answers and correct
+                # answers, so only the other columns can differ
+                cur.execute("""
+                    WITH old AS (
+                        SELECT q.id, q.category, q.difficulty FROM questions AS q
+                        JOIN question_import AS i ON i.fingerprint = q.fingerprint
+                        -- COPY reads empty CSV fields as NULL
+                        WHERE (COALESCE(q.description, ''), COALESCE(q.explanation, ''), q.category, q.difficulty)
+                              IS DISTINCT FROM (COALESCE(i.description, ''), COALESCE(i.explanation, ''), i.category, i.difficulty)
+                        ORDER BY q.id
+                        FOR UPDATE OF q
+                    )
+                    UPDATE questions
+                    SET description = i.description, explanation = i.explanation,
+                        category = i.category, difficulty = i.difficulty
+                    FROM old, question_import AS i
+                    WHERE questions.id = old.id AND i.fingerprint = questions.fingerprint
+                    RETURNING questions.id, old.category, old.difficulty, questions.category, questions.difficulty
+                """)
+                moved = cur.fetchall()
+                updated = len(moved)
+                for question_id, old_category, old_difficulty, category, difficulty in moved:
+                    if (old_category, old_difficulty) != (category, difficulty):
+                        stats.record_question_moved(cur, question_id, old_category, old_difficulty,
+                                                    category, difficulty)
+                if moved:
+                    # Same payload as EntityCache.notify, for processes caching these questions
+                    cur.execute("""
+                        SELECT pg_notify(%s, json_build_array('question', id)::text)
+                        FROM unnest(%s::int[]) AS id
+                    """, (INVALIDATION_CHANNEL, [row[0] for row in moved]))
+            cur.execute(f"""
+                INSERT INTO questions ({', '.join(QUESTION_COLUMNS)}, fingerprint)
+                SELECT {', '.join(QUESTION_COLUMNS)}, fingerprint FROM question_import
+                ORDER BY fingerprint
+                ON CONFLICT (fingerprint) DO NOTHING
+                RETURNING id
+            """)
+            inserted = [row[0] for row in cur.fetchall()]
+            stats.record_questions_created(cur, inserted)
+            conn.commit()
+            result.inserted += len(inserted)
+            result.updated += updated
+            result.existing += len(questions) - len(inserted) - updated
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        db.return_connection(conn)
+
+def import_questions(db: DatabaseConnection, f: IO[str], fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     update: bool = False, max_errors: Optional[int] = None) -> ImportStats:
+    """Stream questions from ``f`` into the questions table, ``chunk_size`` per transaction.
+
+    Invalid records are logged and skipped; more than ``max_errors`` of them
+    abort the import (chunks already written stay). Questions already stored
+    (same fingerprint) are skipped, or have their description, explanation,
+    category and difficulty updated with ``update``.
+    """
+    result = ImportStats()
+    chunk: Dict[str, Question] = {}
+    for line_num, record in read_records(f, fmt):
+        result.read += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            question = parse_question(record)
+        except ValueError as e:
+            result.invalid += 1
+            logger.warning(f"Line {line_num}: {e}")
+            if max_errors is not None and result.invalid > max_errors:
+                raise ValueError(f"More than {max_errors} invalid record(s), stopping at line {line_num}")
+            continue
+        if question.fingerprint in chunk:
+            result.duplicates += 1
+        # The last copy in the file wins, as it would across chunks with update
+        chunk[question.fingerprint] = question
+        if len(chunk) >= chunk_size:
+            store_chunk(db, list(chunk.values()), update, result)
+            chunk = {}
+            logger.info(f"Imported {result.read} record(s) so far: {result}")
+    if chunk:
+        store_chunk(db, list(chunk.values()), update, result)
+    return result
+
+def copy_out(db: DatabaseConnection, f: IO[str], fmt: str, query: str, params: Optional[Dict] = None) -> int:
+    """COPY the rows of ``query`` into ``f``, returning how many were written.
+
+    For JSONL the query must select a single json column.
+    """
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            query = cur.mogrify(query, params).decode()
+            options = "FORMAT csv, HEADER" if fmt == "csv" else JSONL_COPY_OPTIONS
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH ({options})", f)
+            conn.commit()
+            return cur.rowcount
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        db.return_connection(conn)
+
+def export_questions(db: DatabaseConnection, f: IO[str], fmt: str, category: Optional[str] = None,
+                     difficulty: Optional[str] = None) -> int:
+    query = f"""
+        SELECT id, {', '.join(QUESTION_COLUMNS)} FROM questions
+        WHERE (%(category)s::text IS NULL OR category = %(category)s)
+          AND (%(difficulty)s::text IS NULL OR difficulty = %(difficulty)s)
+        ORDER BY id
+    """
+    if fmt == "jsonl":
+        query = f"SELECT row_to_json(q) FROM ({query}) AS q"
+    return copy_out(db, f, fmt, query, {"category": category, "difficulty": difficulty})
+
+def export_games(db: DatabaseConnection, f: IO[str], fmt: str, user_id: Optional[int] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 with_rounds: bool = False) -> int:
+    """Games created in [since, until), optionally with their game_questions.
+
+    With ``with_rounds`` JSONL nests each game's rounds in a "rounds_played" list,
+    while CSV has one row per round (game columns repeated, round columns
+    empty for games without rounds). Returns the number of rows written.
+    """
+    params = {"user_id": user_id, "since": since, "until": until}
+    games = """
+        SELECT g.id, g.user_id, u.username, g.rounds, g.score, g.created_at
+        FROM games AS g
+        JOIN users AS u ON u.id = g.user_id
+        WHERE (%(user_id)s::int IS NULL OR g.user_id = %(user_id)s)
+          AND (%(since)s::timestamp IS NULL OR g.created_at >= %(since)s)
+          AND (%(until)s::timestamp IS NULL OR g.created_at < %(until)s)
+    """
+    if not with_rounds:
+        query = f"{games} ORDER BY g.id"
+        if fmt == "jsonl":
+            query = f"SELECT row_to_json(g) FROM ({query}) AS g"
+    elif fmt == "jsonl":
+        query = f"""
+            SELECT json_build_object(
+                'id', g.id, 'user_id', g.user_id, 'username', g.username, 'rounds', g.rounds,
+                'score', g.score, 'created_at', g.created_at,
+                'rounds_played', COALESCE((
+                    SELECT json_agg(json_build_object(
+                        'question_id', gq.question_id, 'selected_answer_index', gq.selected_answer_index,
+                        'is_correct', gq.is_correct, 'answered_at', gq.answered_at) ORDER BY gq.id)
+                    FROM game_questions AS gq WHERE gq.game_id = g.id
+                ), '[]'))
+            FROM ({games}) AS g
+            ORDER BY g.id
+        """
+    else:
+        query = f"""
+            SELECT g.*, gq.question_id, gq.selected_answer_index, gq.is_correct, gq.answered_at
+            FROM ({games}) AS g
+            LEFT JOIN game_questions AS gq ON gq.game_id = g.id
+            ORDER BY g.id, gq.id
+        """
+    return copy_out(db, f, fmt, query, params)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export questions and game history with COPY")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import-questions", help="load questions from a JSONL or CSV file")
+    importer.add_argument("path", help="input file, *.gz for gzipped, - for stdin")
+    importer.add_argument("--update", action="store_true",
+                          help="update description, explanation, category and difficulty of stored questions")
+    importer.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="questions per transaction")
+    importer.add_argument("--max-errors", type=int, default=None, help="abort after this many invalid records")
+
+    questions = commands.add_parser("export-questions", help="write questions to a JSONL or CSV file")
+    questions.add_argument("path", help="output file, *.gz for gzipped, - for stdout")
+    questions.add_argument("--category")
+    questions.add_argument("--difficulty")
+
+    games = commands.add_parser("export-games", help="write game history to a JSONL or CSV file")
+    games.add_argument("path", help="output file, *.gz for gzipped, - for stdout")
+    games.add_argument("--user-id", type=int)
+    games.add_argument("--since", type=datetime.fromisoformat, help="ISO date or timestamp, inclusive")
+    games.add_argument("--until", type=datetime.fromisoformat, help="ISO date or timestamp, exclusive")
+    games.add_argument("--rounds", action="store_true", help="include each game's questions and answers")
+
+    for command in (importer, questions, games):
+        command.add_argument("--format", choices=FORMATS, help="defaults to the file extension, else jsonl")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fmt = args.format or detect_format(args.path)
+    db = DatabaseConnection(minconn=1, maxconn=1)
+    try:
+        if args.command == "import-questions":
+            with open_file(args.path, "r") as f:
+                result = import_questions(db, f, fmt, args.chunk_size, args.update, args.max_errors)
+            print(f"Imported questions: {result}", file=sys.stderr)
+        elif args.command == "export-questions":
+            with open_file(args.path, "w") as f:
+                count = export_questions(db, f, fmt, args.category, args.difficulty)
+            print(f"Exported {count} question(s)", file=sys.stderr)
+        else:
+            with open_file(args.path, "w") as f:
+                count = export_games(db, f, fmt, args.user_id, args.since, args.until, args.rounds)
+            print(f"Exported {count} row(s)", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close_all_connections()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+import copy
+import json
+import select
+import threading
+import time
+import logging
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel that carries JSON [kind, key] invalidations between processes
+INVALIDATION_CHANNEL = "entity_cache"
+
+class EntityCache:
+    """Bounded LRU cache with a TTL for rows looked up by key.
+
+    Values are deep-copied on the way in and out, so callers may mutate what
+    they get back (the update screens do) without corrupting the cache.
+    Keys are (kind, key) pairs such as ("question", 42); only found rows are
+    cached, misses always go to the database.
+
+    With ``publish`` set, repositories send every invalidation on
+    INVALIDATION_CHANNEL inside their write transaction, and a
+    CacheInvalidator in each other process drops its copy on commit.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, publish: bool = False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.publish = publish
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[0] < now:
+                del self._entries[(kind, key)]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def get_many(self, kind: str, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Cached values for whichever of ``keys`` are present"""
+        found = {}
+        for key in keys:
+            value = self.get(kind, key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put(self, kind: str, key: Hashable, value: Any) -> None:
+        if value is None:
+            return
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        with self._lock:
+            self._entries[(kind, key)] = entry
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, kind: str, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop((kind, key), None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def notify(self, cur, kind: str, key: Hashable) -> None:
+        """Queue a cross-process invalidation, delivered when cur's transaction commits"""
+        if self.publish:
+            cur.execute("SELECT pg_notify(%s, %s)", (INVALIDATION_CHANNEL, json.dumps([kind, key])))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+class CacheInvalidator:
+    """Background LISTEN on INVALIDATION_CHANNEL that drops invalidated keys.
+
+    Uses its own connection outside the pool, since it sits in LISTEN for the
+    life of the process.
+    """
+
+    def __init__(self, cache: EntityCache, dsn: Dict, poll_interval: float = 1.0):
+        self.cache = cache
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="entity-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval * 2)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                # Anything written while we were not listening may be stale
+                self.cache.clear()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        kind, key = json.loads(conn.notifies.pop(0).payload)
+                        self.cache.invalidate(kind, key)
+            except psycopg2.Error as e:
+                logger.warning(f"Cache invalidation listener lost its connection: {e}")
+                self.cache.clear()
+                self._stop.wait(self.poll_interval)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
\ No newline at end of file
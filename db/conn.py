@@ -1,23 +1,270 @@
-from psycopg2 import pool
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from contextlib import contextmanager
+from collections import deque
+from bisect import bisect_left
 from os import environ
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed upper bounds in seconds"""
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (0-100)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = p / 100.0 * self.count
+            seen = 0
+            for bound, count in zip(self.buckets + (self.max,), self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative, running = [], 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                running += count
+                cumulative.append((bound, running))
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "max": self.max,
+                "buckets": cumulative
+            }
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
 
 class DatabaseConnection:
-    def __init__(self):
-        self.connection_pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
+    """Thread-safe Postgres connection pool.
+
+    Checkouts wait at most ``timeout`` seconds for a free connection and raise
+    PoolTimeoutError otherwise. Connections idle for longer than
+    ``validate_after`` seconds are pinged before being handed out, and
+    connections older than ``max_lifetime`` seconds are closed and replaced.
+    Wait time, hold time and in-use counts are tracked in ``stats()``.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 10.0,
+                 max_lifetime: float = 1800.0, validate_after: float = 30.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.dsn = dict(
             database=environ.get('POSTGRES_DB', 'postgres'),
             user=environ.get('POSTGRES_USER', 'admin'),
             password=environ.get('POSTGRES_PASSWORD', 'admin'),
             host=environ.get('POSTGRES_HOST', 'localhost'),
             port=environ.get('POSTGRES_PORT', '5432')
         )
-    
-    def get_connection(self):
-        return self.connection_pool.getconn()
+        # Extra psycopg2.connect arguments, e.g. options or cursor_factory
+        self.dsn.update(connect_kwargs)
+
+        self._idle: "deque[_PooledConnection]" = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0  # open connections plus ones being opened
+        self._closed = False
+        self._cond = threading.Condition()
 
-    def return_connection(self, connection):
-        self.connection_pool.putconn(connection)
+        self.wait_histogram = LatencyHistogram()
+        self.hold_histogram = LatencyHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.max_in_use = 0
+
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append(self._connect())
+
+    def get_connection(self, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            with self._cond:
+                entry = None
+                while entry is None:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps the hottest connections in use and lets
+                        # surplus ones age out
+                        entry = self._idle.pop()
+                    elif self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise PoolTimeoutError(
+                                f"No database connection available after {timeout:.1f}s "
+                                f"({len(self._in_use)}/{self.maxconn} in use)"
+                            )
+                        self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+            elif not self._is_usable(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                now = time.monotonic()
+                entry.last_used = now
+                self._in_use[id(entry.conn)] = entry
+                self.checkouts += 1
+                self.max_in_use = max(self.max_in_use, len(self._in_use))
+            self.wait_histogram.observe(now - started)
+            return entry.conn
+
+    def return_connection(self, connection, close: bool = False):
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+            closed = self._closed
+        if entry is None:
+            if closed:
+                connection.close()
+                return
+            raise PoolError("trying to put unkeyed connection")
+        now = time.monotonic()
+        self.hold_histogram.observe(now - entry.last_used)
+
+        if not close and not connection.closed:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # Don't hand an open transaction to the next borrower
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    close = True
+        if close or connection.closed or self._closed or now - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+
+        with self._cond:
+            entry.last_used = now
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator:
+        """Check out a connection, committing on success and rolling back on error"""
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.return_connection(conn)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            in_use = len(self._in_use)
+            idle = len(self._idle)
+        return {
+            "in_use": in_use,
+            "idle": idle,
+            "max_in_use": self.max_in_use,
+            "maxconn": self.maxconn,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "created": self.created,
+            "recycled": self.recycled,
+            "wait": self.wait_histogram.snapshot(),
+            "hold": self.hold_histogram.snapshot()
+        }
 
     def close_all_connections(self):
-        self.connection_pool.closeall()
\ No newline at end of file
+        with self._cond:
+            self._closed = True
+            entries: List[_PooledConnection] = list(self._idle) + list(self._in_use.values())
+            self._idle.clear()
+            self._in_use.clear()
+            self._size = 0
+            self._cond.notify_all()
+        for entry in entries:
+            if not entry.conn.closed:
+                entry.conn.close()
+
+    def _connect(self) -> _PooledConnection:
+        conn = psycopg2.connect(**self.dsn)
+        with self._cond:
+            self.created += 1
+        return _PooledConnection(conn)
+
+    def _is_usable(self, entry: _PooledConnection) -> bool:
+        conn = entry.conn
+        now = time.monotonic()
+        if conn.closed or now - entry.created_at > self.max_lifetime:
+            return False
+        if now - entry.last_used > self.validate_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                logger.info("Discarding stale database connection")
+                return False
+        return True
+
+    def _discard(self, entry: Optional[_PooledConnection]) -> None:
+        if entry is not None:
+            if not entry.conn.closed:
+                try:
+                    entry.conn.close()
+                except psycopg2.Error:
+                    pass
+        with self._cond:
+            if entry is not None:
+                self.recycled += 1
+            self._size = max(self._size - 1, 0)
+            self._cond.notify()
\ No newline at end of file
@@ -0,0 +1,211 @@
+from .conn import DatabaseConnection
+from .migrate import migrate
+from .repository import UserRepository, QuestionRepository, GameRepository, GameSessionRepository
+from .schema import Question
+from .stats import StatsRepository
+from typing import Callable, Dict, List, Tuple
+from datetime import datetime
+import psycopg2
+import psycopg2.extensions
+import argparse
+import sys
+
+# Runs every repository method against a generated fixture with an EXPLAIN
+# of each statement it sends, and fails if any plan sequentially scans a
+# large table. Everything happens inside a scratch schema that is dropped
+# afterwards, so it is safe to point at a development database.
+
+CHECK_SCHEMA = "explain_check"
+
+# Tables with more estimated rows than this count as large
+LARGE_TABLE_ROWS = 10000
+
+# Methods that list whole tables, where a sequential scan is the right plan
+FULL_SCAN_ALLOWED = {"UserRepository.get_all_users", "QuestionRepository.get_all_questions",
+                     "GameRepository.get_all_games", "StatsRepository.get_user_totals",
+                     "QuestionRepository.get_question_id_index",
+                     "UserRepository.iter_all_users", "QuestionRepository.iter_all_questions",
+                     "GameRepository.iter_all_games"}
+
+class _PlanCollector:
+    def __init__(self):
+        self.label = None
+        self.plans: List[Tuple[str, str, Dict]] = []
+
+collector = _PlanCollector()
+
+class ExplainingCursor(psycopg2.extensions.cursor):
+    """Cursor that records the plan of every statement before running it"""
+
+    def execute(self, query, vars=None):
+        sql = self.mogrify(query, vars).decode()
+        if collector.label and sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "EXECUTE"):
+            # A named cursor can only DECLARE a query, so explain on a plain one
+            with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as explain:
+                explain.execute("EXPLAIN (FORMAT JSON) " + sql)
+                collector.plans.append((collector.label, sql, explain.fetchone()[0][0]["Plan"]))
+        return super().execute(query, vars)
+
+def load_fixture(cur, users: int, questions: int, games: int, rounds: int) -> None:
+    cur.execute("""
+        INSERT INTO users (username)
+        SELECT 'player_' || i FROM generate_series(1, %(users)s) AS i
+    """, {"users": users})
+    cur.execute("""
+        INSERT INTO questions (question, description, explanation, category, difficulty,
+                               answers, correct_answers, fingerprint)
+        SELECT 'Question ' || i || '?', '', '',
+               'category_' || (i %% 25), (ARRAY['easy', 'medium', 'hard'])[1 + i %% 3],
+               '["a", "b", "c", "d"]', '[true, false, false, false]', md5(i::text) || md5(i::text)
+        FROM generate_series(1, %(questions)s) AS i
+    """, {"questions": questions})
+    cur.execute("""
+        INSERT INTO games (user_id, rounds, score, created_at)
+        SELECT 1 + i %% %(users)s, %(rounds)s, i %% (%(rounds)s + 1),
+               now() - (i || ' minutes')::interval
+        FROM generate_series(1, %(games)s) AS i
+    """, {"users": users, "games": games, "rounds": rounds})
+    cur.execute("""
+        INSERT INTO game_questions (game_id, question_id, selected_answer_index, is_correct, answered_at)
+        SELECT g.id, 1 + (g.id * 7919 + r * 104729) %% %(questions)s, 0, (g.id + r) %% 3 = 0, g.created_at
+        FROM games g, generate_series(1, %(rounds)s) AS r
+    """, {"questions": questions, "rounds": rounds})
+    cur.execute("SELECT refresh_quiz_stats()")
+
+def repository_calls(db: DatabaseConnection, played_question_id: int) -> List[Tuple[str, Callable]]:
+    users = UserRepository(db)
+    questions = QuestionRepository(db)
+    games = GameRepository(db)
+    sessions = GameSessionRepository(db)
+    stats_repo = StatsRepository(db)
+    new_question = lambda text, category: Question(0, text, "", "", category, "easy", ["a", "b"], [True, False])
+    return [
+        ("UserRepository.create_user", lambda: users.create_user("explain_check_user")),
+        ("UserRepository.get_all_users", lambda: users.get_all_users()),
+        ("UserRepository.iter_all_users", lambda: list(users.iter_all_users(itersize=500))),
+        ("UserRepository.get_user_by_id", lambda: users.get_user_by_id(42)),
+        ("UserRepository.get_user_by_username", lambda: users.get_user_by_username("player_42")),
+        ("UserRepository.get_users_by_ids", lambda: users.get_users_by_ids([1, 42, 4242])),
+        ("UserRepository.get_seen_questions", lambda: users.get_seen_questions(42)),
+        ("QuestionRepository.create_question", lambda: questions.create_question(new_question("Created?", "category_1"))),
+        ("QuestionRepository.upsert_question", lambda: questions.upsert_question(new_question("Upserted?", "category_2"))),
+        ("QuestionRepository.get_question_by_id", lambda: questions.get_question_by_id(42)),
+        ("QuestionRepository.get_questions_by_ids", lambda: questions.get_questions_by_ids([1, 42, 4242])),
+        ("QuestionRepository.get_question_ids_by_fingerprints",
+         lambda: questions.get_question_ids_by_fingerprints(["0" * 64, "f" * 64])),
+        ("QuestionRepository.get_question_id_index", lambda: questions.get_question_id_index()),
+        ("QuestionRepository.get_all_questions", lambda: questions.get_all_questions()),
+        ("QuestionRepository.iter_all_questions", lambda: list(questions.iter_all_questions(itersize=500))),
+        ("QuestionRepository.update_question", lambda: questions.update_question(Question(
+            42, "Updated?", "", "", "category_3", "hard", ["a", "b"], [False, True]))),
+        ("QuestionRepository.answer_question", lambda: questions.answer_question(1, played_question_id, 1, True)),
+        ("GameRepository.create_game", lambda: games.create_game(42, 3)),
+        ("GameRepository.create_game_with_questions", lambda: games.create_game_with_questions(
+            42, 2, [new_question("Bulk 1?", "category_4"), new_question("Bulk 2?", "category_5")])),
+        ("GameRepository.add_game_questions", lambda: games.add_game_questions(3, [1, 2])),
+        ("GameRepository.update_score", lambda: games.update_score(42, 3)),
+        ("GameRepository.save_answers", lambda: games.save_answers(
+            [(1, played_question_id, 0, True, datetime.now())], {1: 2, 42: 1}, "off")),
+        ("GameRepository.get_game", lambda: games.get_game(42)),
+        ("GameRepository.get_game_by_id", lambda: games.get_game_by_id(42)),
+        ("GameRepository.get_all_games", lambda: games.get_all_games()),
+        ("GameRepository.iter_all_games", lambda: list(games.iter_all_games(itersize=500))),
+        ("GameRepository.get_games_page", lambda: games.get_games_page(42, 20)),
+        ("GameRepository.get_games_page", lambda: games.get_games_page(42, 20, after=(datetime.now(), 10 ** 6))),
+        ("GameRepository.get_games_page", lambda: games.get_games_page(limit=20, after=(datetime.now(), 10 ** 6))),
+        ("GameRepository.get_game_questions", lambda: games.get_game_questions(42)),
+        ("GameRepository.get_game_rounds", lambda: games.get_game_rounds(42)),
+        ("GameRepository.delete_game", lambda: games.delete_game(43)),
+        ("GameSessionRepository.save_sessions", lambda: sessions.save_sessions([(44, 44, [1, 2, 3], 0b101, 2)])),
+        ("GameSessionRepository.get_session", lambda: sessions.get_session(44)),
+        ("GameSessionRepository.get_latest_session", lambda: sessions.get_latest_session(44)),
+        ("GameSessionRepository.delete_session", lambda: sessions.delete_session(44)),
+        ("StatsRepository.get_dashboard", lambda: stats_repo.get_dashboard()),
+        ("StatsRepository.get_user_totals", lambda: stats_repo.get_user_totals()),
+    ]
+
+def find_seq_scans(plan: Dict, large_tables: Dict[str, float]) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in large_tables:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found.extend(find_seq_scans(child, large_tables))
+    return found
+
+def run_check(scale: float = 1.0, verbose: bool = False) -> List[str]:
+    """Return a description of every offending plan (empty means the check passed)"""
+    setup = DatabaseConnection(minconn=1, maxconn=1)
+    setup_conn = setup.get_connection()
+    try:
+        with setup_conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {CHECK_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {CHECK_SCHEMA}")
+            setup_conn.commit()
+    finally:
+        setup.return_connection(setup_conn)
+
+    db = DatabaseConnection(minconn=0, maxconn=2, options=f"-c search_path={CHECK_SCHEMA}",
+                            cursor_factory=ExplainingCursor)
+    try:
+        migrate(db)
+        conn = db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                load_fixture(cur, users=int(5000 * scale), questions=int(20000 * scale),
+                             games=int(50000 * scale), rounds=5)
+                conn.commit()
+                cur.execute("ANALYZE")
+                cur.execute("""
+                    SELECT relname, reltuples FROM pg_class
+                    WHERE relnamespace = %s::regnamespace AND relkind = 'r' AND reltuples > %s
+                """, (CHECK_SCHEMA, LARGE_TABLE_ROWS))
+                large_tables = dict(cur.fetchall())
+                cur.execute("SELECT question_id FROM game_questions WHERE game_id = 1 LIMIT 1")
+                played_question_id = cur.fetchone()[0]
+                conn.commit()
+        finally:
+            db.return_connection(conn)
+
+        for label, call in repository_calls(db, played_question_id):
+            collector.label = label
+            try:
+                call()
+            finally:
+                collector.label = None
+
+        failures = []
+        for label, sql, plan in collector.plans:
+            scans = find_seq_scans(plan, large_tables)
+            if verbose:
+                print(f"{label}: {plan['Node Type']} (cost {plan['Total Cost']})")
+            if scans and label not in FULL_SCAN_ALLOWED:
+                statement = " ".join(sql.split())
+                failures.append(f"{label}: sequential scan on {', '.join(sorted(set(scans)))}\n    {statement[:300]}")
+        return failures
+    finally:
+        db.close_all_connections()
+        setup_conn = setup.get_connection()
+        try:
+            with setup_conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {CHECK_SCHEMA} CASCADE")
+                setup_conn.commit()
+        finally:
+            setup.return_connection(setup_conn)
+            setup.close_all_connections()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a repository query sequentially scans a large table")
+    parser.add_argument("--scale", type=float, default=1.0, help="fixture size multiplier")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the top plan node of every statement")
+    args = parser.parse_args()
+
+    failures = run_check(args.scale, args.verbose)
+    if failures:
+        print("Sequential scans on large tables:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"OK: {len(collector.plans)} statements checked, no sequential scans on large tables")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
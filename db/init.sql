@@ -1,3 +1,10 @@
+-- Development reset: drops and reseeds everything. Schema changes after the
+-- baseline live in db/migrations and are applied by db/migrate.py
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS user_stats CASCADE;
+DROP TABLE IF EXISTS question_stats CASCADE;
+DROP TABLE IF EXISTS category_stats CASCADE;
+DROP TABLE IF EXISTS difficulty_stats CASCADE;
 DROP TABLE IF EXISTS game_questions CASCADE;
 DROP TABLE IF EXISTS games CASCADE;
 DROP TABLE IF EXISTS questions CASCADE;
@@ -16,7 +23,9 @@ CREATE TABLE IF NOT EXISTS questions (
     category VARCHAR(255) NOT NULL,
     difficulty VARCHAR(255) NOT NULL,
     answers jsonb NOT NULL,
-    correct_answers jsonb NOT NULL
+    correct_answers jsonb NOT NULL,
+    -- sha256 of the normalized question content, see Question.compute_fingerprint
+    fingerprint CHAR(64) UNIQUE
 );
 
 CREATE TABLE IF NOT EXISTS games (
@@ -37,6 +46,78 @@ CREATE TABLE IF NOT EXISTS game_questions (
     UNIQUE(game_id, question_id)
 );
 
+-- Summary tables behind the statistics dashboard, kept up to date
+-- incrementally by the repositories (see db/stats.py)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    total_games INTEGER NOT NULL DEFAULT 0,
+    total_correct INTEGER NOT NULL DEFAULT 0,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    accuracy NUMERIC GENERATED ALWAYS AS (
+        ROUND(CASE WHEN total_questions > 0 THEN 100.0 * total_correct / total_questions ELSE 0 END, 2)
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS user_stats_accuracy_idx ON user_stats (accuracy DESC);
+
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    success_rate NUMERIC GENERATED ALWAYS AS (
+        ROUND(CASE WHEN attempts > 0 THEN 100.0 * correct / attempts ELSE 0 END, 2)
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS question_stats_success_rate_idx ON question_stats (success_rate) WHERE attempts > 0;
+
+CREATE TABLE IF NOT EXISTS category_stats (
+    category VARCHAR(255) PRIMARY KEY,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    times_played INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS difficulty_stats (
+    difficulty VARCHAR(255) PRIMARY KEY,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+
+-- Full recompute of the summary tables, for seeding and repairs
+CREATE OR REPLACE FUNCTION refresh_quiz_stats() RETURNS void AS $$
+BEGIN
+    TRUNCATE user_stats, question_stats, category_stats, difficulty_stats;
+
+    INSERT INTO user_stats (user_id, total_games, total_correct, total_questions)
+    SELECT u.id, COUNT(g.id), COALESCE(SUM(g.score), 0), COALESCE(SUM(g.rounds), 0)
+    FROM users u
+    LEFT JOIN games g ON g.user_id = u.id
+    GROUP BY u.id;
+
+    INSERT INTO question_stats (question_id, attempts, correct)
+    SELECT question_id, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+    FROM game_questions
+    GROUP BY question_id;
+
+    INSERT INTO category_stats (category, total_questions, times_played, attempts, correct)
+    SELECT q.category, COUNT(DISTINCT q.id), COUNT(DISTINCT gq.game_id),
+           COUNT(gq.id), COUNT(gq.id) FILTER (WHERE gq.is_correct)
+    FROM questions q
+    LEFT JOIN game_questions gq ON gq.question_id = q.id
+    GROUP BY q.category;
+
+    INSERT INTO difficulty_stats (difficulty, total_questions, attempts, correct)
+    SELECT q.difficulty, COUNT(DISTINCT q.id),
+           COUNT(gq.id), COUNT(gq.id) FILTER (WHERE gq.is_correct)
+    FROM questions q
+    LEFT JOIN game_questions gq ON gq.question_id = q.id
+    GROUP BY q.difficulty;
+END;
+$$ LANGUAGE plpgsql;
+
 
 INSERT INTO users (username) VALUES
     ('Gabigol'),
@@ -46,7 +127,7 @@ INSERT INTO users (username) VALUES
     ('Gonzalo_Plata'),
     ('Wesley');
 
-INSERT INTO questions (question, description, explanation, category, difficulty, answers, correct_answers) VALUES
+INSERT INTO questions (question, description, explanation, category, difficulty, answers, correct_answers, fingerprint) VALUES
     (
         'What is the capital of France?',
         'Choose the city that serves as the capital of France',
@@ -54,7 +135,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Geography',
         'easy',
         '["Paris", "London", "Berlin", "Madrid"]',
-        '[true, false, false, false]'
+        '[true, false, false, false]',
+        'a010f9d89b9d2ac6656416afcad14c9cecaf02e5edae9bf396e5e8d6dc27f293'
     ),
     (
         'Which programming language was created by Guido van Rossum?',
@@ -63,7 +145,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Programming',
         'medium',
         '["Java", "Python", "C++", "Ruby"]',
-        '[false, true, false, false]'
+        '[false, true, false, false]',
+        '7e12e3007f2b1d104fc3d95386c781b80f1c4249e4c0e7c40701257df5f566d6'
     ),
     (
         'What is the largest planet in our solar system?',
@@ -72,7 +155,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Science',
         'easy',
         '["Mars", "Venus", "Jupiter", "Saturn"]',
-        '[false, false, true, false]'
+        '[false, false, true, false]',
+        'b7ef90e16deebcfe8f709d654fd6e984d2f83a23b3fc70d94b6823b9875323bd'
     ),
     (
         'Which data structure follows the LIFO principle?',
@@ -81,7 +165,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Programming',
         'medium',
         '["Queue", "Stack", "Array", "Tree"]',
-        '[false, true, false, false]'
+        '[false, true, false, false]',
+        '2e7ecbc84faeafdf6bdd8bf462a8e3f3d7227523efb480418090aa97e7a4653e'
     ),
     (
         'What is the chemical symbol for gold?',
@@ -90,7 +175,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Science',
         'easy',
         '["Ag", "Au", "Fe", "Cu"]',
-        '[false, true, false, false]'
+        '[false, true, false, false]',
+        '67f9c499c4fee166bb905cf2d022909e1e72de8b73b333ea208bd4f88b82fc41'
     ),
     (
         'Which sorting algorithm has the best average time complexity?',
@@ -99,7 +185,8 @@ INSERT INTO questions (question, description, explanation, category, difficulty,
         'Programming',
         'hard',
         '["Bubble Sort", "Quick Sort", "Insertion Sort", "Selection Sort"]',
-        '[false, true, false, false]'
+        '[false, true, false, false]',
+        'c1ad4ce44fea0cbdbf951055cda449e085eaa7f79d8700ebf15468b04fc50dc4'
     );
 
 INSERT INTO games (user_id, rounds, score, created_at) VALUES
@@ -118,4 +205,6 @@ INSERT INTO game_questions (game_id, question_id, selected_answer_index, is_corr
     (1, 5, 0, false, '2024-01-01 10:05:00'),
     (2, 1, 0, true, '2024-01-02 11:31:00'),
     (2, 2, 2, false, '2024-01-02 11:32:00'),
-    (2, 3, 2, true, '2024-01-02 11:33:00');
\ No newline at end of file
+    (2, 3, 2, true, '2024-01-02 11:33:00');
+
+SELECT refresh_quiz_stats();
\ No newline at end of file
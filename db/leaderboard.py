@@ -0,0 +1,281 @@
+from .conn import PoolTimeoutError
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+import json
+import logging
+import random
+import select
+import threading
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# Skip list levels; 2**32 keys before the top level stops helping
+MAX_LEVEL = 32
+
+# Postgres channel carrying JSON [user_id, total_games, total_correct, total_questions]
+# for every committed user_stats change, or "reload" (see migration 0007)
+LEADERBOARD_CHANNEL = "leaderboard"
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # Positions skipped by each link, so rank and index lookups can sum them
+        self.width = [1] * level
+
+class IndexableSkipList:
+    """Sorted set of unique keys with O(log n) insert, remove, rank and index lookups.
+
+    Every link stores how many positions it skips; a link to the end of
+    the list counts up to the position just past the last key.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._rng = random.Random(seed)
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._rng.random() < 0.5:
+            level += 1
+        return level
+
+    def _find(self, key) -> Tuple[List[_Node], List[int]]:
+        """Last node before ``key`` on every level, and its position (head = 0)"""
+        update, positions = [self._head] * MAX_LEVEL, [0] * MAX_LEVEL
+        node, position = self._head, 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                position += node.width[i]
+                node = node.next[i]
+            update[i], positions[i] = node, position
+        return update, positions
+
+    def insert(self, key: Hashable) -> None:
+        update, positions = self._find(key)
+        following = update[0].next[0]
+        if following is not None and following.key == key:
+            raise KeyError(key)
+        level = self._random_level()
+        for i in range(self._level, level):
+            self._head.width[i] = self._size + 1
+        self._level = max(self._level, level)
+
+        node, position = _Node(key, level), positions[0] + 1
+        for i in range(level):
+            previous = update[i]
+            node.next[i] = previous.next[i]
+            previous.next[i] = node
+            node.width[i] = positions[i] + previous.width[i] + 1 - position
+            previous.width[i] = position - positions[i]
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key: Hashable) -> None:
+        update, _ = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self._level):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+    def index(self, key: Hashable) -> int:
+        """0-based position of ``key``"""
+        update, positions = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+    def slice(self, start: int, stop: int) -> List:
+        """Keys at positions start..stop-1, like list[start:stop] for non-negative bounds"""
+        start, stop = max(start, 0), min(stop, self._size)
+        if start >= stop:
+            return []
+        node, position = self._head, 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and position + node.width[i] <= start + 1:
+                position += node.width[i]
+                node = node.next[i]
+        keys = []
+        while len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+    def __getitem__(self, index: int):
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self.slice(index, index + 1)[0]
+
+def accuracy(total_correct: int, total_questions: int) -> Decimal:
+    """Same rounding as the generated user_stats.accuracy column"""
+    if total_questions <= 0:
+        return Decimal("0.00")
+    return (Decimal(100 * total_correct) / total_questions).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+class LeaderboardEntry(NamedTuple):
+    rank: int
+    user_id: int
+    total_games: int
+    total_correct: int
+    total_questions: int
+    accuracy: Decimal
+
+class Leaderboard:
+    """Players ranked by accuracy, then correct answers, then user id.
+
+    Kept in memory and fed with user_stats rows (user_id, total_games,
+    total_correct, total_questions): once with every row by load(), then
+    with the rows repositories write as games are created, scored and
+    deleted. Updates that arrive before load() are dropped, since load()
+    reads them from the table anyway. Players who haven't started a game
+    are not ranked. Writes by other processes reach it through a
+    LeaderboardListener.
+    """
+
+    def __init__(self):
+        self._ranking = IndexableSkipList()
+        self._totals = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    @staticmethod
+    def _key(user_id: int, totals: Tuple[int, int, int]) -> Tuple[Decimal, int, int]:
+        _, total_correct, total_questions = totals
+        return (-accuracy(total_correct, total_questions), -total_correct, user_id)
+
+    def load(self, rows: Iterable[Tuple[int, int, int, int]]) -> None:
+        ranking, totals = IndexableSkipList(), {}
+        for user_id, *row in rows:
+            if row[2] > 0:
+                totals[user_id] = tuple(row)
+                ranking.insert(self._key(user_id, totals[user_id]))
+        with self._lock:
+            self._ranking, self._totals = ranking, totals
+            self.loaded = True
+
+    def update(self, user_id: int, total_games: int, total_correct: int, total_questions: int) -> None:
+        totals = (total_games, total_correct, total_questions)
+        with self._lock:
+            if not self.loaded:
+                return
+            previous = self._totals.pop(user_id, None)
+            if previous is not None:
+                self._ranking.remove(self._key(user_id, previous))
+            if total_questions > 0:
+                self._totals[user_id] = totals
+                self._ranking.insert(self._key(user_id, totals))
+
+    def __len__(self) -> int:
+        return len(self._ranking)
+
+    def _entries(self, start: int, stop: int) -> List[LeaderboardEntry]:
+        entries = []
+        for rank, (_, _, user_id) in enumerate(self._ranking.slice(start, stop), start + 1):
+            total_games, total_correct, total_questions = self._totals[user_id]
+            entries.append(LeaderboardEntry(rank, user_id, total_games, total_correct, total_questions,
+                                            accuracy(total_correct, total_questions)))
+        return entries
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank, or None for players without games"""
+        with self._lock:
+            totals = self._totals.get(user_id)
+            if totals is None:
+                return None
+            return self._ranking.index(self._key(user_id, totals)) + 1
+
+    def top(self, k: int) -> List[LeaderboardEntry]:
+        with self._lock:
+            return self._entries(0, k)
+
+    def around(self, user_id: int, radius: int = 5) -> List[LeaderboardEntry]:
+        """Up to ``radius`` players on each side of ``user_id``, shifted to stay 2 * radius + 1 long near the ends"""
+        with self._lock:
+            totals = self._totals.get(user_id)
+            if totals is None:
+                return []
+            position = self._ranking.index(self._key(user_id, totals))
+            start = max(min(position - radius, len(self._ranking) - 2 * radius - 1), 0)
+            return self._entries(start, start + 2 * radius + 1)
+
+class LeaderboardListener:
+    """Background LISTEN on LEADERBOARD_CHANNEL that keeps ``leaderboard`` current.
+
+    ``leaderboard`` is loaded with ``load_rows()`` once LISTEN is in place,
+    so nothing committed in between is missed, and then updated one player
+    at a time as user_stats changes in any process. It is loaded again when
+    user_stats is truncated and after the connection drops. Uses its own
+    connection outside the pool, like CacheInvalidator.
+    """
+
+    def __init__(self, leaderboard: Leaderboard, dsn: Dict,
+                 load_rows: Callable[[], Iterable[Tuple[int, int, int, int]]], poll_interval: float = 1.0):
+        self.leaderboard = leaderboard
+        self.dsn = dsn
+        self.load_rows = load_rows
+        self.poll_interval = poll_interval
+        self._loaded = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="leaderboard-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval * 2)
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until the first load has finished; False if ``timeout`` ran out first"""
+        return self._loaded.wait(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {LEADERBOARD_CHANNEL}")
+                self.leaderboard.load(self.load_rows())
+                self._loaded.set()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    reload = False
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        if payload == "reload":
+                            reload = True
+                        elif not reload:
+                            self.leaderboard.update(*json.loads(payload))
+                    if reload:
+                        self.leaderboard.load(self.load_rows())
+            except (psycopg2.Error, PoolTimeoutError) as e:
+                logger.warning(f"Leaderboard listener lost its connection: {e}")
+                self._stop.wait(self.poll_interval)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
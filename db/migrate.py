@@ -0,0 +1,125 @@
+from .conn import DatabaseConnection
+from typing import List, Tuple
+from pathlib import Path
+import argparse
+import importlib.util
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Arbitrary key for pg_advisory_lock so concurrent app starts don't race
+MIGRATION_LOCK_ID = 727001
+
+class MigrationError(Exception):
+    def __init__(self, message: str, original_error: Exception = None):
+        self.message = message
+        self.original_error = original_error
+        super().__init__(self.message)
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Tuple[int, str, Path]]:
+    """(version, name, path) for every NNNN_name.sql or NNNN_name.py file, in version order"""
+    migrations = []
+    for path in directory.iterdir():
+        match = re.match(r"^(\d+)_(.+)\.(sql|py)$", path.name)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), path))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+def applied_versions(cur) -> List[int]:
+    cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cur.fetchall()]
+
+def run_migration(cur, path: Path) -> None:
+    """Run a .sql file as is, or call upgrade(cur) from a .py file for data
+    changes that need Python, e.g. recomputing Question.compute_fingerprint"""
+    if path.suffix == ".sql":
+        cur.execute(path.read_text())
+        return
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(cur)
+
+def migrate(db: DatabaseConnection, directory: Path = MIGRATIONS_DIR) -> List[int]:
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the versions that were applied. Never drops anything: migrations
+    are forward-only and must be safe to run against a live database.
+    """
+    migrations = discover_migrations(directory)
+    applied = []
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                done = set(applied_versions(cur))
+                conn.commit()
+                for version, name, path in migrations:
+                    if version in done:
+                        continue
+                    logger.info(f"Applying migration {version:04d}_{name}")
+                    try:
+                        run_migration(cur, path)
+                        cur.execute("""
+                            INSERT INTO schema_migrations (version, name) VALUES (%s, %s)
+                        """, (version, name))
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        raise MigrationError(f"Migration {version:04d}_{name} failed: {e}", e)
+                    applied.append(version)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+        return applied
+    finally:
+        db.return_connection(conn)
+
+def status(db: DatabaseConnection, directory: Path = MIGRATIONS_DIR) -> List[Tuple[int, str, bool]]:
+    """(version, name, applied) for every known migration"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+            done = set(applied_versions(cur)) if cur.fetchone()[0] else set()
+        return [(version, name, version in done) for version, name, _ in discover_migrations(directory)]
+    finally:
+        db.return_connection(conn)
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = DatabaseConnection()
+    try:
+        if args.status:
+            for version, name, applied in status(db):
+                print(f"{'applied' if applied else 'pending':<8} {version:04d}_{name}")
+        else:
+            applied = migrate(db)
+            print(f"Applied {len(applied)} migration(s)")
+    finally:
+        db.close_all_connections()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
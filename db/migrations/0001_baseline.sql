@@ -0,0 +1,114 @@
+-- Baseline schema: everything db/init.sql creates, written so it can be
+-- applied on top of an existing database without dropping anything.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(255) UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id SERIAL PRIMARY KEY,
+    question VARCHAR(255) NOT NULL,
+    description VARCHAR(500),
+    explanation VARCHAR(500),
+    category VARCHAR(255) NOT NULL,
+    difficulty VARCHAR(255) NOT NULL,
+    answers jsonb NOT NULL,
+    correct_answers jsonb NOT NULL
+);
+
+-- sha256 of the normalized question content, see Question.compute_fingerprint
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS fingerprint CHAR(64) UNIQUE;
+
+CREATE TABLE IF NOT EXISTS games (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    rounds INTEGER NOT NULL,
+    score INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS game_questions (
+    id SERIAL PRIMARY KEY,
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    question_id INTEGER NOT NULL REFERENCES questions(id),
+    selected_answer_index INTEGER,
+    is_correct BOOLEAN,
+    answered_at TIMESTAMP,
+    UNIQUE(game_id, question_id)
+);
+
+-- Summary tables behind the statistics dashboard, kept up to date
+-- incrementally by the repositories (see db/stats.py)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    total_games INTEGER NOT NULL DEFAULT 0,
+    total_correct INTEGER NOT NULL DEFAULT 0,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    accuracy NUMERIC GENERATED ALWAYS AS (
+        ROUND(CASE WHEN total_questions > 0 THEN 100.0 * total_correct / total_questions ELSE 0 END, 2)
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS user_stats_accuracy_idx ON user_stats (accuracy DESC);
+
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    success_rate NUMERIC GENERATED ALWAYS AS (
+        ROUND(CASE WHEN attempts > 0 THEN 100.0 * correct / attempts ELSE 0 END, 2)
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS question_stats_success_rate_idx ON question_stats (success_rate) WHERE attempts > 0;
+
+CREATE TABLE IF NOT EXISTS category_stats (
+    category VARCHAR(255) PRIMARY KEY,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    times_played INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS difficulty_stats (
+    difficulty VARCHAR(255) PRIMARY KEY,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+
+-- Full recompute of the summary tables, for seeding and repairs
+CREATE OR REPLACE FUNCTION refresh_quiz_stats() RETURNS void AS $$
+BEGIN
+    TRUNCATE user_stats, question_stats, category_stats, difficulty_stats;
+
+    INSERT INTO user_stats (user_id, total_games, total_correct, total_questions)
+    SELECT u.id, COUNT(g.id), COALESCE(SUM(g.score), 0), COALESCE(SUM(g.rounds), 0)
+    FROM users u
+    LEFT JOIN games g ON g.user_id = u.id
+    GROUP BY u.id;
+
+    INSERT INTO question_stats (question_id, attempts, correct)
+    SELECT question_id, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+    FROM game_questions
+    GROUP BY question_id;
+
+    INSERT INTO category_stats (category, total_questions, times_played, attempts, correct)
+    SELECT q.category, COUNT(DISTINCT q.id), COUNT(DISTINCT gq.game_id),
+           COUNT(gq.id), COUNT(gq.id) FILTER (WHERE gq.is_correct)
+    FROM questions q
+    LEFT JOIN game_questions gq ON gq.question_id = q.id
+    GROUP BY q.category;
+
+    INSERT INTO difficulty_stats (difficulty, total_questions, attempts, correct)
+    SELECT q.difficulty, COUNT(DISTINCT q.id),
+           COUNT(gq.id), COUNT(gq.id) FILTER (WHERE gq.is_correct)
+    FROM questions q
+    LEFT JOIN game_questions gq ON gq.question_id = q.id
+    GROUP BY q.difficulty;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill the summary tables for databases that predate them
+SELECT refresh_quiz_stats();
\ No newline at end of file
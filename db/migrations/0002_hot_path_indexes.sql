@@ -0,0 +1,15 @@
+-- Indexes for the joins and sorts on the hot query paths
+
+-- Per-user game history, newest first
+CREATE INDEX IF NOT EXISTS games_user_id_created_at_idx ON games (user_id, created_at DESC);
+
+-- get_all_games and the dashboard's recent activity
+CREATE INDEX IF NOT EXISTS games_created_at_idx ON games (created_at DESC);
+
+-- Joins from questions to the games they were played in; game_id lookups
+-- are already covered by UNIQUE(game_id, question_id)
+CREATE INDEX IF NOT EXISTS game_questions_question_id_idx ON game_questions (question_id);
+
+-- Per-category and per-difficulty aggregates and question selection
+CREATE INDEX IF NOT EXISTS questions_category_idx ON questions (category);
+CREATE INDEX IF NOT EXISTS questions_difficulty_idx ON questions (difficulty);
\ No newline at end of file
@@ -0,0 +1,8 @@
+-- Game history is paged by (created_at, id) keyset, so the tiebreaker has to
+-- be part of the index for the row comparison to stay an index range scan
+
+CREATE INDEX IF NOT EXISTS games_user_id_created_at_id_idx ON games (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS games_created_at_id_idx ON games (created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS games_user_id_created_at_idx;
+DROP INDEX IF EXISTS games_created_at_idx;
\ No newline at end of file
@@ -0,0 +1,12 @@
+-- In-progress games evicted from a server's memory (see session_store.py)
+
+CREATE TABLE IF NOT EXISTS game_sessions (
+    game_id INTEGER PRIMARY KEY REFERENCES games(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    question_ids INTEGER[] NOT NULL,
+    correct_mask BIGINT NOT NULL DEFAULT 0,
+    current_round SMALLINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS game_sessions_user_id_idx ON game_sessions (user_id, updated_at DESC);
\ No newline at end of file
@@ -0,0 +1,35 @@
+-- Questions each player has been given, as a bitmap over question ids:
+-- bit n (byte n / 8, bit n % 8, as get_bit/set_bit number them) is set once
+-- question n has been in one of their games. See db/seen.py
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS seen_questions BYTEA NOT NULL DEFAULT ''::bytea;
+
+-- Sets the bits for question_ids, growing the bitmap as needed
+CREATE OR REPLACE FUNCTION mark_questions_seen(seen BYTEA, question_ids INTEGER[]) RETURNS BYTEA AS $$
+DECLARE
+    question_id INTEGER;
+    needed INTEGER;
+BEGIN
+    SELECT max(id) / 8 + 1 INTO needed FROM unnest(question_ids) AS id;
+    IF needed > length(seen) THEN
+        seen := seen || decode(repeat('00', needed - length(seen)), 'hex');
+    END IF;
+    FOREACH question_id IN ARRAY question_ids LOOP
+        IF question_id IS NOT NULL THEN
+            seen := set_bit(seen, question_id, 1);
+        END IF;
+    END LOOP;
+    RETURN seen;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Backfill from the games played so far
+UPDATE users
+SET seen_questions = mark_questions_seen(users.seen_questions, history.question_ids)
+FROM (
+    SELECT g.user_id, array_agg(DISTINCT gq.question_id) AS question_ids
+    FROM game_questions AS gq
+    JOIN games AS g ON g.id = gq.game_id
+    GROUP BY g.user_id
+) AS history
+WHERE users.id = history.user_id;
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Fingerprint questions stored before the fingerprint column existed.
+
+The fingerprint is Question.compute_fingerprint, which SQL can't reproduce
+exactly, hence a Python migration. Questions that turn out to duplicate an
+earlier one are merged into it: their game links, in-progress sessions and
+seen bits move to the kept question and the copy is deleted, then the
+summary tables are recomputed. In-progress games that had both copies
+are dropped.
+"""
+from db.schema import Question
+from psycopg2.extras import execute_values
+
+def upgrade(cur) -> None:
+    cur.execute("""
+        SELECT id, question, answers, correct_answers
+        FROM questions
+        WHERE fingerprint IS NULL
+        ORDER BY id
+        FOR UPDATE
+    """)
+    rows = cur.fetchall()
+    if not rows:
+        return
+    fingerprints = {
+        question_id: Question(question_id, question, "", "", "", "", answers, correct_answers).compute_fingerprint()
+        for question_id, question, answers, correct_answers in rows
+    }
+    cur.execute("SELECT fingerprint, id FROM questions WHERE fingerprint = ANY(%s)",
+                (list(set(fingerprints.values())),))
+    # The copy to keep for each fingerprint: one already fingerprinted, else the oldest
+    kept = dict(cur.fetchall())
+    merged = {}
+    for question_id, fingerprint in fingerprints.items():
+        if fingerprint in kept:
+            merged[question_id] = kept[fingerprint]
+        else:
+            kept[fingerprint] = question_id
+
+    for duplicate_id, kept_id in merged.items():
+        # A game that had both copies keeps only the link to the kept one
+        cur.execute("""
+            DELETE FROM game_questions AS gq
+            WHERE gq.question_id = %(duplicate)s
+              AND EXISTS (SELECT 1 FROM game_questions
+                          WHERE game_id = gq.game_id AND question_id = %(kept)s)
+        """, {"duplicate": duplicate_id, "kept": kept_id})
+        cur.execute("UPDATE game_questions SET question_id = %s WHERE question_id = %s", (kept_id, duplicate_id))
+        # Likewise an in-progress game with both copies would ask the kept one
+        # twice, and its rounds no longer match its links, so it is dropped
+        cur.execute("""
+            DELETE FROM game_sessions
+            WHERE %(duplicate)s = ANY(question_ids) AND %(kept)s = ANY(question_ids)
+        """, {"duplicate": duplicate_id, "kept": kept_id})
+        cur.execute("""
+            UPDATE game_sessions SET question_ids = array_replace(question_ids, %s, %s)
+            WHERE %s = ANY(question_ids)
+        """, (duplicate_id, kept_id, duplicate_id))
+        cur.execute("DELETE FROM question_stats WHERE question_id = %s", (duplicate_id,))
+        cur.execute("DELETE FROM questions WHERE id = %s", (duplicate_id,))
+
+    execute_values(cur, """
+        UPDATE questions SET fingerprint = v.fingerprint
+        FROM (VALUES %s) AS v(id, fingerprint)
+        WHERE questions.id = v.id
+    """, [(question_id, fingerprint) for fingerprint, question_id in kept.items() if question_id in fingerprints])
+
+    if merged:
+        cur.execute("SELECT refresh_quiz_stats()")
+        cur.execute("""
+            UPDATE users
+            SET seen_questions = mark_questions_seen(users.seen_questions, history.question_ids)
+            FROM (
+                SELECT g.user_id, array_agg(DISTINCT gq.question_id) AS question_ids
+                FROM game_questions AS gq
+                JOIN games AS g ON g.id = gq.game_id
+                WHERE gq.question_id = ANY(%s)
+                GROUP BY g.user_id
+            ) AS history
+            WHERE users.id = history.user_id
+        """, (list(set(merged.values())),))
\ No newline at end of file
@@ -0,0 +1,29 @@
+-- Publishes every change to user_stats on the leaderboard channel once its
+-- transaction commits, whichever process made it, so each in-memory
+-- Leaderboard is kept current one player at a time (see LeaderboardListener
+-- in db/leaderboard.py). TRUNCATE, as done by refresh_quiz_stats(), asks
+-- listeners to reload instead.
+
+CREATE OR REPLACE FUNCTION notify_leaderboard() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('leaderboard', 'reload');
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('leaderboard', json_build_array(OLD.user_id, 0, 0, 0)::text);
+    ELSE
+        PERFORM pg_notify('leaderboard', json_build_array(
+            NEW.user_id, NEW.total_games, NEW.total_correct, NEW.total_questions)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_stats_leaderboard ON user_stats;
+CREATE TRIGGER user_stats_leaderboard
+    AFTER INSERT OR UPDATE OR DELETE ON user_stats
+    FOR EACH ROW EXECUTE FUNCTION notify_leaderboard();
+
+DROP TRIGGER IF EXISTS user_stats_leaderboard_truncate ON user_stats;
+CREATE TRIGGER user_stats_leaderboard_truncate
+    AFTER TRUNCATE ON user_stats
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_leaderboard();
\ No newline at end of file
@@ -1,25 +1,213 @@
 from .conn import DatabaseConnection
+from .cache import EntityCache
+from .leaderboard import Leaderboard
 from .schema import Question, Game, User, GameQuestion
-from typing import List, Optional
+from .seen import SeenQuestions
+from . import stats, statements
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 from datetime import datetime
+from psycopg2.extras import execute_values
+import itertools
 import json
+import psycopg2.errors
+
+QUESTION_UPSERT_SQL = """
+    INSERT INTO questions (
+        question, description, explanation,
+        category, difficulty, answers, correct_answers, fingerprint
+    )
+    VALUES %s
+    ON CONFLICT (fingerprint) DO UPDATE SET fingerprint = EXCLUDED.fingerprint
+    RETURNING id, fingerprint, (xmax = 0) AS inserted
+"""
+
+# Sets a game's score, returning its user and the change in score
+UPDATE_SCORE_SQL = """
+    WITH old AS (
+        SELECT id, score FROM games WHERE id = %s FOR UPDATE
+    )
+    UPDATE games
+    SET score = %s
+    FROM old
+    WHERE games.id = old.id
+    RETURNING games.user_id, games.score - old.score
+"""
+
+GAME_ROUNDS_SQL = """
+    SELECT gq.id, gq.game_id, gq.question_id, gq.selected_answer_index,
+           gq.is_correct, gq.answered_at,
+           q.id, q.question, q.description, q.explanation, q.category,
+           q.difficulty, q.answers, q.correct_answers, q.fingerprint
+    FROM game_questions AS gq
+    JOIN questions AS q ON q.id = gq.question_id
+    WHERE gq.game_id = %s
+    ORDER BY gq.id
+"""
+
+# Links questions to a game in the order given
+GAME_QUESTIONS_INSERT_SQL = """
+    INSERT INTO game_questions (game_id, question_id)
+    SELECT %s::int, question_id FROM unnest(%s::int[]) WITH ORDINALITY AS q(question_id, n)
+    ORDER BY n
+"""
+
+# Records that a game's player has now seen its questions (see db/seen.py)
+MARK_QUESTIONS_SEEN_SQL = """
+    UPDATE users
+    SET seen_questions = mark_questions_seen(seen_questions, %s::int[])
+    WHERE id = (SELECT user_id FROM games WHERE id = %s)
+"""
+
+QUESTION_COLUMNS = "id, question, description, explanation, category, difficulty, answers, correct_answers, fingerprint"
+
+# Hot statements, prepared once per connection (see db.statements)
+INSERT_USER = statements.register("insert_user", """
+    INSERT INTO users (username)
+    VALUES (%s)
+    RETURNING id
+""")
+USER_BY_ID = statements.register("user_by_id", "SELECT id, username FROM users WHERE id = %s")
+USER_BY_USERNAME = statements.register("user_by_username", "SELECT id, username FROM users WHERE username = %s")
+USERS_BY_IDS = statements.register("users_by_ids", "SELECT id, username FROM users WHERE id = ANY(%s)")
+USER_SEEN_QUESTIONS = statements.register("user_seen_questions", "SELECT seen_questions FROM users WHERE id = %s")
+QUESTION_BY_ID = statements.register("question_by_id", f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = %s")
+QUESTIONS_BY_IDS = statements.register("questions_by_ids", f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ANY(%s)")
+QUESTION_IDS_BY_FINGERPRINTS = statements.register(
+    "question_ids_by_fingerprints", "SELECT fingerprint, id FROM questions WHERE fingerprint = ANY(%s)")
+ANSWER_QUESTION = statements.register("answer_question", """
+    WITH old AS (
+        SELECT id, is_correct FROM game_questions
+        WHERE game_id = %s AND question_id = %s
+        FOR UPDATE
+    )
+    UPDATE game_questions
+    SET selected_answer_index = %s,
+        is_correct = %s,
+        answered_at = %s
+    FROM old
+    WHERE game_questions.id = old.id
+    RETURNING (game_questions.is_correct IS TRUE)::int - (old.is_correct IS TRUE)::int
+""")
+INSERT_GAME = statements.register("insert_game", """
+    INSERT INTO games (user_id, rounds, score)
+    VALUES (%s, %s, 0)
+    RETURNING id, created_at
+""")
+INSERT_GAME_QUESTIONS = statements.register("insert_game_questions", GAME_QUESTIONS_INSERT_SQL)
+MARK_QUESTIONS_SEEN = statements.register("mark_questions_seen", MARK_QUESTIONS_SEEN_SQL)
+UPDATE_SCORE = statements.register("update_score", UPDATE_SCORE_SQL)
+GAME_BY_ID = statements.register("game_by_id", """
+    SELECT id, user_id, rounds, score, created_at
+    FROM games WHERE id = %s
+""")
+GAME_QUESTIONS = statements.register("game_questions", """
+    SELECT id, game_id, question_id, selected_answer_index,
+           is_correct, answered_at
+    FROM game_questions
+    WHERE game_id = %s
+""")
+GAME_ROUNDS = statements.register("game_rounds", GAME_ROUNDS_SQL)
+DELETE_GAME_QUESTIONS = statements.register("delete_game_questions", "DELETE FROM game_questions WHERE game_id = %s")
+DELETE_GAME = statements.register("delete_game", "DELETE FROM games WHERE id = %s")
+SESSION_BY_GAME = statements.register("session_by_game", """
+    SELECT game_id, user_id, question_ids, correct_mask, current_round
+    FROM game_sessions WHERE game_id = %s
+""")
+LATEST_SESSION = statements.register("latest_session", """
+    SELECT game_id, user_id, question_ids, correct_mask, current_round
+    FROM game_sessions WHERE user_id = %s
+    ORDER BY updated_at DESC
+    LIMIT 1
+""")
+DELETE_SESSION = statements.register("delete_session", "DELETE FROM game_sessions WHERE game_id = %s")
+
+SYNCHRONOUS_COMMIT_LEVELS = ("on", "off", "local", "remote_write", "remote_apply")
+
+# Rows fetched per round trip by the iter_all_* methods
+DEFAULT_ITERSIZE = 2000
+
+_cursor_names = itertools.count(1)
+
+class DuplicateQuestionError(Exception):
+    """A question with the same content (fingerprint) is already stored as ``existing_id``"""
+
+    def __init__(self, message: str, existing_id: Optional[int] = None, original_error: Exception = None):
+        self.message = message
+        self.existing_id = existing_id
+        self.original_error = original_error
+        super().__init__(self.message)
+
+T = TypeVar("T")
+
+def question_row(question: Question) -> tuple:
+    """Column values for inserting a question, filling in its fingerprint"""
+    question.fingerprint = question.compute_fingerprint()
+    return (
+        question.question,
+        question.description,
+        question.explanation,
+        question.category,
+        question.difficulty,
+        json.dumps(question.answers),
+        json.dumps(question.correct_answers),
+        question.fingerprint
+    )
+
+def games_page_query(user_id: Optional[int], limit: int,
+                     after: Optional[Tuple[datetime, int]]) -> Tuple[str, tuple]:
+    """SQL and parameters for GameRepository.get_games_page"""
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if after is not None:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        SELECT id, user_id, rounds, score, created_at
+        FROM games
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, (*params, limit)
+
+def stream_rows(db: DatabaseConnection, query: str, make: Callable[..., T], params=None,
+                itersize: int = DEFAULT_ITERSIZE) -> Iterator[T]:
+    """``make(*row)`` for the rows of ``query``, read through a named (server-side)
+    cursor ``itersize`` rows at a time.
+
+    The first rows arrive without waiting for the rest and memory doesn't
+    grow with the result. A pooled connection is held, in an open
+    transaction, until the generator is exhausted or closed, so close it
+    when stopping early rather than leaving it to the garbage collector.
+    """
+    conn = db.get_connection()
+    try:
+        with conn.cursor(name=f"stream_{next(_cursor_names)}") as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            for row in cur:
+                yield make(*row)
+    finally:
+        db.return_connection(conn)
 
 class UserRepository:
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, cache: Optional[EntityCache] = None):
         self.db = db_connection
+        self.cache = cache
     
     def create_user(self, username: str) -> Optional[User]:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO users (username)
-                    VALUES (%s)
-                    RETURNING id
-                """, (username,))
+                statements.execute(cur, INSERT_USER, (username,))
                 user_id = cur.fetchone()[0]
+                stats.record_user_created(cur, user_id)
                 conn.commit()
-                return User(id=user_id, username=username)
+                user = User(id=user_id, username=username)
+                self._cache_user(user)
+                return user
         except Exception as e:
             conn.rollback()
             raise e
@@ -37,44 +225,96 @@ class UserRepository:
                 ]
         finally:
             self.db.return_connection(conn)
+
+    def iter_all_users(self, itersize: int = DEFAULT_ITERSIZE) -> Iterator[User]:
+        return stream_rows(self.db, "SELECT id, username FROM users ORDER BY id", User, itersize=itersize)
     
     def get_user_by_id(self, user_id: int) -> Optional[User]:
+        if self.cache is not None:
+            user = self.cache.get("user", user_id)
+            if user is not None:
+                return user
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, username FROM users WHERE id = %s", (user_id,))
+                statements.execute(cur, USER_BY_ID, (user_id,))
                 result = cur.fetchone()
-                return User(id=result[0], username=result[1]) if result else None
+                user = User(id=result[0], username=result[1]) if result else None
         finally:
             self.db.return_connection(conn)
+        self._cache_user(user)
+        return user
 
     def get_user_by_username(self, username: str) -> Optional[User]:
+        if self.cache is not None:
+            user = self.cache.get("username", username)
+            if user is not None:
+                return user
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, USER_BY_USERNAME, (username,))
+                result = cur.fetchone()
+                user = User(id=result[0], username=result[1]) if result else None
+        finally:
+            self.db.return_connection(conn)
+        self._cache_user(user)
+        return user
+
+    def get_seen_questions(self, user_id: int) -> SeenQuestions:
+        """The questions a player has been given so far; one primary key lookup, not a history query"""
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, username FROM users WHERE username = %s", (username,))
+                statements.execute(cur, USER_SEEN_QUESTIONS, (user_id,))
                 result = cur.fetchone()
-                return User(id=result[0], username=result[1]) if result else None
         finally:
             self.db.return_connection(conn)
+        return SeenQuestions(result[0] if result else b"")
+
+    def get_users_by_ids(self, user_ids: List[int]) -> Dict[int, User]:
+        """Bulk lookup by id; ids that don't exist are left out"""
+        found = self.cache.get_many("user", user_ids) if self.cache is not None else {}
+        missing = [user_id for user_id in user_ids if user_id not in found]
+        if not missing:
+            return found
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, USERS_BY_IDS, (missing,))
+                loaded = [User(id=row[0], username=row[1]) for row in cur.fetchall()]
+        finally:
+            self.db.return_connection(conn)
+        for user in loaded:
+            self._cache_user(user)
+            found[user.id] = user
+        return found
+
+    def _cache_user(self, user: Optional[User]) -> None:
+        if self.cache is not None and user is not None:
+            self.cache.put("user", user.id, user)
+            self.cache.put("username", user.username, user)
 
 class QuestionRepository:
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, cache: Optional[EntityCache] = None):
         self.db = db_connection
+        self.cache = cache
 
     def create_question(self, question: Question) -> Optional[Question]:
+        """Store a new question; raises DuplicateQuestionError if an identical one exists"""
         conn = self.db.get_connection()
         try:
             print("Creating question")
             with conn.cursor() as cur:
                 answers_json = json.dumps(question.answers)
                 correct_answers_json = json.dumps(question.correct_answers)
+                question.fingerprint = question.compute_fingerprint()
                 cur.execute("""
                     INSERT INTO questions (
                         question, description, explanation, 
-                        category, difficulty, answers, correct_answers
+                        category, difficulty, answers, correct_answers, fingerprint
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     RETURNING id
                 """, (
                     question.question,
@@ -83,16 +323,43 @@ class QuestionRepository:
                     question.category,
                     question.difficulty,
                     answers_json,
-                    correct_answers_json
+                    correct_answers_json,
+                    question.fingerprint
                 ))
                 print("Question created")
                 question_id = cur.fetchone()[0]
+                stats.record_questions_created(cur, [question_id])
                 conn.commit()
                 
                 # Update the question id and return
                 question.id = question_id
+                self._cache_question(question)
                 return question
                 
+        except psycopg2.errors.UniqueViolation as e:
+            conn.rollback()
+            raise self._duplicate(conn, question, e)
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
+
+    def upsert_question(self, question: Question) -> Question:
+        """Store a question unless an identical one exists, returning it with the stored id"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                # DO UPDATE rather than DO NOTHING so RETURNING also yields
+                # the id of an already stored question
+                execute_values(cur, QUESTION_UPSERT_SQL, [question_row(question)])
+                question.id, _, inserted = cur.fetchone()
+                if inserted:
+                    stats.record_questions_created(cur, [question.id])
+                conn.commit()
+                if inserted:
+                    self._cache_question(question)
+                return question
         except Exception as e:
             conn.rollback()
             raise e
@@ -100,46 +367,103 @@ class QuestionRepository:
             self.db.return_connection(conn)
 
     def get_question_by_id(self, question_id: int) -> Optional[Question]:
+        if self.cache is not None:
+            question = self.cache.get("question", question_id)
+            if question is not None:
+                return question
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT id, question, description, explanation, category, difficulty, answers, correct_answers
-                    FROM questions
-                    WHERE id = %s
-                """, (question_id,))
+                statements.execute(cur, QUESTION_BY_ID, (question_id,))
                 result = cur.fetchone()
-                if result:
-                    return Question(*result)
-                return None
+                question = Question(*result) if result else None
         finally:
             self.db.return_connection(conn)
+        self._cache_question(question)
+        return question
     
     def get_all_questions(self) -> List[Question]:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT id, question, description, explanation, category, difficulty, answers, correct_answers
+                    SELECT id, question, description, explanation, category, difficulty, answers, correct_answers, fingerprint
                     FROM questions
                 """)
                 return [Question(*row) for row in cur.fetchall()]
         finally:
             self.db.return_connection(conn)
+
+    def iter_all_questions(self, itersize: int = DEFAULT_ITERSIZE) -> Iterator[Question]:
+        return stream_rows(self.db, """
+            SELECT id, question, description, explanation, category, difficulty, answers, correct_answers, fingerprint
+            FROM questions
+            ORDER BY id
+        """, Question, itersize=itersize)
     
+    def get_questions_by_ids(self, question_ids: List[int]) -> Dict[int, Question]:
+        """Bulk lookup by id; ids that don't exist are left out"""
+        found = self.cache.get_many("question", question_ids) if self.cache is not None else {}
+        missing = [question_id for question_id in question_ids if question_id not in found]
+        if not missing:
+            return found
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, QUESTIONS_BY_IDS, (missing,))
+                loaded = [Question(*row) for row in cur.fetchall()]
+        finally:
+            self.db.return_connection(conn)
+        for question in loaded:
+            self._cache_question(question)
+            found[question.id] = question
+        return found
+
+    def get_question_ids_by_fingerprints(self, fingerprints: List[str]) -> Dict[str, int]:
+        """Stored question ids by fingerprint; fingerprints not stored are left out"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, QUESTION_IDS_BY_FINGERPRINTS, (fingerprints,))
+                return dict(cur.fetchall())
+        finally:
+            self.db.return_connection(conn)
+
+    def get_question_id_index(self) -> Dict[Tuple[str, str], List[int]]:
+        """Every question id, grouped by (category, difficulty), for sampling without scanning the bank per game"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT category, difficulty, array_agg(id ORDER BY id)
+                    FROM questions
+                    GROUP BY category, difficulty
+                """)
+                return {(category, difficulty): ids for category, difficulty, ids in cur.fetchall()}
+        finally:
+            self.db.return_connection(conn)
+
     def update_question(self, question: Question) -> Optional[Question]:
+        """Save an edited question; raises DuplicateQuestionError if it now matches another one"""
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
                 answers_json = json.dumps(question.answers)
                 correct_answers_json = json.dumps(question.correct_answers)
+                question.fingerprint = question.compute_fingerprint()
                 cur.execute("""
+                    WITH old AS (
+                        SELECT id, category, difficulty FROM questions WHERE id = %s FOR UPDATE
+                    )
                     UPDATE questions
                     SET question = %s, description = %s, explanation = %s, 
-                        category = %s, difficulty = %s, answers = %s, correct_answers = %s
-                    WHERE id = %s
-                    RETURNING id
+                        category = %s, difficulty = %s, answers = %s, correct_answers = %s,
+                        fingerprint = %s
+                    FROM old
+                    WHERE questions.id = old.id
+                    RETURNING old.category, old.difficulty
                 """, (
+                    question.id,
                     question.question,
                     question.description,
                     question.explanation,
@@ -147,16 +471,44 @@ class QuestionRepository:
                     question.difficulty,
                     answers_json,
                     correct_answers_json,
-                    question.id
+                    question.fingerprint,
                 ))
+                old = cur.fetchone()
+                if old:
+                    stats.record_question_moved(cur, question.id, old[0], old[1],
+                                                question.category, question.difficulty)
+                    if self.cache is not None:
+                        self.cache.notify(cur, "question", question.id)
                 conn.commit()
+                if old:
+                    self._cache_question(question)
                 return question
+        except psycopg2.errors.UniqueViolation as e:
+            conn.rollback()
+            if self.cache is not None:
+                self.cache.invalidate("question", question.id)
+            raise self._duplicate(conn, question, e)
         except Exception as e:
             conn.rollback()
+            if self.cache is not None:
+                self.cache.invalidate("question", question.id)
             raise e
         finally:
             self.db.return_connection(conn)
+
+    def _duplicate(self, conn, question: Question, error: Exception) -> DuplicateQuestionError:
+        """The DuplicateQuestionError for a fingerprint conflict, naming the stored copy"""
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM questions WHERE fingerprint = %s", (question.fingerprint,))
+            existing = cur.fetchone()
+        conn.rollback()
+        existing_id = existing[0] if existing else None
+        return DuplicateQuestionError(f"Question already exists (ID: {existing_id})", existing_id, error)
             
+    def _cache_question(self, question: Optional[Question]) -> None:
+        if self.cache is not None and question is not None:
+            self.cache.put("question", question.id, question)
+
     def answer_question(self, game_id: int, question_id: int, answer_index: int, is_correct: bool) -> bool:
         try:
             # Get game and validate
@@ -169,15 +521,13 @@ class QuestionRepository:
             conn = self.db.get_connection()
             try:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE game_questions 
-                        SET selected_answer_index = %s,
-                            is_correct = %s,
-                            answered_at = %s
-                        WHERE game_id = %s AND question_id = %s
-                    """, (answer_index, is_correct, datetime.now(), game_id, question_id))
+                    statements.execute(cur, ANSWER_QUESTION,
+                                       (game_id, question_id, answer_index, is_correct, datetime.now()))
+                    result = cur.fetchone()
+                    if result:
+                        stats.record_answers(cur, [(question_id, result[0])])
                     conn.commit()
-                    return cur.rowcount > 0  # Ensure the update was successful
+                    return result is not None  # Ensure the update was successful
             finally:
                 self.db.return_connection(conn)
                 
@@ -186,20 +536,19 @@ class QuestionRepository:
             return False
             
 class GameRepository:
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, leaderboard: Optional[Leaderboard] = None):
         self.db = db_connection
+        self.leaderboard = leaderboard
     
     def create_game(self, user_id: int, rounds: int) -> Optional[Game]:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO games (user_id, rounds, score)
-                    VALUES (%s, %s, 0)
-                    RETURNING id, created_at
-                """, (user_id, rounds))
+                statements.execute(cur, INSERT_GAME, (user_id, rounds))
                 game_id, created_at = cur.fetchone()
+                totals = stats.record_game_created(cur, user_id, rounds)
                 conn.commit()
+                self._rank(totals)
                 return Game(id=game_id, user_id=user_id, rounds=rounds, 
                           score=0, created_at=created_at)
         except Exception as e:
@@ -208,15 +557,54 @@ class GameRepository:
         finally:
             self.db.return_connection(conn)
     
+    def create_game_with_questions(self, user_id: int, rounds: int, questions: List[Question]) -> Optional[Game]:
+        """Create a game, upsert its questions and link them in a single transaction"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, INSERT_GAME, (user_id, rounds))
+                game_id, created_at = cur.fetchone()
+                totals = stats.record_game_created(cur, user_id, rounds)
+
+                # ON CONFLICT can't touch the same row twice in one statement,
+                # so collapse duplicates within the batch first. Insert in
+                # fingerprint order so concurrent games sharing questions wait
+                # on each other instead of deadlocking on the unique index
+                rows = {}
+                for question in questions:
+                    row = question_row(question)
+                    rows.setdefault(question.fingerprint, row)
+                question_ids = {}
+                if rows:
+                    stored = execute_values(cur, QUESTION_UPSERT_SQL, [rows[key] for key in sorted(rows)],
+                                            page_size=len(rows), fetch=True)
+                    question_ids = {fingerprint: question_id for question_id, fingerprint, _ in stored}
+                    stats.record_questions_created(cur, [question_id for question_id, _, inserted in stored if inserted])
+                for question in questions:
+                    question.id = question_ids[question.fingerprint]
+
+                linked_ids = list(dict.fromkeys(question.id for question in questions))
+                if linked_ids:
+                    stats.record_game_questions(cur, game_id, linked_ids)
+                    statements.execute(cur, INSERT_GAME_QUESTIONS, (game_id, linked_ids))
+                    statements.execute(cur, MARK_QUESTIONS_SEEN, (linked_ids, game_id))
+                conn.commit()
+                self._rank(totals)
+                return Game(id=game_id, user_id=user_id, rounds=rounds,
+                          score=0, created_at=created_at)
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
+
     def add_game_questions(self, game_id: int, question_ids: List[int]) -> bool:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                for question_id in question_ids:
-                    cur.execute("""
-                        INSERT INTO game_questions (game_id, question_id)
-                        VALUES (%s, %s)
-                    """, (game_id, question_id))
+                stats.record_game_questions(cur, game_id, question_ids)
+                statements.execute(cur, INSERT_GAME_QUESTIONS, (game_id, question_ids))
+                statements.execute(cur, MARK_QUESTIONS_SEEN, (question_ids, game_id))
                 conn.commit()
                 return True
         except Exception as e:
@@ -225,14 +613,98 @@ class GameRepository:
         finally:
             self.db.return_connection(conn)
     
+    def update_score(self, game_id: int, score: int) -> bool:
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, UPDATE_SCORE, (game_id, score))
+                result = cur.fetchone()
+                totals = stats.record_score(cur, *result) if result else None
+                conn.commit()
+                self._rank(totals)
+                return result is not None
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
+
+    def save_answers(self, answers: List[Tuple[int, int, int, bool, datetime]],
+                     scores: Optional[Dict[int, int]] = None, synchronous_commit: str = "on") -> int:
+        """Write a batch of answers and final scores in one transaction.
+
+        ``answers`` are (game_id, question_id, answer_index, is_correct,
+        answered_at) rows and ``scores`` maps game ids to their final score.
+        ``synchronous_commit`` applies to this transaction only; "off" trades
+        the last few hundred milliseconds of answers on a server crash for
+        not waiting on the WAL flush. Returns the number of answers stored.
+        """
+        if synchronous_commit not in SYNCHRONOUS_COMMIT_LEVELS:
+            raise ValueError(f"Invalid synchronous_commit level: {synchronous_commit}")
+        # Lock rows in a fixed order so concurrent flushes can't deadlock
+        answers = sorted(answers, key=lambda answer: (answer[0], answer[1]))
+        scores = sorted((scores or {}).items())
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL synchronous_commit TO %s", (synchronous_commit,))
+                updated, ranked = [], []
+                if answers:
+                    updated = execute_values(cur, """
+                        WITH v (game_id, question_id, selected_answer_index, is_correct, answered_at) AS (
+                            VALUES %s
+                        ), old AS (
+                            SELECT gq.id, gq.is_correct FROM game_questions AS gq
+                            JOIN v USING (game_id, question_id)
+                            ORDER BY gq.game_id, gq.question_id
+                            FOR UPDATE OF gq
+                        )
+                        UPDATE game_questions
+                        SET selected_answer_index = v.selected_answer_index,
+                            is_correct = v.is_correct,
+                            answered_at = v.answered_at
+                        FROM old, v
+                        WHERE game_questions.id = old.id
+                          AND game_questions.game_id = v.game_id
+                          AND game_questions.question_id = v.question_id
+                        RETURNING game_questions.question_id,
+                                  (game_questions.is_correct IS TRUE)::int - (old.is_correct IS TRUE)::int
+                    """, answers, template="(%s::int, %s::int, %s::int, %s::boolean, %s::timestamp)",
+                        page_size=len(answers), fetch=True)
+                    stats.record_answers(cur, updated)
+                if scores:
+                    changed = execute_values(cur, """
+                        WITH v (game_id, score) AS (
+                            VALUES %s
+                        ), old AS (
+                            SELECT g.id, g.score FROM games AS g
+                            JOIN v ON v.game_id = g.id
+                            ORDER BY g.id
+                            FOR UPDATE OF g
+                        )
+                        UPDATE games
+                        SET score = v.score
+                        FROM old, v
+                        WHERE games.id = old.id AND v.game_id = old.id
+                        RETURNING games.user_id, games.score - old.score
+                    """, scores, template="(%s::int, %s::int)", page_size=len(scores), fetch=True)
+                    for user_id, delta in changed:
+                        ranked.append(stats.record_score(cur, user_id, delta))
+                conn.commit()
+                for totals in ranked:
+                    self._rank(totals)
+                return len(updated)
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
+
     def get_game(self, game_id: int) -> Optional[Game]:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT id, user_id, rounds, score, created_at 
-                    FROM games WHERE id = %s
-                """, (game_id,))
+                statements.execute(cur, GAME_BY_ID, (game_id,))
                 result = cur.fetchone()
                 if result:
                     return Game(
@@ -291,18 +763,65 @@ class GameRepository:
                 ]
         finally:
             self.db.return_connection(conn)
+
+    def iter_all_games(self, itersize: int = DEFAULT_ITERSIZE) -> Iterator[Game]:
+        """Every game, newest first"""
+        return stream_rows(self.db, """
+            SELECT id, user_id, rounds, score, created_at
+            FROM games
+            ORDER BY created_at DESC, id DESC
+        """, Game, itersize=itersize)
     
+    def get_games_page(self, user_id: Optional[int] = None, limit: int = 20,
+                       after: Optional[Tuple[datetime, int]] = None) -> List[Game]:
+        """Newest-first page of games, optionally for one user.
+
+        ``after`` is the (created_at, id) of the last game on the previous
+        page; the next page starts right below it without scanning or
+        skipping the rows already shown.
+        """
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*games_page_query(user_id, limit, after))
+                return [
+                    Game(
+                        id=row[0],
+                        user_id=row[1],
+                        rounds=row[2],
+                        score=row[3],
+                        created_at=row[4]
+                    )
+                    for row in cur.fetchall()
+                ]
+        finally:
+            self.db.return_connection(conn)
+
+    def iter_game_pages(self, user_id: Optional[int] = None, page_size: int = 20) -> Iterator[List[Game]]:
+        """Yield successive pages from get_games_page until the games run out"""
+        after = None
+        while True:
+            page = self.get_games_page(user_id, page_size, after)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1].created_at, page[-1].id)
+
     def delete_game(self, game_id: int) -> bool:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
+                totals = stats.record_game_deleted(cur, game_id)
+
                 # Delete entries in game_questions that reference this game
-                cur.execute("DELETE FROM game_questions WHERE game_id = %s", (game_id,))
+                statements.execute(cur, DELETE_GAME_QUESTIONS, (game_id,))
                 
                 # Delete the game itself
-                cur.execute("DELETE FROM games WHERE id = %s", (game_id,))
+                statements.execute(cur, DELETE_GAME, (game_id,))
                 
                 conn.commit()
+                self._rank(totals)
                 return True
         except Exception as e:
             conn.rollback()
@@ -314,12 +833,7 @@ class GameRepository:
         conn = self.db.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT id, game_id, question_id, selected_answer_index, 
-                           is_correct, answered_at
-                    FROM game_questions 
-                    WHERE game_id = %s
-                """, (game_id,))
+                statements.execute(cur, GAME_QUESTIONS, (game_id,))
                 return [
                     GameQuestion(
                         id=row[0],
@@ -331,5 +845,84 @@ class GameRepository:
                     )
                     for row in cur.fetchall()
                 ]
+        finally:
+            self.db.return_connection(conn)
+
+    def get_game_rounds(self, game_id: int) -> List[Tuple[GameQuestion, Question]]:
+        """A game's questions joined with their full Question rows, in the order they were added"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, GAME_ROUNDS, (game_id,))
+                return [
+                    (GameQuestion(*row[:6]), Question(*row[6:]))
+                    for row in cur.fetchall()
+                ]
+        finally:
+            self.db.return_connection(conn)
+
+    def _rank(self, totals: Optional[stats.UserTotals]) -> None:
+        """Pass a player's committed totals on to the leaderboard"""
+        if self.leaderboard is not None and totals is not None:
+            self.leaderboard.update(*totals)
+
+class GameSessionRepository:
+    """Storage for in-progress games spilled out of a server's memory"""
+
+    def __init__(self, db_connection: DatabaseConnection):
+        self.db = db_connection
+
+    def save_sessions(self, sessions: List[Tuple[int, int, List[int], int, int]]) -> None:
+        """Upsert (game_id, user_id, question_ids, correct_mask, current_round) rows"""
+        if not sessions:
+            return
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO game_sessions (game_id, user_id, question_ids, correct_mask, current_round)
+                    VALUES %s
+                    ON CONFLICT (game_id) DO UPDATE
+                    SET question_ids = EXCLUDED.question_ids,
+                        correct_mask = EXCLUDED.correct_mask,
+                        current_round = EXCLUDED.current_round,
+                        updated_at = CURRENT_TIMESTAMP
+                """, sorted(sessions), page_size=len(sessions))
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
+
+    def get_session(self, game_id: int) -> Optional[Tuple[int, int, List[int], int, int]]:
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, SESSION_BY_GAME, (game_id,))
+                return cur.fetchone()
+        finally:
+            self.db.return_connection(conn)
+
+    def get_latest_session(self, user_id: int) -> Optional[Tuple[int, int, List[int], int, int]]:
+        """The user's most recently spilled unfinished game, if any"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, LATEST_SESSION, (user_id,))
+                return cur.fetchone()
+        finally:
+            self.db.return_connection(conn)
+
+    def delete_session(self, game_id: int) -> bool:
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                statements.execute(cur, DELETE_SESSION, (game_id,))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            conn.rollback()
+            raise e
         finally:
             self.db.return_connection(conn)
\ No newline at end of file
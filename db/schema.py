@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Optional, List, Dict
 from datetime import datetime
+import hashlib
+import json
 
 
 @dataclass
@@ -18,6 +20,17 @@ class Question:
     difficulty: str
     answers: List[str]
     correct_answers: List[bool]
+    fingerprint: Optional[str] = None
+
+    def compute_fingerprint(self) -> str:
+        """Stable content hash used to store each distinct question only once"""
+        normalize = lambda text: " ".join(str(text or "").split()).lower()
+        content = json.dumps([
+            normalize(self.question),
+            [normalize(answer) for answer in self.answers],
+            [bool(correct) for correct in self.correct_answers]
+        ], separators=(",", ":"))
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
     
 @dataclass
 class Game:
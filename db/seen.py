@@ -0,0 +1,19 @@
+class SeenQuestions:
+    """A player's users.seen_questions bitmap, checked in O(1) per question id.
+
+    Bit n is byte n // 8, bit n % 8, the numbering of Postgres' get_bit and
+    set_bit; mark_questions_seen() (migration 0005) sets the bits whenever
+    questions are linked to one of the player's games.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: bytes = b""):
+        self.bits = bytes(bits)
+
+    def __contains__(self, question_id: int) -> bool:
+        byte = question_id >> 3
+        return 0 <= byte < len(self.bits) and bool(self.bits[byte] >> (question_id & 7) & 1)
+
+    def __bool__(self) -> bool:
+        return any(self.bits)
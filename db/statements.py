@@ -0,0 +1,148 @@
+from .conn import LatencyHistogram
+from os import environ
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Union
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import re
+import threading
+import time
+import weakref
+
+# %s, %(name)s and the %% escape, as psycopg2 reads them
+_PLACEHOLDER = re.compile(r"%%|%s|%\((\w+)\)s")
+_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+class Statement:
+    __slots__ = ("name", "sql", "body", "keys", "execute_sql", "prepares", "histogram")
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        keys = [match.group(1) for match in _PLACEHOLDER.finditer(sql) if match.group(0) != "%%"]
+        if any(keys) and not all(keys):
+            raise ValueError(f"Statement {name} mixes %s and %(name)s placeholders")
+        # Named parameters in order of first use, None for positional ones
+        self.keys: Optional[List[str]] = list(dict.fromkeys(keys)) if any(keys) else None
+        positional = iter(range(1, len(keys) + 1))
+
+        def number(match: re.Match) -> str:
+            if match.group(0) == "%%":
+                return "%"
+            if match.group(1):
+                return f"${self.keys.index(match.group(1)) + 1}"
+            return f"${next(positional)}"
+
+        self.body = _PLACEHOLDER.sub(number, sql)
+        arity = len(self.keys) if self.keys is not None else len(keys)
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * arity)})" if arity else f"EXECUTE {name}"
+        self.prepares = 0
+        self.histogram = LatencyHistogram()
+
+    def args(self, params: Union[Sequence, Mapping, None]) -> Sequence:
+        if self.keys is None:
+            return tuple(params or ())
+        return tuple(params[key] for key in self.keys)
+
+class StatementRegistry:
+    """Named SQL statements, PREPAREd once per connection and then run with EXECUTE.
+
+    Each statement is prepared lazily, the first time it runs on a
+    connection; prepared statements outlive transactions, including rolled
+    back ones, so later calls skip parsing and planning. Connections the
+    pool closes and replaces simply start over, and if the server has
+    forgotten a statement (DISCARD ALL, a connection pooler) the
+    connection's statements are deallocated and prepared again. With ``enabled`` off, statements are sent as plain SQL, e.g. for
+    transaction-pooling proxies that can't keep prepared statements.
+    Calls, prepares and latency are counted per statement in ``stats()``.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._statements: Dict[str, Statement] = {}
+        # Statement names prepared on each live connection
+        self._prepared: "weakref.WeakKeyDictionary[psycopg2.extensions.connection, Set[str]]" = weakref.WeakKeyDictionary()
+        # Connections whose server-side statements are unknown, deallocated before the next PREPARE
+        self._stale: "weakref.WeakSet[psycopg2.extensions.connection]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, sql: str) -> str:
+        """Add a statement written with %s or %(name)s placeholders and return its name"""
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"Invalid statement name: {name}")
+        statement = Statement(name, sql)
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None and existing.sql != sql:
+                raise ValueError(f"Statement {name} is already registered with different SQL")
+            self._statements.setdefault(name, statement)
+        return name
+
+    def execute(self, cur, name: str, params: Union[Sequence, Mapping, None] = None) -> None:
+        """Run a registered statement on ``cur``, preparing it on the connection first if needed"""
+        statement = self._statements[name]
+        started = time.perf_counter()
+        try:
+            if not self.enabled:
+                cur.execute(statement.sql, params)
+                return
+            conn = cur.connection
+            # The statement starts the transaction, so it can be retried after a rollback
+            retriable = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            try:
+                self._execute_prepared(cur, statement, params)
+            except psycopg2.errors.InvalidSqlStatementName:
+                self.forget(conn)
+                if not retriable:
+                    raise
+                conn.rollback()
+                self._execute_prepared(cur, statement, params)
+        finally:
+            statement.histogram.observe(time.perf_counter() - started)
+
+    def _execute_prepared(self, cur, statement: Statement, params) -> None:
+        with self._lock:
+            stale = cur.connection in self._stale
+            self._stale.discard(cur.connection)
+            prepared = self._prepared.setdefault(cur.connection, set())
+        if stale:
+            # Some statements may still be prepared, and would fail to PREPARE again
+            cur.execute("DEALLOCATE ALL")
+        if statement.name not in prepared:
+            cur.execute(f"PREPARE {statement.name} AS {statement.body}")
+            prepared.add(statement.name)
+            with self._lock:
+                statement.prepares += 1
+        cur.execute(statement.execute_sql, statement.args(params))
+
+    def forget(self, conn) -> None:
+        """Start ``conn`` over: the next call deallocates whatever the server
+        still has prepared, then statements are prepared again as they run"""
+        with self._lock:
+            self._prepared.pop(conn, None)
+            self._stale.add(conn)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Calls, prepares and latency per statement that has run"""
+        with self._lock:
+            statements = list(self._statements.values())
+        return {
+            statement.name: {
+                "calls": statement.histogram.count,
+                "prepares": statement.prepares,
+                "time": statement.histogram.snapshot()
+            }
+            for statement in statements if statement.histogram.count
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for statement in self._statements.values():
+                statement.prepares = 0
+                statement.histogram = LatencyHistogram(statement.histogram.buckets)
+
+# The repositories' hot statements, registered when db.repository and db.stats are imported
+registry = StatementRegistry(enabled=environ.get('DB_PREPARED_STATEMENTS', '1') != '0')
+
+register = registry.register
+execute = registry.execute
\ No newline at end of file
@@ -0,0 +1,447 @@
+from .conn import DatabaseConnection
+from . import statements
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Incremental maintenance of the summary tables behind the statistics
+# dashboard (user_stats, question_stats, category_stats, difficulty_stats).
+# Every function takes the cursor of the transaction doing the write, so the
+# summaries commit or roll back together with the rows they describe.
+#
+# Upserts select their rows ORDER BY key so concurrent transactions lock the
+# shared category/difficulty rows in the same order and can't deadlock.
+#
+# Functions that change a player's totals return the new user_stats row as
+# (user_id, total_games, total_correct, total_questions), which is what
+# Leaderboard.update takes once the transaction has committed.
+#
+# The statements run on every game, so the blocking functions execute them
+# as prepared statements (db.statements); the *_async twins send the same
+# SQL through psycopg 3, which prepares repeated queries by itself.
+
+UserTotals = Tuple[int, int, int, int]
+
+USER_CREATED_SQL = """
+    INSERT INTO user_stats (user_id) VALUES (%s)
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+USER_CREATED = statements.register("stats_user_created", USER_CREATED_SQL)
+
+def record_user_created(cur, user_id: int) -> None:
+    statements.execute(cur, USER_CREATED, (user_id,))
+
+QUESTIONS_CREATED_SQL = ("""
+    INSERT INTO category_stats (category, total_questions)
+    SELECT category, COUNT(*) FROM questions
+    WHERE id = ANY(%s)
+    GROUP BY category ORDER BY category
+    ON CONFLICT (category) DO UPDATE
+    SET total_questions = category_stats.total_questions + EXCLUDED.total_questions
+""", """
+    INSERT INTO difficulty_stats (difficulty, total_questions)
+    SELECT difficulty, COUNT(*) FROM questions
+    WHERE id = ANY(%s)
+    GROUP BY difficulty ORDER BY difficulty
+    ON CONFLICT (difficulty) DO UPDATE
+    SET total_questions = difficulty_stats.total_questions + EXCLUDED.total_questions
+""")
+
+QUESTIONS_CREATED = tuple(statements.register(f"stats_questions_created_{i}", sql)
+                          for i, sql in enumerate(QUESTIONS_CREATED_SQL, 1))
+
+def record_questions_created(cur, question_ids: List[int]) -> None:
+    """Count newly inserted questions in their category and difficulty"""
+    if not question_ids:
+        return
+    for name in QUESTIONS_CREATED:
+        statements.execute(cur, name, (question_ids,))
+
+GAME_CREATED_SQL = """
+    INSERT INTO user_stats (user_id, total_games, total_questions) VALUES (%s, 1, %s)
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_games = user_stats.total_games + 1,
+        total_questions = user_stats.total_questions + EXCLUDED.total_questions
+    RETURNING user_id, total_games, total_correct, total_questions
+"""
+
+GAME_CREATED = statements.register("stats_game_created", GAME_CREATED_SQL)
+
+def record_game_created(cur, user_id: int, rounds: int) -> UserTotals:
+    statements.execute(cur, GAME_CREATED, (user_id, rounds))
+    return cur.fetchone()
+
+GAME_QUESTIONS_SQL = ("""
+    INSERT INTO question_stats (question_id, attempts)
+    SELECT question_id, COUNT(*) FROM unnest(%(question_ids)s::int[]) AS question_id
+    GROUP BY question_id ORDER BY question_id
+    ON CONFLICT (question_id) DO UPDATE
+    SET attempts = question_stats.attempts + EXCLUDED.attempts
+""", """
+    INSERT INTO category_stats (category, attempts, times_played)
+    SELECT q.category, COUNT(*),
+           CASE WHEN EXISTS (
+               SELECT 1 FROM game_questions gq
+               JOIN questions played ON played.id = gq.question_id
+               WHERE gq.game_id = %(game_id)s AND played.category = q.category
+           ) THEN 0 ELSE 1 END
+    FROM questions q
+    WHERE q.id = ANY(%(question_ids)s)
+    GROUP BY q.category ORDER BY q.category
+    ON CONFLICT (category) DO UPDATE
+    SET attempts = category_stats.attempts + EXCLUDED.attempts,
+        times_played = category_stats.times_played + EXCLUDED.times_played
+""", """
+    INSERT INTO difficulty_stats (difficulty, attempts)
+    SELECT difficulty, COUNT(*) FROM questions
+    WHERE id = ANY(%(question_ids)s)
+    GROUP BY difficulty ORDER BY difficulty
+    ON CONFLICT (difficulty) DO UPDATE
+    SET attempts = difficulty_stats.attempts + EXCLUDED.attempts
+""")
+
+GAME_QUESTIONS = tuple(statements.register(f"stats_game_questions_{i}", sql)
+                       for i, sql in enumerate(GAME_QUESTIONS_SQL, 1))
+
+def record_game_questions(cur, game_id: int, question_ids: List[int]) -> None:
+    """Count questions about to be linked to a game as attempts.
+
+    Must run before the game_questions rows are inserted: a category only
+    counts as played once per game, so categories the game already has
+    links for are not counted again.
+    """
+    if not question_ids:
+        return
+    params = {"game_id": game_id, "question_ids": question_ids}
+    for name in GAME_QUESTIONS:
+        statements.execute(cur, name, params)
+
+ANSWERS_SQL = ("""
+    INSERT INTO question_stats (question_id, correct)
+    SELECT question_id, SUM(delta)
+    FROM unnest(%(question_ids)s::int[], %(deltas)s::int[]) AS d(question_id, delta)
+    GROUP BY question_id ORDER BY question_id
+    ON CONFLICT (question_id) DO UPDATE
+    SET correct = question_stats.correct + EXCLUDED.correct
+""", """
+    INSERT INTO category_stats (category, correct)
+    SELECT q.category, SUM(d.delta)
+    FROM unnest(%(question_ids)s::int[], %(deltas)s::int[]) AS d(question_id, delta)
+    JOIN questions q ON q.id = d.question_id
+    GROUP BY q.category ORDER BY q.category
+    ON CONFLICT (category) DO UPDATE
+    SET correct = category_stats.correct + EXCLUDED.correct
+""", """
+    INSERT INTO difficulty_stats (difficulty, correct)
+    SELECT q.difficulty, SUM(d.delta)
+    FROM unnest(%(question_ids)s::int[], %(deltas)s::int[]) AS d(question_id, delta)
+    JOIN questions q ON q.id = d.question_id
+    GROUP BY q.difficulty ORDER BY q.difficulty
+    ON CONFLICT (difficulty) DO UPDATE
+    SET correct = difficulty_stats.correct + EXCLUDED.correct
+""")
+
+def answer_params(deltas: Iterable[Tuple[int, int]]) -> Optional[Dict[str, List[int]]]:
+    """ANSWERS_SQL parameters for the non-zero deltas, None if there are none"""
+    deltas = [(question_id, delta) for question_id, delta in deltas if delta]
+    if not deltas:
+        return None
+    return {
+        "question_ids": [question_id for question_id, _ in deltas],
+        "deltas": [delta for _, delta in deltas]
+    }
+
+ANSWERS = tuple(statements.register(f"stats_answers_{i}", sql) for i, sql in enumerate(ANSWERS_SQL, 1))
+
+def record_answers(cur, deltas: Iterable[Tuple[int, int]]) -> None:
+    """Apply (question_id, change in correct answers) pairs.
+
+    The change is +1 for a newly correct answer, -1 for a correct answer
+    that was changed to a wrong one, and 0 otherwise.
+    """
+    params = answer_params(deltas)
+    if params is None:
+        return
+    for name in ANSWERS:
+        statements.execute(cur, name, params)
+
+SCORE_SQL = """
+    INSERT INTO user_stats (user_id, total_correct) VALUES (%s, %s)
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_correct = user_stats.total_correct + EXCLUDED.total_correct
+    RETURNING user_id, total_games, total_correct, total_questions
+"""
+
+SCORE = statements.register("stats_score", SCORE_SQL)
+
+def record_score(cur, user_id: int, delta: int) -> Optional[UserTotals]:
+    """Apply the change in a game's score to its player's totals"""
+    if not delta:
+        return None
+    statements.execute(cur, SCORE, (user_id, delta))
+    return cur.fetchone()
+
+GAME_DELETED_SQL = ("""
+    UPDATE user_stats us
+    SET total_games = us.total_games - 1,
+        total_correct = us.total_correct - g.score,
+        total_questions = us.total_questions - g.rounds
+    FROM games g
+    WHERE g.id = %s AND us.user_id = g.user_id
+    RETURNING us.user_id, us.total_games, us.total_correct, us.total_questions
+""", """
+    UPDATE question_stats qs
+    SET attempts = qs.attempts - 1,
+        correct = qs.correct - (gq.is_correct IS TRUE)::int
+    FROM game_questions gq
+    WHERE gq.game_id = %s AND qs.question_id = gq.question_id
+""", """
+    UPDATE category_stats cs
+    SET attempts = cs.attempts - d.attempts,
+        correct = cs.correct - d.correct,
+        times_played = cs.times_played - 1
+    FROM (
+        SELECT q.category, COUNT(*) AS attempts, COUNT(*) FILTER (WHERE gq.is_correct) AS correct
+        FROM game_questions gq
+        JOIN questions q ON q.id = gq.question_id
+        WHERE gq.game_id = %s
+        GROUP BY q.category
+    ) d
+    WHERE cs.category = d.category
+""", """
+    UPDATE difficulty_stats ds
+    SET attempts = ds.attempts - d.attempts,
+        correct = ds.correct - d.correct
+    FROM (
+        SELECT q.difficulty, COUNT(*) AS attempts, COUNT(*) FILTER (WHERE gq.is_correct) AS correct
+        FROM game_questions gq
+        JOIN questions q ON q.id = gq.question_id
+        WHERE gq.game_id = %s
+        GROUP BY q.difficulty
+    ) d
+    WHERE ds.difficulty = d.difficulty
+""")
+
+GAME_DELETED = tuple(statements.register(f"stats_game_deleted_{i}", sql)
+                     for i, sql in enumerate(GAME_DELETED_SQL, 1))
+
+def record_game_deleted(cur, game_id: int) -> Optional[UserTotals]:
+    """Subtract a game from every summary. Must run before its rows are deleted"""
+    user_statement, *other_statements = GAME_DELETED
+    statements.execute(cur, user_statement, (game_id,))
+    totals = cur.fetchone()
+    for name in other_statements:
+        statements.execute(cur, name, (game_id,))
+    return totals
+
+def record_question_moved(cur, question_id: int, old_category: str, old_difficulty: str,
+                          new_category: str, new_difficulty: str) -> None:
+    """Move a question's counts after its category or difficulty changed.
+
+    A game stops counting as played for the old category, and starts
+    counting for the new one, only if no other question in that game
+    belongs to that category.
+    """
+    params = {
+        "question_id": question_id,
+        "old_category": old_category,
+        "new_category": new_category,
+        "old_difficulty": old_difficulty,
+        "new_difficulty": new_difficulty
+    }
+    if old_category != new_category:
+        cur.execute("""
+            WITH moved AS (
+                SELECT COALESCE(s.attempts, 0) AS attempts,
+                       COALESCE(s.correct, 0) AS correct,
+                       (SELECT COUNT(*) FROM game_questions gq
+                        WHERE gq.question_id = %(question_id)s AND NOT EXISTS (
+                            SELECT 1 FROM game_questions other
+                            JOIN questions oq ON oq.id = other.question_id
+                            WHERE other.game_id = gq.game_id
+                              AND other.question_id <> %(question_id)s
+                              AND oq.category = %(old_category)s
+                        )) AS games_left,
+                       (SELECT COUNT(*) FROM game_questions gq
+                        WHERE gq.question_id = %(question_id)s AND NOT EXISTS (
+                            SELECT 1 FROM game_questions other
+                            JOIN questions oq ON oq.id = other.question_id
+                            WHERE other.game_id = gq.game_id
+                              AND other.question_id <> %(question_id)s
+                              AND oq.category = %(new_category)s
+                        )) AS games_joined
+                FROM (SELECT 1) AS one
+                LEFT JOIN question_stats s ON s.question_id = %(question_id)s
+            )
+            INSERT INTO category_stats (category, total_questions, times_played, attempts, correct)
+            SELECT %(old_category)s, -1, -games_left, -attempts, -correct FROM moved
+            UNION ALL
+            SELECT %(new_category)s, 1, games_joined, attempts, correct FROM moved
+            ORDER BY 1
+            ON CONFLICT (category) DO UPDATE
+            SET total_questions = category_stats.total_questions + EXCLUDED.total_questions,
+                times_played = category_stats.times_played + EXCLUDED.times_played,
+                attempts = category_stats.attempts + EXCLUDED.attempts,
+                correct = category_stats.correct + EXCLUDED.correct
+        """, params)
+    if old_difficulty != new_difficulty:
+        cur.execute("""
+            WITH moved AS (
+                SELECT COALESCE(s.attempts, 0) AS attempts, COALESCE(s.correct, 0) AS correct
+                FROM (SELECT 1) AS one
+                LEFT JOIN question_stats s ON s.question_id = %(question_id)s
+            )
+            INSERT INTO difficulty_stats (difficulty, total_questions, attempts, correct)
+            SELECT %(old_difficulty)s, -1, -attempts, -correct FROM moved
+            UNION ALL
+            SELECT %(new_difficulty)s, 1, attempts, correct FROM moved
+            ORDER BY 1
+            ON CONFLICT (difficulty) DO UPDATE
+            SET total_questions = difficulty_stats.total_questions + EXCLUDED.total_questions,
+                attempts = difficulty_stats.attempts + EXCLUDED.attempts,
+                correct = difficulty_stats.correct + EXCLUDED.correct
+        """, params)
+
+# Twins of the functions above for psycopg's async cursors (db.async_repository),
+# running the same statements
+
+async def record_user_created_async(cur, user_id: int) -> None:
+    await cur.execute(USER_CREATED_SQL, (user_id,))
+
+async def record_questions_created_async(cur, question_ids: List[int]) -> None:
+    if not question_ids:
+        return
+    for sql in QUESTIONS_CREATED_SQL:
+        await cur.execute(sql, (question_ids,))
+
+async def record_game_created_async(cur, user_id: int, rounds: int) -> UserTotals:
+    await cur.execute(GAME_CREATED_SQL, (user_id, rounds))
+    return await cur.fetchone()
+
+async def record_game_questions_async(cur, game_id: int, question_ids: List[int]) -> None:
+    if not question_ids:
+        return
+    params = {"game_id": game_id, "question_ids": question_ids}
+    for sql in GAME_QUESTIONS_SQL:
+        await cur.execute(sql, params)
+
+async def record_answers_async(cur, deltas: Iterable[Tuple[int, int]]) -> None:
+    params = answer_params(deltas)
+    if params is None:
+        return
+    for sql in ANSWERS_SQL:
+        await cur.execute(sql, params)
+
+async def record_score_async(cur, user_id: int, delta: int) -> Optional[UserTotals]:
+    if not delta:
+        return None
+    await cur.execute(SCORE_SQL, (user_id, delta))
+    return await cur.fetchone()
+
+class StatsRepository:
+    def __init__(self, db_connection: DatabaseConnection):
+        self.db = db_connection
+
+    def get_dashboard(self) -> Dict[str, List[tuple]]:
+        """Read every dashboard section from the precomputed summaries.
+
+        Top players come from user_stats rather than an in-memory
+        Leaderboard, so games written by other processes show up at once;
+        the accuracy index makes it a short index scan. Ties are broken like
+        Leaderboard ranks them.
+        """
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT u.username, s.total_games, s.total_correct, s.total_questions, s.accuracy
+                    FROM user_stats s
+                    JOIN users u ON u.id = s.user_id
+                    WHERE s.total_questions > 0
+                    ORDER BY s.accuracy DESC, s.total_correct DESC, s.user_id
+                    LIMIT 5
+                """)
+                top_players = cur.fetchall()
+
+                cur.execute("""
+                    SELECT category, total_questions, times_played,
+                           ROUND(CASE WHEN attempts > 0 THEN 100.0 * correct / attempts ELSE 0 END, 2) AS success_rate
+                    FROM category_stats
+                    WHERE total_questions > 0
+                    ORDER BY success_rate DESC
+                """)
+                category_stats = cur.fetchall()
+
+                cur.execute("""
+                    SELECT difficulty, total_questions,
+                           ROUND(CASE WHEN attempts > 0 THEN 100.0 * correct / attempts ELSE 0 END, 2) AS success_rate
+                    FROM difficulty_stats
+                    WHERE total_questions > 0
+                    ORDER BY success_rate DESC
+                """)
+                difficulty_stats = cur.fetchall()
+
+                cur.execute("""
+                    SELECT
+                        u.username,
+                        g.created_at,
+                        g.score,
+                        g.rounds,
+                        ROUND(CAST(
+                            CASE
+                                WHEN g.rounds > 0
+                                THEN 100.0 * g.score::numeric / g.rounds::numeric
+                                ELSE 0
+                            END AS numeric
+                        ), 2) as performance
+                    FROM games g
+                    JOIN users u ON g.user_id = u.id
+                    ORDER BY g.created_at DESC
+                    LIMIT 5
+                """)
+                recent_activity = cur.fetchall()
+
+                cur.execute("""
+                    SELECT q.question, q.category, q.difficulty, s.attempts, s.success_rate
+                    FROM question_stats s
+                    JOIN questions q ON q.id = s.question_id
+                    WHERE s.attempts > 0
+                    ORDER BY s.success_rate ASC
+                    LIMIT 5
+                """)
+                challenging_questions = cur.fetchall()
+
+                return {
+                    "top_players": top_players,
+                    "category_stats": category_stats,
+                    "difficulty_stats": difficulty_stats,
+                    "recent_activity": recent_activity,
+                    "challenging_questions": challenging_questions
+                }
+        finally:
+            self.db.return_connection(conn)
+
+    def get_user_totals(self) -> List[UserTotals]:
+        """Every player's totals, for Leaderboard.load"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT user_id, total_games, total_correct, total_questions
+                    FROM user_stats
+                """)
+                return cur.fetchall()
+        finally:
+            self.db.return_connection(conn)
+
+    def rebuild(self) -> None:
+        """Recompute every summary table from scratch"""
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT refresh_quiz_stats()")
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.db.return_connection(conn)
@@ -1,22 +1,34 @@
-from typing import Dict
+from typing import Container, Dict, List, Optional
 from quiz_api import QuizAPI
+from question_cache import QuestionCache
+from question_provider import QuestionProvider, to_question
+from db.schema import Question
+from tracing import traced
 
 class QuizGame:
-    def __init__(self, api_key: str):
-        self.quiz_api = QuizAPI(api_key)
+    def __init__(self, api_key: str, question_cache: Optional[QuestionCache] = None,
+                 question_provider: Optional[QuestionProvider] = None):
+        if question_cache is None:
+            question_cache = QuestionCache(QuizAPI(api_key))
+        self.question_cache = question_cache
+        self.quiz_api = question_cache.quiz_api
+        # Where games get their questions; the QuizAPI cache unless told otherwise
+        self.question_provider = question_provider or question_cache
         self.current_score = 0
         self.current_question = 0
         self.questions = []
         self.total_questions = 0
 
+    @traced()
     def start_new_game(self, category: str = None, difficulty: str = None, 
-                      num_questions: int = 10) -> None:
+                      num_questions: int = 10, exclude: Optional[Container[int]] = None) -> None:
         print("Starting new game")
-        """Start a new game by fetching questions"""
-        self.questions = self.quiz_api.get_questions(
+        """Start a new game by fetching questions, avoiding stored question ids in exclude where the provider can"""
+        self.questions = self.question_provider.get_questions(
             category=category,
             difficulty=difficulty,
-            limit=num_questions
+            limit=num_questions,
+            exclude=exclude
         )
 
         # print(f"DEBUG: {self.questions}")
@@ -26,6 +38,20 @@ class QuizGame:
         self.current_question = 0
         self.current_score = 0
 
+    def get_question_models(self) -> List[Question]:
+        """The current game's questions as Question objects, one per fingerprint.
+
+        A game links each stored question once, so content duplicates among
+        the fetched questions are dropped here and the game's rounds, score
+        and links all count the same questions.
+        """
+        questions: Dict[str, Question] = {}
+        for q in self.questions:
+            question = to_question(q)
+            question.fingerprint = question.compute_fingerprint()
+            questions.setdefault(question.fingerprint, question)
+        return list(questions.values())
+
     def get_current_question(self) -> Dict:
         """Get the current question details"""
         if self.current_question >= self.total_questions:
@@ -1,22 +1,63 @@
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Iterator, List, Optional
+from os import environ
+from itertools import islice
 from db.conn import DatabaseConnection
+from db.cache import EntityCache, CacheInvalidator
 from db.schema import User, Question, Game
-from db.repository import UserRepository, QuestionRepository, GameRepository
+from db.repository import UserRepository, QuestionRepository, GameRepository, DuplicateQuestionError
+from db.stats import StatsRepository
+from db.answers import AnswerRecorder
+from db.leaderboard import Leaderboard, LeaderboardEntry, LeaderboardListener
+from db.migrate import migrate
 from game_logic import QuizGame
+from question_cache import QuestionCache
+from question_provider import create_provider
+from quiz_api import QuizAPI
 import logging
+import metrics
+import tracing
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class QuizApplication:
-    def __init__(self, api_key: str):
-        self.db = DatabaseConnection()
-        self.user_repo = UserRepository(self.db)
-        self.game_repo = GameRepository(self.db)
-        self.question_repo = QuestionRepository(self.db)
-        self.game_logic = QuizGame(api_key)
+    HISTORY_PAGE_SIZE = 20
+    LEADERBOARD_SIZE = 10
+    # Players shown above and below the current one
+    LEADERBOARD_RADIUS = 3
+    # Seconds to wait for the leaderboard's first load
+    LEADERBOARD_LOAD_TIMEOUT = 30
+
+    def __init__(self, api_key: str, db: Optional[DatabaseConnection] = None, quiz_api=None):
+        self.db = db or DatabaseConnection()
+        # ENTITY_CACHE_SYNC=1 keeps the cache coherent with other processes
+        # writing to the same database, e.g. a running server.py
+        cache_sync = environ.get('ENTITY_CACHE_SYNC', '0') == '1'
+        self.entity_cache = EntityCache(publish=cache_sync)
+        self.cache_invalidator = CacheInvalidator(self.entity_cache, self.db.dsn) if cache_sync else None
+        if self.cache_invalidator:
+            self.cache_invalidator.start()
+        self.user_repo = UserRepository(self.db, self.entity_cache)
+        # Loaded on first use, then kept current by the listener (every
+        # process's games) and the game writes below (this one's, at once)
+        self.leaderboard = Leaderboard()
+        self.leaderboard_listener: Optional[LeaderboardListener] = None
+        self.game_repo = GameRepository(self.db, self.leaderboard)
+        self.question_repo = QuestionRepository(self.db, self.entity_cache)
+        self.stats_repo = StatsRepository(self.db)
+        self.answer_recorder = AnswerRecorder(self.db, leaderboard=self.leaderboard)
+        metrics.registry.register_pool("blocking", self.db)
+        metrics.registry.register_cache("entity", self.entity_cache)
+        # QUESTION_SOURCE=db plays stored questions first, offline never calls the QuizAPI
+        question_source = environ.get('QUESTION_SOURCE', 'api')
+        question_cache = QuestionCache(quiz_api or QuizAPI(api_key))
+        self.game_logic = QuizGame(api_key, question_cache=question_cache,
+                                   question_provider=create_provider(question_source, self.question_repo, question_cache))
         self.current_user = None
+        # Warm the default question pool so the first game doesn't wait on the API
+        if question_source != "offline":
+            self.game_logic.question_cache.prefetch()
 
     def clear_screen(self):
         print("\033[H\033[J")
@@ -115,7 +156,8 @@ class QuizApplication:
             print(f"Logged in as: {self.current_user.username}")
             print("1. Start New Game")
             print("2. View Game History")
-            print("3. Logout")
+            print("3. View Leaderboard")
+            print("4. Logout")
             
             choice = input("Enter your choice: ")
             
@@ -124,6 +166,8 @@ class QuizApplication:
             elif choice == '2':
                 self.view_game_history()
             elif choice == '3':
+                self.view_leaderboard()
+            elif choice == '4':
                 self.current_user = None
                 print("Logged out successfully")
                 self.press_to_continue()
@@ -156,187 +200,157 @@ class QuizApplication:
         self.clear_screen()
         print("=== Quiz Statistics Dashboard ===\n")
         
-        conn = self.db.get_connection()
         try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        u.username,
-                        COUNT(DISTINCT g.id) as total_games,
-                        COALESCE(SUM(g.score), 0)::integer as total_correct,
-                        COALESCE(SUM(g.rounds), 0)::integer as total_questions,
-                        ROUND(CAST(
-                            CASE 
-                                WHEN SUM(g.rounds) > 0 
-                                THEN (100.0 * SUM(g.score)::numeric / SUM(g.rounds)::numeric)
-                                ELSE 0 
-                            END AS numeric
-                        ), 2) as accuracy
-                    FROM users u
-                    LEFT JOIN games g ON u.id = g.user_id
-                    GROUP BY u.id, u.username
-                    ORDER BY accuracy DESC
-                    LIMIT 5
-                """)
-                top_players = cur.fetchall()
-                
-                cur.execute("""
-                    SELECT 
-                        q.category,
-                        COUNT(DISTINCT q.id) as total_questions,
-                        COUNT(DISTINCT gq.game_id) as times_played,
-                        ROUND(CAST(
-                            CASE 
-                                WHEN COUNT(gq.id) > 0 
-                                THEN 100.0 * COUNT(CASE WHEN gq.is_correct THEN 1 END)::numeric / COUNT(gq.id)::numeric
-                                ELSE 0 
-                            END AS numeric
-                        ), 2) as success_rate
-                    FROM questions q
-                    LEFT JOIN game_questions gq ON q.id = gq.question_id
-                    GROUP BY q.category
-                    ORDER BY success_rate DESC
-                """)
-                category_stats = cur.fetchall()
-                
-                cur.execute("""
-                    SELECT 
-                        q.difficulty,
-                        COUNT(DISTINCT q.id) as question_count,
-                        ROUND(CAST(
-                            CASE 
-                                WHEN COUNT(gq.id) > 0 
-                                THEN 100.0 * COUNT(CASE WHEN gq.is_correct THEN 1 END)::numeric / COUNT(gq.id)::numeric
-                                ELSE 0 
-                            END AS numeric
-                        ), 2) as success_rate
-                    FROM questions q
-                    LEFT JOIN game_questions gq ON q.id = gq.question_id
-                    GROUP BY q.difficulty
-                    ORDER BY success_rate DESC
-                """)
-                difficulty_stats = cur.fetchall()
-                
-                cur.execute("""
-                    SELECT 
-                        u.username,
-                        g.created_at,
-                        g.score,
-                        g.rounds,
-                        ROUND(CAST(
-                            CASE 
-                                WHEN g.rounds > 0 
-                                THEN 100.0 * g.score::numeric / g.rounds::numeric
-                                ELSE 0 
-                            END AS numeric
-                        ), 2) as performance
-                    FROM games g
-                    JOIN users u ON g.user_id = u.id
-                    ORDER BY g.created_at DESC
-                    LIMIT 5
-                """)
-                recent_activity = cur.fetchall()
-                
-                cur.execute("""
-                    SELECT 
-                        q.question,
-                        q.category,
-                        q.difficulty,
-                        COUNT(gq.id) as attempts,
-                        ROUND(CAST(
-                            CASE 
-                                WHEN COUNT(gq.id) > 0 
-                                THEN 100.0 * COUNT(CASE WHEN gq.is_correct THEN 1 END)::numeric / COUNT(gq.id)::numeric
-                                ELSE 0 
-                            END AS numeric
-                        ), 2) as success_rate
-                    FROM questions q
-                    LEFT JOIN game_questions gq ON q.id = gq.question_id
-                    GROUP BY q.id, q.question, q.category, q.difficulty
-                    HAVING COUNT(gq.id) > 0
-                    ORDER BY success_rate ASC
-                    LIMIT 5
-                """)
-                challenging_questions = cur.fetchall()
-
-                print("\n🏆 Top Players")
-                print("-" * 80)
-                print(f"{'Username':<20} {'Games':<10} {'Questions':<10} {'Correct':<10} {'Accuracy':<10}")
-                print("-" * 80)
-                if top_players:
-                    for player in top_players:
-                        print(f"{player[0]:<20} {player[1]:<10} {player[3]:<10} {player[2]:<10} {player[4]}%")
-                else:
-                    print("No games played yet")
-
-                print("\n📊 Category Performance")
-                print("-" * 80)
-                print(f"{'Category':<20} {'Questions':<10} {'Times Played':<15} {'Success Rate':<10}")
-                print("-" * 80)
-                if category_stats:
-                    for cat in category_stats:
-                        success_rate = cat[3] if cat[3] is not None else 0
-                        print(f"{cat[0]:<20} {cat[1]:<10} {cat[2]:<15} {success_rate}%")
-                else:
-                    print("No category statistics available")
-
-                print("\n📈 Difficulty Level Analysis")
-                print("-" * 60)
-                print(f"{'Difficulty':<15} {'Questions':<10} {'Success Rate':<10}")
-                print("-" * 60)
-                if difficulty_stats:
-                    for diff in difficulty_stats:
-                        success_rate = diff[2] if diff[2] is not None else 0
-                        print(f"{diff[0]:<15} {diff[1]:<10} {success_rate}%")
-                else:
-                    print("No difficulty statistics available")
-
-                print("\n🕒 Recent Activity")
-                print("-" * 80)
-                print(f"{'Username':<15} {'Date':<20} {'Score':<10} {'Total':<10} {'Performance':<10}")
-                print("-" * 80)
-                if recent_activity:
-                    for activity in recent_activity:
-                        date = activity[1].strftime("%Y-%m-%d %H:%M")
-                        performance = activity[4] if activity[4] is not None else 0
-                        print(f"{activity[0]:<15} {date:<20} {activity[2]:<10} {activity[3]:<10} {performance}%")
-                else:
-                    print("No recent activity")
-
-                print("\n⚠️ Most Challenging Questions")
-                print("-" * 100)
-                print(f"{'Question':<40} {'Category':<15} {'Difficulty':<10} {'Attempts':<10} {'Success Rate':<10}")
-                print("-" * 100)
-                if challenging_questions:
-                    for question in challenging_questions:
-                        q_text = question[0][:37] + '...' if len(question[0]) > 37 else question[0]
-                        success_rate = question[4] if question[4] is not None else 0
-                        print(f"{q_text:<40} {question[1]:<15} {question[2]:<10} {question[3]:<10} {success_rate}%")
-                else:
-                    print("No challenging questions data available")
+            dashboard = self.load_dashboard()
+            top_players = dashboard["top_players"]
+            category_stats = dashboard["category_stats"]
+            difficulty_stats = dashboard["difficulty_stats"]
+            recent_activity = dashboard["recent_activity"]
+            challenging_questions = dashboard["challenging_questions"]
+
+            print("\n🏆 Top Players")
+            print("-" * 80)
+            print(f"{'Username':<20} {'Games':<10} {'Questions':<10} {'Correct':<10} {'Accuracy':<10}")
+            print("-" * 80)
+            if top_players:
+                for player in top_players:
+                    print(f"{player[0]:<20} {player[1]:<10} {player[3]:<10} {player[2]:<10} {player[4]}%")
+            else:
+                print("No games played yet")
+
+            print("\n📊 Category Performance")
+            print("-" * 80)
+            print(f"{'Category':<20} {'Questions':<10} {'Times Played':<15} {'Success Rate':<10}")
+            print("-" * 80)
+            if category_stats:
+                for cat in category_stats:
+                    success_rate = cat[3] if cat[3] is not None else 0
+                    print(f"{cat[0]:<20} {cat[1]:<10} {cat[2]:<15} {success_rate}%")
+            else:
+                print("No category statistics available")
+
+            print("\n📈 Difficulty Level Analysis")
+            print("-" * 60)
+            print(f"{'Difficulty':<15} {'Questions':<10} {'Success Rate':<10}")
+            print("-" * 60)
+            if difficulty_stats:
+                for diff in difficulty_stats:
+                    success_rate = diff[2] if diff[2] is not None else 0
+                    print(f"{diff[0]:<15} {diff[1]:<10} {success_rate}%")
+            else:
+                print("No difficulty statistics available")
+
+            print("\n🕒 Recent Activity")
+            print("-" * 80)
+            print(f"{'Username':<15} {'Date':<20} {'Score':<10} {'Total':<10} {'Performance':<10}")
+            print("-" * 80)
+            if recent_activity:
+                for activity in recent_activity:
+                    date = activity[1].strftime("%Y-%m-%d %H:%M")
+                    performance = activity[4] if activity[4] is not None else 0
+                    print(f"{activity[0]:<15} {date:<20} {activity[2]:<10} {activity[3]:<10} {performance}%")
+            else:
+                print("No recent activity")
+
+            print("\n⚠️ Most Challenging Questions")
+            print("-" * 100)
+            print(f"{'Question':<40} {'Category':<15} {'Difficulty':<10} {'Attempts':<10} {'Success Rate':<10}")
+            print("-" * 100)
+            if challenging_questions:
+                for question in challenging_questions:
+                    q_text = question[0][:37] + '...' if len(question[0]) > 37 else question[0]
+                    success_rate = question[4] if question[4] is not None else 0
+                    print(f"{q_text:<40} {question[1]:<15} {question[2]:<10} {question[3]:<10} {success_rate}%")
+            else:
+                print("No challenging questions data available")
 
         except Exception as e:
             print(f"Error retrieving statistics: {str(e)}")
             logger.error(f"Error in statistics dashboard: {e}", exc_info=True)
-        finally:
-            self.db.return_connection(conn)
         
         self.press_to_continue()
 
+    def load_dashboard(self) -> dict:
+        """Fetch the dashboard sections from the precomputed statistics tables"""
+        return self.stats_repo.get_dashboard()
+
+    def view_leaderboard(self):
+        self.clear_screen()
+        print("=== Leaderboard ===\n")
+
+        try:
+            leaderboard = self.load_leaderboard()
+            self.print_leaderboard(leaderboard.top(self.LEADERBOARD_SIZE))
+            rank = leaderboard.rank(self.current_user.id)
+            if rank is None:
+                print("\nYou are not ranked yet, finish a game first")
+            else:
+                print(f"\nYour rank: #{rank} of {len(leaderboard)}\n")
+                self.print_leaderboard(leaderboard.around(self.current_user.id, self.LEADERBOARD_RADIUS))
+        except Exception as e:
+            print(f"Error retrieving leaderboard: {str(e)}")
+            logger.error(f"Error in leaderboard: {e}", exc_info=True)
+
+        self.press_to_continue()
+
+    def print_leaderboard(self, entries: List[LeaderboardEntry]) -> None:
+        print("-" * 80)
+        print(f"{'Rank':<8} {'Username':<20} {'Games':<10} {'Questions':<10} {'Correct':<10} {'Accuracy':<10}")
+        print("-" * 80)
+        if not entries:
+            print("No games played yet")
+        for rank, username, games, correct, questions, accuracy in self.leaderboard_rows(entries):
+            marker = "*" if username == self.current_user.username else " "
+            print(f"{marker}#{rank:<6} {username:<20} {games:<10} {questions:<10} {correct:<10} {accuracy}%")
+
+    def load_leaderboard(self) -> Leaderboard:
+        if self.leaderboard_listener is None:
+            self.leaderboard_listener = LeaderboardListener(self.leaderboard, self.db.dsn,
+                                                            self.stats_repo.get_user_totals)
+            self.leaderboard_listener.start()
+        if not self.leaderboard_listener.wait_loaded(self.LEADERBOARD_LOAD_TIMEOUT):
+            raise TimeoutError("Leaderboard is still loading")
+        return self.leaderboard
+
+    def leaderboard_rows(self, entries: List[LeaderboardEntry]) -> List[tuple]:
+        """(rank, username, games, correct, questions, accuracy) for display"""
+        users = self.user_repo.get_users_by_ids([entry.user_id for entry in entries])
+        return [
+            (entry.rank, users[entry.user_id].username, entry.total_games, entry.total_correct,
+             entry.total_questions, entry.accuracy)
+            for entry in entries if entry.user_id in users
+        ]
+
     def view_game_history(self):
         self.clear_screen()
         print("=== Game History ===")
-        games = self.game_repo.get_all_games()
-        
-        if not games:
+        shown = self.show_pages(
+            self.game_repo.iter_game_pages(self.current_user.id, self.HISTORY_PAGE_SIZE),
+            lambda game: print(f"Game {game.id}: Score: {game.score}/{game.rounds} - Played on: {game.created_at}")
+        )
+        if not shown:
             print("No games played yet")
-        else:
-            for game in games:
-                if game.user_id == self.current_user.id:
-                    print(f"Game {game.id}: Score: {game.score}/{game.rounds} - Played on: {game.created_at}")
         
         self.press_to_continue()
 
+    def show_pages(self, pages, show) -> int:
+        """Print pages one at a time until they run out or the user stops; returns the rows shown"""
+        shown = 0
+        for page in pages:
+            if shown and input("Press Enter for more, or q to stop: ").strip().lower() == 'q':
+                break
+            for row in page:
+                show(row)
+            shown += len(page)
+        return shown
+
+    def show_stream(self, rows: Iterator, show) -> int:
+        """show_pages over a streamed listing, releasing its cursor if the user stops early"""
+        try:
+            return self.show_pages(iter(lambda: list(islice(rows, self.HISTORY_PAGE_SIZE)), []), show)
+        finally:
+            rows.close()
+
 
     def db_menu(self):
         self.clear_screen()
@@ -408,7 +422,13 @@ class QuizApplication:
             answers=[input(f"Enter answer {_+1}: ") for _ in range(4)],
             correct_answers=[input(f"Is answer {_+1} correct? (y/n): ") == 'y' for _ in range(4)]
         )
-        saved_question = self.question_repo.create_question(question)
+        try:
+            saved_question = self.question_repo.create_question(question)
+        except DuplicateQuestionError as e:
+            print(e.message)
+            self.press_to_continue()
+            self.create_menu()
+            return
         if saved_question:
             print(f"Question {saved_question.id} created")
             print(f"Question: {saved_question.question}")
@@ -451,10 +471,8 @@ class QuizApplication:
             self.db_menu()
     
     def read_users(self):
-        users = self.user_repo.get_all_users()
         print("Users:")
-        for user in users:
-            print(f"{user.id}: {user.username}")
+        self.show_stream(self.user_repo.iter_all_users(), lambda user: print(f"{user.id}: {user.username}"))
         self.press_to_continue()
         self.read_menu()
 
@@ -469,10 +487,9 @@ class QuizApplication:
         self.read_menu()
     
     def read_questions(self):
-        questions = self.question_repo.get_all_questions()
         print("Questions:")
-        for question in questions:
-            print(f"{question.id}: {question.question}")
+        self.show_stream(self.question_repo.iter_all_questions(),
+                         lambda question: print(f"{question.id}: {question.question}"))
         self.press_to_continue()
         self.read_menu()
     
@@ -494,30 +511,33 @@ class QuizApplication:
         self.read_menu()
 
     def read_games(self):
-        games = self.game_repo.get_all_games()
         print("Games:")
-        for game in games:
-            print(f"Game {game.id}: User: {game.user_id}, Score: {game.score}/{game.score}, Played on: {game.created_at}")
+        self.show_stream(
+            self.game_repo.iter_all_games(),
+            lambda game: print(f"Game {game.id}: User: {game.user_id}, Score: {game.score}/{game.rounds}, Played on: {game.created_at}")
+        )
         self.press_to_continue()
         self.read_menu()
     
     def read_game(self):
         game_id = int(input("Enter game ID: "))
         game = self.game_repo.get_game_by_id(game_id)
-        game_questions = self.game_repo.get_game_questions(game_id)
+        rounds = self.game_repo.get_game_rounds(game_id)
         if game:
             print(f"Game {game.id}: User: {game.user_id}, Score: {game.score}/{game.score}, Played on: {game.created_at}")
         else:
             print("Game not found")
-        if game_questions:
+        if rounds:
             print("Questions:")
-            for game_question in game_questions:
-                question = self.question_repo.get_question_by_id(game_question.question_id)
+            for game_question, question in rounds:
                 print(f"Question {question.id}: {question.question}")
                 print("Answers:")
                 for i, (answer, correct) in enumerate(zip(question.answers, question.correct_answers)):
                     print(f"{i+1}. {answer} ({'Right' if correct else 'Wrong'})")
-                print(f"Selected answer: {game_question.selected_answer_index + 1} {'(Correct)' if game_question.is_correct else '(Wrong)'}")
+                if game_question.selected_answer_index is None:
+                    print("Not answered")
+                else:
+                    print(f"Selected answer: {game_question.selected_answer_index + 1} {'(Correct)' if game_question.is_correct else '(Wrong)'}")
         self.press_to_continue()
         self.read_menu()
     
@@ -579,7 +599,13 @@ class QuizApplication:
         if new_correct_answers:
             question.correct_answers = new_correct_answers
         
-        updated_question = self.question_repo.update_question(question)
+        try:
+            updated_question = self.question_repo.update_question(question)
+        except DuplicateQuestionError as e:
+            print(e.message)
+            self.press_to_continue()
+            self.update_menu()
+            return
         if updated_question:
             print(f"Question {updated_question.id} updated")
             print(f"Question: {updated_question.question}")
@@ -658,46 +684,30 @@ class QuizApplication:
     def start_game(self, user_id: int, num_rounds: int) -> Optional[Game]:
         logger.info(f"Starting new game for user {user_id}")
         try:
-            logger.debug(f"Fetching user {user_id}")
-            # Create new game
-            game = self.game_repo.create_game(user_id, num_rounds)
-            logger.debug(f"Created game {game}")
-            if not game:
-                return None
-                
-            # Fetch questions from API
-            logger.debug(f"Fetching questions from API")
-            self.game_logic.start_new_game(num_questions=num_rounds)
-            
-            logger.debug(self.game_logic.questions)
-            # Store questions in database
-            logger.debug(f"Storing questions in database")
-            question_ids = []
-            for q in self.game_logic.questions:
-                # Create question object
-                logger.debug(f"Creating question object")
-                question = Question(
-                    id=0,  # Will be set by database
-                    question=q.get('question', ''),
-                    description=q.get('description', ''),
-                    explanation=q.get('explanation', ''),
-                    category=q.get('category', 'general'),
-                    difficulty=q.get('difficulty', 'medium'),
-                    answers=[q['answers'].get(f'answer_{l}', '') for l in "abcdef" if q['answers'].get(f'answer_{l}') is not None],
-                    correct_answers=[q['correct_answers'].get(f'answer_{l}_correct', 'false') == 'true' for l in "abcdef"]
-                )
-                # print(question)
-                
-                # Save question
-                logger.debug(f"Saving question to database")
-                saved_question = self.question_repo.create_question(question)
-                question_ids.append(saved_question.id)
-            
-            # Link questions to game
-            self.game_repo.add_game_questions(game.id, question_ids)
-            
-            logger.info(f"Started new game {game.id} for user {user_id}")
-            return game
+            with tracing.span("game.start", user_id=user_id, rounds=num_rounds) as span:
+                # Fetch questions from API
+                logger.debug(f"Fetching questions from API")
+                # Skip questions the player has already had, where the provider can tell
+                seen = self.user_repo.get_seen_questions(user_id) if self.game_logic.question_provider.supports_exclude else None
+                self.game_logic.start_new_game(num_questions=num_rounds, exclude=seen)
+
+                logger.debug(self.game_logic.questions)
+                # Create the game, store its questions and link them in one transaction
+                logger.debug(f"Storing game and questions in database")
+                # The provider may have fewer matching questions than rounds asked
+                # for; the game is as long as what it actually got
+                questions = self.game_logic.get_question_models()
+                if not questions:
+                    logger.error("No questions available for a new game")
+                    return None
+                game = self.game_repo.create_game_with_questions(user_id, len(questions), questions)
+                logger.debug(f"Created game {game}")
+                if not game:
+                    return None
+
+                span.set(game_id=game.id)
+                logger.info(f"Started new game {game.id} for user {user_id}")
+                return game
             
         except Exception as e:
             logger.error(f"Failed to start game: {str(e)}")
@@ -733,11 +743,17 @@ class QuizApplication:
     #         return False
         
     def close(self):
+        self.answer_recorder.close()
+        if self.cache_invalidator:
+            self.cache_invalidator.stop()
+        if self.leaderboard_listener:
+            self.leaderboard_listener.stop()
         try:
             self.db.close_all_connections()
             logger.info("Closed all database connections")
         except Exception as e:
             logger.error(f"Error closing connections: {str(e)}")
+        self.game_logic.quiz_api.close()
             
     def display_question(self, question: Question) -> None:
         print("\n" + "="*50)
@@ -749,86 +765,96 @@ class QuizApplication:
             print(f"{i+1}. {answer}")
         # print(question.correct_answers)
             
-    def play_game(self, game_id: int) -> None:
-        try:
-            game = self.game_repo.get_game(game_id)
-            if not game:
-                logger.error("Game not found")
-                return
+    def prompt_answer(self, answers_num: int) -> int:
+        while True:
+            try:
+                answer = int(input(f"\nEnter your answer (1-{answers_num}): ")) - 1 #0 indexing the answer
+                if 0 <= answer <= answers_num - 1:
+                    return answer
+                print("Please enter a valid answer number")
+            except ValueError:
+                print("Please enter a number")
 
-            questions = self.game_repo.get_game_questions(game_id)
-            total_correct = 0
+    def play_game(self, game_id: int, choose_answer: Optional[Callable[[Question], int]] = None) -> None:
+        """Play a stored game, prompting for each answer unless choose_answer picks it (0-based)"""
+        try:
+            with tracing.span("game.play", game_id=game_id):
+                game = self.game_repo.get_game(game_id)
+                if not game:
+                    logger.error("Game not found")
+                    return
 
-            for i, game_question in enumerate(questions, 1):
-                question = self.question_repo.get_question_by_id(game_question.question_id)
-                if not question:
-                    continue
+                questions = [question for _, question in self.game_repo.get_game_rounds(game_id)]
+                total_correct = 0
 
-                self.display_question(question)
+                for i, question in enumerate(questions, 1):
+                    self.display_question(question)
 
-                answers_num = len(question.answers)
+                    answers_num = len(question.answers)
                 
-                while True:
-                    try:
-                        answer = int(input(f"\nEnter your answer (1-{answers_num}): ")) - 1 #0 indexing the answer
-                        if 0 <= answer <= answers_num - 1:
-                            break
-                        print("Please enter a valid answer number")
-                    except ValueError:
-                        print("Please enter a number")
+                    if choose_answer is not None:
+                        answer = choose_answer(question)
+                    else:
+                        answer = self.prompt_answer(answers_num)
 
-                is_correct = question.correct_answers[answer]
+                    is_correct = question.correct_answers[answer]
                 
-                # Update game question
-                self.question_repo.answer_question(game_id, question.id, answer, is_correct)
+                    # Buffered; written together with the final score
+                    self.answer_recorder.record(game_id, question.id, answer, is_correct)
                 
-                if is_correct:
-                    total_correct += 1
-                    print("\n✅ Correct!")
-                else:
-                    print("\n❌ Wrong!")
-                    print(f"The correct answer(s) was(were):")
-                    for idx in range(answers_num):
-                        if question.correct_answers[idx]:
-                            print(f"{idx+1}. {question.answers[idx]}")
+                    if is_correct:
+                        total_correct += 1
+                        print("\n✅ Correct!")
+                    else:
+                        print("\n❌ Wrong!")
+                        print(f"The correct answer(s) was(were):")
+                        for idx in range(answers_num):
+                            if question.correct_answers[idx]:
+                                print(f"{idx+1}. {question.answers[idx]}")
                 
-                if question.explanation:
-                    print(f"Explanation: {question.explanation}")
+                    if question.explanation:
+                        print(f"Explanation: {question.explanation}")
                 
-                print(f"\nCurrent score: {total_correct}/{i}")
+                    print(f"\nCurrent score: {total_correct}/{i}")
 
-            # Update final score
-            self.update_game_score(game_id, total_correct)
-            print(f"\nGame Over! Final score: {total_correct}/{len(questions)}")
+                # Save the answers and final score
+                if not self.answer_recorder.finish_game(game_id, total_correct):
+                    logger.error("Failed to save game results, will retry")
+                print(f"\nGame Over! Final score: {total_correct}/{len(questions)}")
 
         except Exception as e:
             logger.error(f"Error during game play: {str(e)}")
             
     def update_game_score(self, game_id: int, score: int) -> bool:
-        conn = self.db.get_connection()
         try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE games 
-                    SET score = %s
-                    WHERE id = %s
-                """, (score, game_id))
-                conn.commit()
-                return True
+            return self.game_repo.update_score(game_id, score)
         except Exception as e:
             logger.error(f"Failed to update score: {str(e)}")
             return False
-        finally:
-            self.db.return_connection(conn)
 
         
 def main():
+    # METRICS=1 times every repository call and QuizAPI fetch, METRICS_FILE
+    # writes everything collected there every METRICS_DUMP_INTERVAL seconds
+    if metrics.enabled():
+        metrics.install()
+    dumper = None
+    if environ.get('METRICS_FILE'):
+        dumper = metrics.MetricsDumper(environ['METRICS_FILE'], float(environ.get('METRICS_DUMP_INTERVAL', '15')))
+        dumper.start()
+    # TRACE_FILE appends a span per game step, repository call and pool
+    # checkout there; see python -m tracing for per-game waterfalls
+    tracing.configure()
     app = QuizApplication("Nu4Q4o5IFPwgTUWcEmgWUpwyK06B3yGg3TbmkkTM")
+    migrate(app.db)
     input('Press Enter to continue...')
     try:
         app.main_menu()
     finally:
         app.close()
+        if dumper:
+            dumper.stop()
+        tracing.tracer.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,256 @@
+from db.conn import LatencyHistogram
+from db import statements
+from db.async_repository import AsyncUserRepository, AsyncQuestionRepository, AsyncGameRepository
+from db.repository import UserRepository, QuestionRepository, GameRepository, GameSessionRepository
+from db.stats import StatsRepository
+from question_provider import ApiQuestionProvider, DatabaseQuestionProvider
+from quiz_api import QuizAPI, AsyncQuizAPI
+from typing import Dict, Iterable, List, Optional, Tuple
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Counters in DatabaseConnection.stats(), AsyncDatabaseConnection.stats() and
+# EntityCache.stats(); their other numbers are gauges or histograms
+POOL_COUNTERS = {"checkouts", "timeouts", "created", "recycled"}
+POOL_HELP = {
+    "in_use": "Connections checked out",
+    "idle": "Idle connections",
+    "size": "Open connections",
+    "max_in_use": "Most connections checked out at once",
+    "maxconn": "Connection limit",
+    "waiting": "Checkouts waiting for a connection",
+    "checkouts": "Connections handed out",
+    "timeouts": "Checkouts that gave up waiting",
+    "created": "Connections opened",
+    "recycled": "Connections closed for age or errors",
+    "wait": "Time spent waiting for a connection",
+    "hold": "Time connections stayed checked out"
+}
+CACHE_COUNTERS = {"hits", "misses", "evictions", "expirations", "invalidations"}
+
+class CallStats:
+    """Latency, failures and returned rows of one instrumented method"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, rows: Optional[int] = None, failed: bool = False) -> None:
+        self.histogram.observe(elapsed)
+        if failed or rows:
+            with self._lock:
+                self.errors += failed
+                self.rows += rows or 0
+
+def count_rows(result) -> Optional[int]:
+    """Rows a repository or API call returned, None when the result isn't rows (e.g. a success flag)"""
+    if result is None:
+        return 0
+    if isinstance(result, bool):
+        return None
+    if isinstance(result, int):
+        return result
+    if isinstance(result, (list, dict, set)):
+        return len(result)
+    return 1
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class _Exposition:
+    """Samples grouped by metric family, in the Prometheus text format"""
+
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(self, name: str, kind: str, help: str, labels: Dict[str, str], value: float, suffix: str = "") -> None:
+        family = self._families.setdefault(name, (kind, help, []))
+        label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        family[2].append(f"{name}{suffix}{{{label_text}}} {value:g}" if label_text else f"{name}{suffix} {value:g}")
+
+    def histogram(self, name: str, help: str, labels: Dict[str, str], snapshot: Dict) -> None:
+        """A LatencyHistogram snapshot"""
+        for bound, cumulative in snapshot["buckets"]:
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            self.add(name, "histogram", help, {**labels, "le": le}, cumulative, "_bucket")
+        self.add(name, "histogram", help, labels, snapshot["sum"], "_sum")
+        self.add(name, "histogram", help, labels, snapshot["count"], "_count")
+
+    def text(self) -> str:
+        lines = []
+        for name, (kind, help, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+class Metrics:
+    """Method timings recorded by instrument(), plus the pools and caches registered with it.
+
+    Pool, cache and prepared statement numbers are kept by those objects
+    anyway and are only read when rendering, so they cost nothing between
+    scrapes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[str, str], CallStats] = {}
+        self._pools: Dict[str, object] = {}
+        self._caches: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def calls(self, component: str, method: str) -> CallStats:
+        with self._lock:
+            return self._calls.setdefault((component, method), CallStats())
+
+    def register_pool(self, name: str, pool) -> None:
+        """A DatabaseConnection or AsyncDatabaseConnection, exported as quiz_db_pool_*"""
+        self._pools[name] = pool
+
+    def register_cache(self, name: str, cache) -> None:
+        """An EntityCache, exported as quiz_cache_*"""
+        self._caches[name] = cache
+
+    def render(self) -> str:
+        out = _Exposition()
+        with self._lock:
+            calls = sorted(self._calls.items())
+        for (component, method), stats in calls:
+            if not stats.histogram.count:
+                continue
+            labels = {"component": component, "method": method}
+            out.histogram("quiz_call_duration_seconds", "Latency of instrumented repository and QuizAPI calls",
+                          labels, stats.histogram.snapshot())
+            out.add("quiz_call_errors_total", "counter", "Instrumented calls that raised", labels, stats.errors)
+            out.add("quiz_call_rows_total", "counter", "Rows returned by instrumented calls", labels, stats.rows)
+
+        for name, pool in self._pools.items():
+            for key, value in pool.stats().items():
+                labels, help = {"pool": name}, POOL_HELP.get(key, f"Connection pool {key}")
+                if isinstance(value, dict):
+                    out.histogram(f"quiz_db_pool_{key}_seconds", help, labels, value)
+                elif key in POOL_COUNTERS:
+                    out.add(f"quiz_db_pool_{key}_total", "counter", help, labels, value)
+                else:
+                    out.add(f"quiz_db_pool_{key}", "gauge", help, labels, value)
+
+        for name, cache in self._caches.items():
+            for key, value in cache.stats().items():
+                labels = {"cache": name}
+                if key in CACHE_COUNTERS:
+                    out.add(f"quiz_cache_{key}_total", "counter", f"Entity cache {key}", labels, value)
+                elif key in ("size", "max_size"):
+                    out.add(f"quiz_cache_{key}", "gauge", f"Entity cache {key.replace('_', ' ')}", labels, value)
+
+        for name, stats in statements.registry.stats().items():
+            labels = {"statement": name}
+            out.histogram("quiz_db_statement_duration_seconds", "Latency of prepared statements, preparing included",
+                          labels, stats["time"])
+            out.add("quiz_db_statement_prepares_total", "counter", "Times a statement was prepared on a connection",
+                    labels, stats["prepares"])
+        return out.text()
+
+registry = Metrics()
+
+def _wrap(func, stats: CallStats):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                stats.record(time.perf_counter() - started, failed=True)
+                raise
+            stats.record(time.perf_counter() - started, count_rows(result))
+            return result
+    else:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                stats.record(time.perf_counter() - started, failed=True)
+                raise
+            stats.record(time.perf_counter() - started, count_rows(result))
+            return result
+    timed.instrumented = True
+    return timed
+
+def instrument(cls, component: str, methods: Optional[Iterable[str]] = None, metrics: Metrics = registry):
+    """Time the public methods of ``cls`` (or just ``methods``) in ``metrics``.
+
+    Patches the class in place, once; classes that are never instrumented
+    run their methods untouched. iter_* methods are skipped since they
+    return lazy streams whose work happens after the call.
+    """
+    if methods is None:
+        methods = [name for name, member in vars(cls).items()
+                   if inspect.isfunction(member) and not name.startswith(("_", "iter_"))
+                   and not inspect.isgeneratorfunction(member)]
+    for name in methods:
+        func = getattr(cls, name)
+        if getattr(func, "instrumented", False):
+            continue
+        setattr(cls, name, _wrap(func, metrics.calls(component, f"{cls.__name__}.{name}")))
+    return cls
+
+def install(metrics: Metrics = registry) -> None:
+    """Instrument every repository, QuizAPI.get_questions and the question providers' get_questions"""
+    for cls in (UserRepository, QuestionRepository, GameRepository, GameSessionRepository, StatsRepository,
+                AsyncUserRepository, AsyncQuestionRepository, AsyncGameRepository):
+        instrument(cls, "repository", metrics=metrics)
+    for cls in (QuizAPI, AsyncQuizAPI):
+        instrument(cls, "quiz_api", ["get_questions"], metrics)
+    for cls in (ApiQuestionProvider, DatabaseQuestionProvider):
+        instrument(cls, "question_provider", ["get_questions"], metrics)
+
+def enabled() -> bool:
+    return os.environ.get('METRICS', '0') == '1'
+
+class MetricsDumper:
+    """Writes ``metrics.render()`` to ``path`` every ``interval`` seconds, e.g. for
+    node_exporter's textfile collector. The file is replaced atomically.
+    """
+
+    def __init__(self, path: str, interval: float = 15.0, metrics: Metrics = registry):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop and write a final dump"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def dump(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.wait(self.interval)
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Failed to write metrics to {self.path}: {e}")
+            if stopping:
+                return
\ No newline at end of file
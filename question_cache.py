@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Container, Deque, Dict, Iterable, List, Optional, Tuple
+
+from question_provider import QuestionProvider
+from quiz_api import AsyncQuizAPI, QuizAPI, QuizAPIError
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[Optional[str], Optional[str], Tuple[str, ...]]
+
+# quizapi.io never returns more than 20 questions per request
+MAX_FETCH_LIMIT = 20
+
+
+class _QuestionPool:
+    def __init__(self):
+        self.entries: Deque[Tuple[float, Dict]] = deque()
+        self.ids = set()
+        self.refilling = False
+
+
+class QuestionCache(QuestionProvider):
+    """Local question bank that serves QuizAPI questions from memory.
+
+    Questions are pooled per (category, difficulty, tags) key. Serving a game
+    consumes questions from the pool, and once the pool drops below
+    ``low_watermark`` a background thread tops it up to ``pool_size``.
+    Entries older than ``ttl`` seconds are discarded, and the least recently
+    used pools are evicted once there are more than ``max_pools`` of them.
+    """
+
+    def __init__(self, quiz_api: QuizAPI, pool_size: int = 40, low_watermark: int = 10,
+                 ttl: float = 3600.0, max_pools: int = 32):
+        self.quiz_api = quiz_api
+        self.pool_size = pool_size
+        self.low_watermark = low_watermark
+        self.ttl = ttl
+        self.max_pools = max_pools
+        self._pools: "OrderedDict[CacheKey, _QuestionPool]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(category: Optional[str] = None, difficulty: Optional[str] = None,
+                 tags: Optional[List[str]] = None) -> CacheKey:
+        return (category, difficulty, tuple(sorted(tags or ())))
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None,
+                      exclude: Optional[Container[int]] = None) -> List[Dict]:
+        """Serve questions from the local pool, fetching only what is missing.
+
+        ``exclude`` is ignored: QuizAPI questions have no stored id until a
+        game saves them. ApiQuestionProvider filters them by fingerprint.
+        """
+        key = self.make_key(category, difficulty, tags)
+        with self._lock:
+            pool = self._get_pool(key)
+            questions = self._take(pool, limit)
+
+        if len(questions) < limit:
+            # Cold or drained pool: fetch the shortfall synchronously and keep
+            # the surplus for the next game
+            fetched = self._fetch(key, max(limit - len(questions), MAX_FETCH_LIMIT))
+            seen = {q.get('id') for q in questions}
+            surplus = []
+            for q in fetched:
+                if len(questions) < limit and q.get('id') not in seen:
+                    questions.append(q)
+                    seen.add(q.get('id'))
+                else:
+                    surplus.append(q)
+            with self._lock:
+                self._add(self._get_pool(key), surplus, exclude=seen)
+
+        self._maybe_refill(key)
+        return questions
+
+    def prefetch(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                 tags: Optional[List[str]] = None, wait: bool = False) -> None:
+        """Warm the pool for a key, in the background unless ``wait`` is set"""
+        key = self.make_key(category, difficulty, tags)
+        if wait:
+            self._refill(key)
+        else:
+            self._maybe_refill(key, force=True)
+
+    def warm(self, keys: Iterable[CacheKey], async_api: AsyncQuizAPI) -> None:
+        """Top up the pools for many keys at once.
+
+        All fetches run concurrently through ``async_api`` so warming N keys
+        takes roughly one round trip. The async client's session is closed
+        when done, since it is bound to the event loop created here.
+        """
+        asyncio.run(self._warm(list(keys), async_api))
+
+    async def _warm(self, keys: List[CacheKey], async_api: AsyncQuizAPI) -> None:
+        queries = []
+        with self._lock:
+            for category, difficulty, tags in keys:
+                missing = self.pool_size - len(self._get_pool((category, difficulty, tags)).entries)
+                if missing > 0:
+                    queries.append({
+                        "category": category,
+                        "difficulty": difficulty,
+                        "tags": list(tags) or None,
+                        "limit": min(missing, MAX_FETCH_LIMIT)
+                    })
+        try:
+            async for query, result in async_api.get_questions_many(queries, return_exceptions=True):
+                key = self.make_key(query["category"], query["difficulty"], query["tags"])
+                if isinstance(result, QuizAPIError):
+                    logger.warning(f"Failed to warm question pool {key}: {result.message}")
+                    continue
+                with self._lock:
+                    self._add(self._get_pool(key), result)
+        finally:
+            await async_api.close()
+
+    def pool_sizes(self) -> Dict[CacheKey, int]:
+        with self._lock:
+            return {key: len(pool.entries) for key, pool in self._pools.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pools.clear()
+
+    def _get_pool(self, key: CacheKey) -> _QuestionPool:
+        # Caller must hold self._lock
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _QuestionPool()
+            self._pools[key] = pool
+            while len(self._pools) > self.max_pools:
+                evicted_key, _ = self._pools.popitem(last=False)
+                logger.debug(f"Evicted question pool {evicted_key}")
+        else:
+            self._pools.move_to_end(key)
+        self._expire(pool)
+        return pool
+
+    def _expire(self, pool: _QuestionPool) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while pool.entries and pool.entries[0][0] < cutoff:
+            _, question = pool.entries.popleft()
+            pool.ids.discard(question.get('id'))
+
+    def _take(self, pool: _QuestionPool, limit: int) -> List[Dict]:
+        questions = []
+        while pool.entries and len(questions) < limit:
+            _, question = pool.entries.popleft()
+            pool.ids.discard(question.get('id'))
+            questions.append(question)
+        return questions
+
+    def _add(self, pool: _QuestionPool, questions: List[Dict], exclude=()) -> None:
+        now = time.monotonic()
+        for question in questions:
+            question_id = question.get('id')
+            if question_id in pool.ids or question_id in exclude:
+                continue
+            if len(pool.entries) >= self.pool_size:
+                break
+            pool.entries.append((now, question))
+            pool.ids.add(question_id)
+
+    def _fetch(self, key: CacheKey, count: int) -> List[Dict]:
+        category, difficulty, tags = key
+        questions = []
+        while count > 0:
+            batch = self.quiz_api.get_questions(
+                category=category,
+                difficulty=difficulty,
+                limit=min(count, MAX_FETCH_LIMIT),
+                tags=list(tags) or None
+            )
+            if not batch:
+                break
+            questions.extend(batch)
+            count -= len(batch)
+        return questions
+
+    def _maybe_refill(self, key: CacheKey, force: bool = False) -> None:
+        with self._lock:
+            pool = self._get_pool(key)
+            if pool.refilling or (not force and len(pool.entries) >= self.low_watermark):
+                return
+            pool.refilling = True
+        threading.Thread(target=self._refill, args=(key,), daemon=True).start()
+
+    def _refill(self, key: CacheKey) -> None:
+        try:
+            with self._lock:
+                missing = self.pool_size - len(self._get_pool(key).entries)
+            if missing <= 0:
+                return
+            questions = self._fetch(key, missing)
+            with self._lock:
+                self._add(self._get_pool(key), questions)
+            logger.debug(f"Refilled question pool {key} with {len(questions)} questions")
+        except QuizAPIError as e:
+            logger.warning(f"Failed to refill question pool {key}: {e.message}")
+        finally:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is not None:
+                    pool.refilling = False
\ No newline at end of file
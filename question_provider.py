@@ -0,0 +1,276 @@
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+from db.repository import QuestionRepository
+from db.schema import Question
+
+logger = logging.getLogger(__name__)
+
+IndexKey = Tuple[Optional[str], Optional[str]]
+
+# QUESTION_SOURCE values: the QuizAPI through its cache, stored questions
+# topped up from the QuizAPI, or stored questions only
+QUESTION_SOURCES = ("api", "db", "offline")
+
+# Random draws per wanted question before sampling from the unexcluded ids directly
+SAMPLE_DRAWS_PER_QUESTION = 4
+
+# Extra QuestionCache fetches to replace seen questions before repeating some
+MAX_UNSEEN_REFETCHES = 3
+
+
+class QuestionProvider(ABC):
+    """Where QuizGame gets its questions from.
+
+    Questions come back as QuizAPI-style dicts, so every source plugs into
+    the same game code whether it hits the network, the database or memory.
+    Providers serving stored questions set ``supports_exclude`` and skip
+    the question ids in ``exclude`` (e.g. a player's SeenQuestions).
+    """
+
+    supports_exclude = False
+
+    @abstractmethod
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None,
+                      exclude: Optional[Container[int]] = None) -> List[Dict]:
+        """Up to ``limit`` distinct questions matching the filter"""
+
+    def close(self) -> None:
+        pass
+
+
+def to_question(q: Dict) -> Question:
+    """Convert a raw QuizAPI question into a Question ready to be stored"""
+    return Question(
+        id=0,  # Will be set by database
+        question=q.get('question', ''),
+        description=q.get('description', ''),
+        explanation=q.get('explanation', ''),
+        category=q.get('category', 'general'),
+        difficulty=q.get('difficulty', 'medium'),
+        answers=[q['answers'].get(f'answer_{l}', '') for l in "abcdef" if q['answers'].get(f'answer_{l}') is not None],
+        correct_answers=[q['correct_answers'][f'answer_{l}_correct'] == 'true' for l in "abcdef" if f'answer_{l}_correct' in q['correct_answers']]
+    )
+
+
+def question_dict(question: Question) -> Dict:
+    """A stored Question in the QuizAPI format, the inverse of to_question"""
+    letters = "abcdef"
+    return {
+        "id": question.id,
+        "question": question.question,
+        "description": question.description,
+        "explanation": question.explanation,
+        "category": question.category,
+        "difficulty": question.difficulty,
+        "answers": {f"answer_{l}": question.answers[i] if i < len(question.answers) else None
+                    for i, l in enumerate(letters)},
+        # Only as many flags as were stored, so the fingerprint survives the round trip
+        "correct_answers": {f"answer_{l}_correct": "true" if correct else "false"
+                            for l, correct in zip(letters, question.correct_answers)}
+    }
+
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    return value.lower() if value else None
+
+
+class _IdIndex:
+    """Question ids listed under every filter a game can ask for.
+
+    Each id appears under (category, difficulty), (category, None),
+    (None, difficulty) and (None, None), so any filter maps to one
+    prebuilt list and sampling N of them is O(N) however big the bank is.
+    Category and difficulty match case-insensitively, like QuizAPI.
+    """
+
+    def __init__(self, groups: Dict[Tuple[str, str], List[int]]):
+        self.ids: Dict[IndexKey, List[int]] = {}
+        for (category, difficulty), ids in groups.items():
+            category, difficulty = _normalize(category), _normalize(difficulty)
+            for key in ((category, difficulty), (category, None), (None, difficulty), (None, None)):
+                self.ids.setdefault(key, []).extend(ids)
+
+    def sample(self, category: Optional[str], difficulty: Optional[str], limit: int,
+               exclude: Optional[Container[int]] = None) -> List[int]:
+        """Up to ``limit`` random ids matching the filter, none of them in ``exclude``"""
+        ids = self.ids.get((_normalize(category), _normalize(difficulty)), [])
+        if not exclude:
+            return random.sample(ids, min(limit, len(ids)))
+        # Rejection sampling costs O(limit) membership checks while most ids
+        # are still allowed; once they mostly aren't, filter the list once
+        picked: Dict[int, None] = {}
+        for _ in range(min(len(ids), SAMPLE_DRAWS_PER_QUESTION * limit)):
+            question_id = random.choice(ids)
+            if question_id not in exclude:
+                picked[question_id] = None
+                if len(picked) == limit:
+                    return list(picked)
+        allowed = [question_id for question_id in ids if question_id not in exclude and question_id not in picked]
+        return list(picked) + random.sample(allowed, min(limit - len(picked), len(allowed)))
+
+    def pick(self, category: Optional[str], difficulty: Optional[str], limit: int,
+             exclude: Optional[Container[int]] = None) -> List[int]:
+        """sample(), topped up with excluded ids when there aren't enough others"""
+        ids = self.sample(category, difficulty, limit, exclude)
+        if len(ids) < limit and exclude:
+            chosen = set(ids)
+            ids += [question_id for question_id in self.sample(category, difficulty, limit)
+                    if question_id not in chosen][:limit - len(ids)]
+        return ids
+
+
+class InMemoryQuestionProvider(QuestionProvider):
+    """Serves random questions from a fixed set held in memory, e.g. for tests or demos.
+
+    Excluded questions are only repeated once every matching one has been served.
+    """
+
+    supports_exclude = True
+
+    def __init__(self, questions: Iterable[Question]):
+        self.questions = {question.id: question for question in questions}
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for question in self.questions.values():
+            groups.setdefault((question.category, question.difficulty), []).append(question.id)
+        self._index = _IdIndex(groups)
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None,
+                      exclude: Optional[Container[int]] = None) -> List[Dict]:
+        """Tags are ignored; questions aren't stored with them"""
+        return [question_dict(self.questions[question_id])
+                for question_id in self._index.pick(category, difficulty, limit, exclude)]
+
+
+class ApiQuestionProvider(QuestionProvider):
+    """Serves QuizAPI questions from ``question_cache``, skipping ones already seen.
+
+    QuizAPI questions have no stored id, so each batch's fingerprints are
+    resolved to ids with one lookup on the unique fingerprint index. Those
+    in ``exclude`` are dropped and replaced from the cache, up to
+    ``max_refetches`` more times. If the cache keeps returning seen
+    questions, the game is topped up with them rather than cut short.
+    """
+
+    supports_exclude = True
+
+    def __init__(self, question_cache: QuestionProvider, question_repo: QuestionRepository,
+                 max_refetches: int = MAX_UNSEEN_REFETCHES):
+        self.question_cache = question_cache
+        self.question_repo = question_repo
+        self.max_refetches = max_refetches
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None,
+                      exclude: Optional[Container[int]] = None) -> List[Dict]:
+        if not exclude:
+            return self.question_cache.get_questions(category, difficulty, limit, tags)
+        questions: List[Dict] = []
+        seen: List[Dict] = []
+        taken = set()
+        for _ in range(1 + self.max_refetches):
+            batch = self.question_cache.get_questions(category, difficulty, limit - len(questions), tags)
+            if not batch:
+                break
+            fingerprints = [to_question(question).compute_fingerprint() for question in batch]
+            stored = self.question_repo.get_question_ids_by_fingerprints(fingerprints)
+            for question, fingerprint in zip(batch, fingerprints):
+                if fingerprint in taken:
+                    continue
+                taken.add(fingerprint)
+                question_id = stored.get(fingerprint)
+                if question_id is not None and question_id in exclude:
+                    seen.append(question)
+                else:
+                    questions.append(question)
+            if len(questions) >= limit:
+                break
+        return questions + seen[:limit - len(questions)]
+
+
+class DatabaseQuestionProvider(QuestionProvider):
+    """Serves random questions from the ones already stored in ``questions``.
+
+    Only the ids are kept in memory, grouped by category and difficulty
+    and reloaded every ``refresh_interval`` seconds, so picking a game's
+    questions is a random draw from a list followed by one bulk lookup by
+    id (usually answered by the entity cache) instead of an
+    ``ORDER BY random()`` scan. If the bank has fewer matching questions
+    than asked for, the rest come from ``fallback`` (e.g. an
+    ApiQuestionProvider, which is passed ``exclude`` too); without one, games simply get fewer questions and
+    never touch the network. Excluded questions are skipped too, and are
+    only repeated when there is no fallback to get new ones from.
+    """
+
+    supports_exclude = True
+
+    def __init__(self, question_repo: QuestionRepository, fallback: Optional[QuestionProvider] = None,
+                 refresh_interval: float = 300.0):
+        self.question_repo = question_repo
+        self.fallback = fallback
+        self.refresh_interval = refresh_interval
+        self._index: Optional[_IdIndex] = None
+        self._loaded_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      limit: int = 10, tags: Optional[List[str]] = None,
+                      exclude: Optional[Container[int]] = None) -> List[Dict]:
+        """Tags are ignored for stored questions and only passed on to the fallback"""
+        index = self._current_index()
+        if self.fallback is None:
+            ids = index.pick(category, difficulty, limit, exclude)
+        else:
+            ids = index.sample(category, difficulty, limit, exclude)
+        found = self.question_repo.get_questions_by_ids(ids) if ids else {}
+        questions = [question_dict(found[question_id]) for question_id in ids if question_id in found]
+
+        if len(questions) < limit and self.fallback is not None:
+            seen = {question["question"] for question in questions}
+            for question in self.fallback.get_questions(category, difficulty, limit - len(questions), tags, exclude):
+                if question.get("question") not in seen:
+                    questions.append(question)
+                    seen.add(question.get("question"))
+        return questions
+
+    def refresh(self) -> None:
+        """Reload the id index now, e.g. after importing questions"""
+        with self._refresh_lock:
+            self._load()
+
+    def _current_index(self) -> _IdIndex:
+        if self._index is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return self._index
+        # One caller reloads a stale index while the others keep using it
+        if self._refresh_lock.acquire(blocking=self._index is None):
+            try:
+                if self._index is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                    self._load()
+            finally:
+                self._refresh_lock.release()
+        return self._index
+
+    def _load(self) -> None:
+        started = time.monotonic()
+        groups = self.question_repo.get_question_id_index()
+        self._index = _IdIndex(groups)
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Loaded {sum(len(ids) for ids in groups.values())} question ids "
+                     f"in {self._loaded_at - started:.3f}s")
+
+
+def create_provider(source: str, question_repo: QuestionRepository, question_cache: QuestionProvider) -> QuestionProvider:
+    """The provider for a QUESTION_SOURCE value"""
+    if source == "api":
+        return ApiQuestionProvider(question_cache, question_repo)
+    if source == "db":
+        return DatabaseQuestionProvider(question_repo, fallback=ApiQuestionProvider(question_cache, question_repo))
+    if source == "offline":
+        return DatabaseQuestionProvider(question_repo)
+    raise ValueError(f"Unknown question source {source!r}, expected one of {', '.join(QUESTION_SOURCES)}")
@@ -1,6 +1,19 @@
 import requests
-from typing import List, Dict, Optional
+import aiohttp
+import asyncio
+from requests.adapters import HTTPAdapter
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Tuple, Union
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import json
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
 
 class QuizAPIError(Exception):
     def __init__(self, message: str, original_error: Exception = None):
@@ -8,15 +21,168 @@ class QuizAPIError(Exception):
         self.original_error = original_error
         super().__init__(self.message)
 
-class QuizAPI:
-    def __init__(self, api_key: str):
+class CircuitOpenError(QuizAPIError):
+    """Raised without touching the network while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Stops calling the upstream after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    every call fails fast for ``reset_timeout`` seconds. Then a single trial
+    call is let through (half-open): success closes the breaker, failure
+    opens it again.
+
+    allow_request() hands each call a token to pass back with its verdict:
+    0 for calls made while closed, a fresh trial number for the half-open
+    trial. Only the current trial's verdict moves a half-open breaker, so a
+    slow call from before it opened can't close it. A trial that ends
+    without a verdict (e.g. cancelled) gives its slot back with
+    release_trial(); one that never reports back at all is given up after
+    ``trial_timeout`` seconds, if set.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 trial_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = 0  # token of the trial in flight, 0 if none
+        self._trials = 0
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> Optional[int]:
+        """A token for a call that may go ahead, or None while the breaker is open"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = 0
+            if self.state == self.HALF_OPEN and (not self._trial or (
+                    self.trial_timeout is not None and now - self._trial_started_at >= self.trial_timeout)):
+                self._trials += 1
+                self._trial = self._trials
+                self._trial_started_at = now
+                return self._trial
+            return None
+
+    def _owns(self, token: int) -> bool:
+        return token == self._trial if token else self.state == self.CLOSED
+
+    def release_trial(self, token: int) -> None:
+        """Give up a trial without a verdict, e.g. when it was cancelled"""
+        with self._lock:
+            if token and token == self._trial:
+                self._trial = 0
+
+    def record_success(self, token: int = 0) -> None:
+        with self._lock:
+            if not self._owns(token):
+                return
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = 0
+
+    def record_failure(self, token: int = 0) -> None:
+        with self._lock:
+            if not self._owns(token):
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                logger.warning(f"QuizAPI circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial = 0
+
+class _QuizAPIBase:
+    def __init__(self, api_key: str, pool_size: int = 10, connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key
         self.base_url = "https://quizapi.io/api/v1"
         self.headers = {
             "X-Api-Key": self.api_key
         }
+        self.pool_size = pool_size
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        if self.circuit_breaker.trial_timeout is None:
+            # Longest a call can legitimately take: every attempt timing
+            # out, with the longest allowed wait between them
+            self.circuit_breaker.trial_timeout = (
+                (max_retries + 1) * (connect_timeout + read_timeout) + max_retries * backoff_max)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": sleep a random amount up to the exponential cap so that
+        # many clients backing off at once don't retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, headers) -> Optional[float]:
+        value = headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return max(delay, 0.0)
+
+    @staticmethod
+    def _parse_questions(body: Union[str, bytes]) -> List[Dict]:
+        """The question list in a 200 response body; anything else is a QuizAPIError"""
+        try:
+            questions = json.loads(body)
+        except ValueError as e:
+            raise QuizAPIError(f"Failed to fetch questions: invalid JSON in response ({e})", e)
+        if not isinstance(questions, list):
+            raise QuizAPIError(f"Failed to fetch questions: expected a list, got {type(questions).__name__}")
+        return questions
+
+    def _retry_delay(self, status_code: int, headers, attempt: int, token: int) -> Optional[float]:
+        """Delay before retrying a response, or None if it should be returned as is"""
+        if status_code not in RETRY_STATUS_CODES:
+            self.circuit_breaker.record_success(token)
+            return None
+        delay = self._retry_after(headers)
+        if delay is None:
+            delay = self._backoff(attempt)
+        if attempt >= self.max_retries or delay > self.backoff_max:
+            # Out of retries, or the upstream asked us to wait longer
+            # than we are willing to block a game start for
+            self.circuit_breaker.record_failure(token)
+            return None
+        return delay
 
-    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None, 
+class QuizAPI(_QuizAPIBase):
+    def __init__(self, api_key: str, **kwargs):
+        super().__init__(api_key, **kwargs)
+
+        # Keep-alive session so consecutive fetches reuse the TCP+TLS connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
                      limit: int = 10, tags: Optional[List[str]] = None) -> List[Dict]:
         """Fetch questions from QuizAPI"""
         endpoint = f"{self.base_url}/questions"
@@ -26,9 +192,158 @@ class QuizAPI:
             "difficulty": difficulty,
             "tags": tags
         }
-        
-        response = requests.get(endpoint, headers=self.headers, params=params)
+
+        response = self._request(endpoint, params)
         if response.status_code == 200:
-            return response.json()
+            return self._parse_questions(response.content)
         else:
-            raise QuizAPIError(f"Failed to fetch questions: {response.status_code}")
\ No newline at end of file
+            raise QuizAPIError(f"Failed to fetch questions: {response.status_code}")
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _request(self, endpoint: str, params: Dict) -> requests.Response:
+        """GET with jittered exponential backoff on 429/5xx and network errors"""
+        token = self.circuit_breaker.allow_request()
+        if token is None:
+            raise CircuitOpenError("QuizAPI circuit breaker is open, not calling upstream")
+        try:
+            return self._request_with_retries(endpoint, params, token)
+        finally:
+            # No-op once a verdict was recorded
+            self.circuit_breaker.release_trial(token)
+
+    def _request_with_retries(self, endpoint: str, params: Dict, token: int) -> requests.Response:
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(endpoint, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure(token)
+                    raise QuizAPIError(f"Failed to fetch questions: {e}", e)
+                delay = self._backoff(attempt)
+            else:
+                delay = self._retry_delay(response.status_code, response.headers, attempt, token)
+                if delay is None:
+                    return response
+                response.close()
+
+            attempt += 1
+            logger.debug(f"Retrying QuizAPI request in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+class AsyncQuizAPI(_QuizAPIBase):
+    """asyncio counterpart of QuizAPI, for fetching many question sets at once.
+
+    Shares QuizAPI's retry, backoff and circuit breaker behaviour. The
+    underlying aiohttp session is created lazily inside the running loop and
+    must be released with ``close()`` (or ``async with``).
+    """
+
+    def __init__(self, api_key: str, concurrency: int = 8, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.concurrency = concurrency
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncQuizAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def get_questions(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                            limit: int = 10, tags: Optional[List[str]] = None) -> List[Dict]:
+        """Fetch questions from QuizAPI"""
+        endpoint = f"{self.base_url}/questions"
+        # aiohttp rejects None values, and repeats a key for each list item
+        # the same way requests does
+        params = [("limit", str(limit))]
+        if category is not None:
+            params.append(("category", category))
+        if difficulty is not None:
+            params.append(("difficulty", difficulty))
+        for tag in tags or ():
+            params.append(("tags", tag))
+
+        status, body = await self._request(endpoint, params)
+        if status == 200:
+            return self._parse_questions(body)
+        else:
+            raise QuizAPIError(f"Failed to fetch questions: {status}")
+
+    async def get_questions_many(self, queries: Iterable[Dict], concurrency: Optional[int] = None,
+                                 return_exceptions: bool = False) -> AsyncIterator[Tuple[Dict, Union[List[Dict], QuizAPIError]]]:
+        """Fetch several question sets concurrently, yielding them as they complete.
+
+        Each item of ``queries`` holds ``get_questions`` keyword arguments and
+        is yielded back alongside its result. At most ``concurrency`` requests
+        are in flight at once. With ``return_exceptions`` a failed fetch yields
+        its QuizAPIError instead of raising it.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def fetch(kwargs: Dict):
+            async with semaphore:
+                try:
+                    return kwargs, await self.get_questions(**kwargs)
+                except QuizAPIError as e:
+                    if not return_exceptions:
+                        raise
+                    return kwargs, e
+
+        tasks = [asyncio.ensure_future(fetch(kwargs)) for kwargs in queries]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.timeout
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            )
+        return self._session
+
+    async def _request(self, endpoint: str, params: List[Tuple[str, str]]) -> Tuple[int, bytes]:
+        """GET with jittered exponential backoff on 429/5xx and network errors"""
+        token = self.circuit_breaker.allow_request()
+        if token is None:
+            raise CircuitOpenError("QuizAPI circuit breaker is open, not calling upstream")
+        try:
+            return await self._request_with_retries(endpoint, params, token)
+        finally:
+            # No-op once a verdict was recorded; frees the trial if cancelled
+            self.circuit_breaker.release_trial(token)
+
+    async def _request_with_retries(self, endpoint: str, params: List[Tuple[str, str]], token: int) -> Tuple[int, bytes]:
+        session = self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with session.get(endpoint, params=params) as response:
+                    body = await response.read()
+                    status, headers = response.status, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure(token)
+                    raise QuizAPIError(f"Failed to fetch questions: {e!r}", e)
+                delay = self._backoff(attempt)
+            else:
+                delay = self._retry_delay(status, headers, attempt, token)
+                if delay is None:
+                    return status, body
+
+            attempt += 1
+            logger.debug(f"Retrying QuizAPI request in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
\ No newline at end of file
@@ -0,0 +1,447 @@
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from os import environ
+from typing import Dict, List, Optional
+from db.conn import DatabaseConnection, PoolTimeoutError
+from db.async_conn import AsyncDatabaseConnection
+from db.cache import EntityCache, CacheInvalidator
+from db.schema import User, Question
+from db.repository import QuestionRepository, GameSessionRepository
+from db.async_repository import AsyncUserRepository, AsyncGameRepository
+from db.stats import StatsRepository
+from db.answers import AnswerRecorder
+from db.leaderboard import Leaderboard, LeaderboardEntry, LeaderboardListener
+from db.migrate import migrate
+from game_logic import QuizGame
+from question_cache import QuestionCache
+from question_provider import create_provider
+from session_store import GameState, SessionStore
+from quiz_api import QuizAPI, QuizAPIError
+import asyncio
+import contextvars
+import metrics
+import psycopg.errors
+import secrets
+import json
+import logging
+import tracing
+import weakref
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_ROUNDS = 10
+HISTORY_PAGE_SIZE = 20
+LEADERBOARD_SIZE = 10
+LEADERBOARD_RADIUS = 5
+
+# Seconds between sweeps for idle games and logins
+SWEEP_INTERVAL = 60
+# Seconds startup waits for the leaderboard's first load
+LEADERBOARD_LOAD_TIMEOUT = 30
+
+class PlayerSession:
+    __slots__ = ("user_id", "username", "game_id", "last_seen")
+
+    def __init__(self, user: User, last_seen: float):
+        self.user_id = user.id
+        self.username = user.username
+        self.game_id: Optional[int] = None
+        self.last_seen = last_seen
+
+def question_payload(question: Question, number: int, total: int) -> Dict:
+    """What a player sees of a question: no correct answers or explanation"""
+    return {
+        "number": number,
+        "total": total,
+        "question": question.question,
+        "description": question.description,
+        "category": question.category,
+        "difficulty": question.difficulty,
+        "answers": question.answers
+    }
+
+json_response = partial(web.json_response, dumps=partial(json.dumps, default=str))
+
+class QuizServer:
+    """HTTP/JSON front end for the quiz, one in-memory session per logged in player.
+
+    Handlers run on the event loop. Users and games go through the async
+    repositories, which share a few connections between all sessions; the
+    remaining repository calls and question fetches block, so they go to a
+    thread pool sized to the blocking database pool.
+    """
+
+    def __init__(self, api_key: str, db: Optional[DatabaseConnection] = None,
+                 adb: Optional[AsyncDatabaseConnection] = None, question_cache: Optional[QuestionCache] = None,
+                 spill_sessions: Optional[bool] = None,
+                 game_idle_timeout: float = 900.0, login_idle_timeout: float = 86400.0):
+        self.api_key = api_key
+        self.db = db or DatabaseConnection(maxconn=int(environ.get('DB_POOL_SIZE', '20')))
+        self.adb = adb or AsyncDatabaseConnection(maxconn=int(environ.get('ASYNC_DB_POOL_SIZE', '10')))
+        cache_sync = environ.get('ENTITY_CACHE_SYNC', '0') == '1'
+        self.entity_cache = EntityCache(publish=cache_sync)
+        self.cache_invalidator = CacheInvalidator(self.entity_cache, self.db.dsn) if cache_sync else None
+        self.user_repo = AsyncUserRepository(self.adb, self.entity_cache)
+        self.leaderboard = Leaderboard()
+        self.game_repo = AsyncGameRepository(self.adb, self.leaderboard)
+        if spill_sessions is None:
+            spill_sessions = environ.get('SESSION_SPILL', '1') != '0'
+        question_repo = QuestionRepository(self.db, self.entity_cache)
+        self.games = SessionStore(question_repo,
+                                  GameSessionRepository(self.db) if spill_sessions else None,
+                                  max_idle=game_idle_timeout)
+        self.login_idle_timeout = login_idle_timeout
+        self.stats_repo = StatsRepository(self.db)
+        self.answer_recorder = AnswerRecorder(self.db, leaderboard=self.leaderboard)
+        # Applies every process's user_stats changes; this one's games also update it directly
+        self.leaderboard_listener = LeaderboardListener(self.leaderboard, self.db.dsn, self.stats_repo.get_user_totals)
+        # One lock per game being answered, dropped once no request holds it
+        self._game_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.question_cache = question_cache or QuestionCache(QuizAPI(api_key))
+        # QUESTION_SOURCE=db plays stored questions first, offline never calls the QuizAPI
+        self.question_source = environ.get('QUESTION_SOURCE', 'api')
+        self.question_provider = create_provider(self.question_source, question_repo, self.question_cache)
+        self.executor = ThreadPoolExecutor(max_workers=self.db.maxconn, thread_name_prefix="quiz-db")
+        self.sessions: Dict[str, PlayerSession] = {}
+        metrics.registry.register_pool("blocking", self.db)
+        metrics.registry.register_pool("async", self.adb)
+        metrics.registry.register_cache("entity", self.entity_cache)
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.trace_middleware, self.error_middleware])
+        app.add_routes([
+            web.post("/api/register", self.register),
+            web.post("/api/login", self.login),
+            web.post("/api/logout", self.logout),
+            web.post("/api/games", self.start_game),
+            web.get("/api/games/current", self.current_question),
+            web.post("/api/games/current/answer", self.submit_answer),
+            web.get("/api/history", self.history),
+            web.get("/api/dashboard", self.dashboard),
+            web.get("/api/leaderboard", self.leaderboard_top),
+            web.get("/api/leaderboard/me", self.leaderboard_me),
+            web.get("/metrics", self.metrics_text)
+        ])
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking call on the worker pool, in the caller's context so its spans nest under the request"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, partial(context.run, func, *args, **kwargs))
+
+    async def on_startup(self, app: web.Application) -> None:
+        await self.run(migrate, self.db)
+        await self.adb.open()
+        self.leaderboard_listener.start()
+        if not await self.run(self.leaderboard_listener.wait_loaded, LEADERBOARD_LOAD_TIMEOUT):
+            logger.warning("Leaderboard not loaded yet, serving it empty until it is")
+        if self.question_source != "offline":
+            self.question_cache.prefetch()
+        if self.cache_invalidator:
+            self.cache_invalidator.start()
+        self._sweeper = asyncio.create_task(self.sweep())
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        self._sweeper.cancel()
+        if self.cache_invalidator:
+            await self.run(self.cache_invalidator.stop)
+        await self.run(self.leaderboard_listener.stop)
+        await self.run(self.answer_recorder.close)
+        await self.run(self.games.spill_all)
+        self.executor.shutdown(wait=True)
+        self.db.close_all_connections()
+        await self.adb.close()
+        self.question_cache.quiz_api.close()
+
+    async def sweep(self) -> None:
+        """Periodically evict idle games (spilling them if enabled) and stale logins"""
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                await self.run(self.games.evict_idle)
+            except Exception as e:
+                logger.error(f"Failed to evict idle games: {e}")
+            cutoff = asyncio.get_running_loop().time() - self.login_idle_timeout
+            for token in [token for token, session in self.sessions.items() if session.last_seen < cutoff]:
+                del self.sessions[token]
+
+    @web.middleware
+    async def trace_middleware(self, request: web.Request, handler):
+        """One root span per request; game handlers tag it with the game id"""
+        with tracing.span("http.request", method=request.method, path=request.path) as span:
+            response = await handler(request)
+            span.set(status=response.status)
+            return response
+
+    @web.middleware
+    async def error_middleware(self, request: web.Request, handler):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except PoolTimeoutError as e:
+            logger.warning(f"{request.method} {request.path}: {e}")
+            return json_response({"error": "Server busy, try again"}, status=503)
+        except QuizAPIError as e:
+            logger.error(f"{request.method} {request.path}: {e.message}")
+            return json_response({"error": "Question service unavailable"}, status=502)
+        except Exception as e:
+            logger.error(f"{request.method} {request.path}: {e}", exc_info=True)
+            return json_response({"error": "Internal server error"}, status=500)
+
+    async def read_json(self, request: web.Request) -> Dict:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be JSON"}),
+                                     content_type="application/json")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "Body must be a JSON object"}),
+                                     content_type="application/json")
+        return body
+
+    def authenticate(self, request: web.Request) -> PlayerSession:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        session = self.sessions.get(token) if scheme.lower() == "bearer" else None
+        if session is None:
+            raise web.HTTPUnauthorized(text=json.dumps({"error": "Log in first"}),
+                                       content_type="application/json")
+        session.last_seen = asyncio.get_running_loop().time()
+        return session
+
+    async def open_session(self, user: User, resume: bool = False) -> web.Response:
+        token = secrets.token_urlsafe(24)
+        session = PlayerSession(user, asyncio.get_running_loop().time())
+        if resume:
+            game = await self.run(self.games.restore_latest, user.id)
+            if game is not None and not game.is_over():
+                session.game_id = game.game_id
+        self.sessions[token] = session
+        return json_response({"token": token, "user": {"id": user.id, "username": user.username},
+                              "game_id": session.game_id})
+
+    async def active_game(self, session: PlayerSession) -> Optional[GameState]:
+        if session.game_id is None:
+            return None
+        game = self.games.get(session.game_id) or await self.run(self.games.restore, session.game_id)
+        if game is None or game.is_over():
+            session.game_id = None
+            return None
+        return game
+
+    async def question_of(self, game: GameState) -> Question:
+        question_id = game.current_question_id()
+        question = self.games.question(question_id)
+        if question is None:
+            question = (await self.run(self.games.load_questions, [question_id]))[question_id]
+        return question
+
+    async def register(self, request: web.Request) -> web.Response:
+        username = str((await self.read_json(request)).get("username", "")).strip()
+        if not username:
+            return json_response({"error": "Username cannot be empty"}, status=400)
+        if await self.user_repo.get_user_by_username(username):
+            return json_response({"error": "Username already exists"}, status=409)
+        try:
+            user = await self.user_repo.create_user(username)
+        except psycopg.errors.UniqueViolation:
+            # Registered by a concurrent request since the check above
+            return json_response({"error": "Username already exists"}, status=409)
+        if not user:
+            return json_response({"error": "Registration failed"}, status=500)
+        return await self.open_session(user)
+
+    async def login(self, request: web.Request) -> web.Response:
+        username = str((await self.read_json(request)).get("username", "")).strip()
+        if not username:
+            return json_response({"error": "Username cannot be empty"}, status=400)
+        user = await self.user_repo.get_user_by_username(username)
+        if not user:
+            return json_response({"error": "User not found"}, status=404)
+        return await self.open_session(user, resume=True)
+
+    async def logout(self, request: web.Request) -> web.Response:
+        self.authenticate(request)
+        _, _, token = request.headers["Authorization"].partition(" ")
+        self.sessions.pop(token, None)
+        return json_response({"ok": True})
+
+    async def start_game(self, request: web.Request) -> web.Response:
+        session = self.authenticate(request)
+        body = await self.read_json(request)
+        try:
+            rounds = int(body.get("rounds", MAX_ROUNDS))
+        except (TypeError, ValueError):
+            rounds = 0
+        if not 1 <= rounds <= MAX_ROUNDS:
+            return json_response({"error": f"rounds must be between 1 and {MAX_ROUNDS}"}, status=400)
+
+        with tracing.span("game.start", user_id=session.user_id, rounds=rounds) as span:
+            game_logic = QuizGame(self.api_key, question_cache=self.question_cache,
+                                  question_provider=self.question_provider)
+            # Skip questions the player has already had, where the provider can tell
+            seen = await self.user_repo.get_seen_questions(session.user_id) if self.question_provider.supports_exclude else None
+            await self.run(game_logic.start_new_game, body.get("category"), body.get("difficulty"), rounds, seen)
+            questions = game_logic.get_question_models()
+            if not questions:
+                return json_response({"error": "No questions available"}, status=503)
+            game = await self.game_repo.create_game_with_questions(session.user_id, len(questions), questions)
+            if not game:
+                return json_response({"error": "Failed to start game"}, status=500)
+            span.set(game_id=game.id)
+
+        self.games.add(GameState(game.id, session.user_id, [question.id for question in questions]), questions)
+        session.game_id = game.id
+        return json_response({
+            "game_id": game.id,
+            "rounds": len(questions),
+            "question": question_payload(questions[0], 1, len(questions))
+        }, status=201)
+
+    async def current_question(self, request: web.Request) -> web.Response:
+        session = self.authenticate(request)
+        game = await self.active_game(session)
+        if game is None:
+            return json_response({"error": "No game in progress"}, status=404)
+        tracing.current_span().set(game_id=game.game_id)
+        return json_response({
+            "game_id": game.game_id,
+            "score": game.score,
+            "question": question_payload(await self.question_of(game), game.current + 1, game.rounds)
+        })
+
+    async def submit_answer(self, request: web.Request) -> web.Response:
+        """Answer the current question.
+
+        Answers to one game are handled one at a time. Clients send the
+        "number" of the question they are answering as "question": if it
+        isn't the current one any more, e.g. a retried request that was
+        already applied, nothing is recorded and the reply is a 409.
+        """
+        session = self.authenticate(request)
+        body = await self.read_json(request)
+        if session.game_id is None:
+            return json_response({"error": "No game in progress"}, status=404)
+        lock = self._game_locks.setdefault(session.game_id, asyncio.Lock())
+        async with lock:
+            return await self._submit_answer(session, body)
+
+    async def _submit_answer(self, session: PlayerSession, body: Dict) -> web.Response:
+        game = await self.active_game(session)
+        if game is None:
+            return json_response({"error": "No game in progress"}, status=404)
+        tracing.current_span().set(game_id=game.game_id)
+        try:
+            expected = int(body.get("question"))
+        except (TypeError, ValueError):
+            return json_response({"error": "question must be the number of the question being answered"}, status=400)
+        if expected != game.current + 1:
+            return json_response({"error": "That question is not the current one",
+                                  "current": game.current + 1}, status=409)
+        question = await self.question_of(game)
+        try:
+            answer = int(body.get("answer")) - 1  # 1-based like the CLI
+        except (TypeError, ValueError):
+            answer = -1
+        if not 0 <= answer < len(question.answers):
+            return json_response({"error": f"answer must be between 1 and {len(question.answers)}"}, status=400)
+
+        is_correct = question.correct_answers[answer]
+        game.record(is_correct)
+        await self.run(self.answer_recorder.record, game.game_id, question.id, answer, is_correct)
+
+        result = {
+            "correct": is_correct,
+            "correct_answers": [i + 1 for i, correct in enumerate(question.correct_answers)
+                                if correct and i < len(question.answers)],
+            "explanation": question.explanation,
+            "score": game.score,
+            "finished": game.is_over()
+        }
+        if game.is_over():
+            result["saved"] = await self.run(self.answer_recorder.finish_game, game.game_id, game.score)
+            await self.run(self.games.finish, game.game_id)
+            session.game_id = None
+        else:
+            result["question"] = question_payload(await self.question_of(game), game.current + 1, game.rounds)
+        return json_response(result)
+
+    async def history(self, request: web.Request) -> web.Response:
+        session = self.authenticate(request)
+        after = None
+        if "after" in request.query:
+            # Opaque to clients: "<created_at ISO timestamp>,<game id>"
+            try:
+                created_at, game_id = request.query["after"].rsplit(",", 1)
+                after = (datetime.fromisoformat(created_at), int(game_id))
+            except ValueError:
+                return json_response({"error": "Invalid cursor"}, status=400)
+        try:
+            limit = min(max(int(request.query.get("limit", HISTORY_PAGE_SIZE)), 1), 100)
+        except ValueError:
+            return json_response({"error": "Invalid limit"}, status=400)
+
+        games = await self.game_repo.get_games_page(session.user_id, limit, after)
+        next_cursor = None
+        if len(games) == limit:
+            next_cursor = f"{games[-1].created_at.isoformat()},{games[-1].id}"
+        return json_response({
+            "games": [{"id": game.id, "score": game.score, "rounds": game.rounds, "played_on": game.created_at}
+                      for game in games],
+            "next": next_cursor
+        })
+
+    async def dashboard(self, request: web.Request) -> web.Response:
+        self.authenticate(request)
+        return json_response(await self.run(self.stats_repo.get_dashboard))
+
+    async def metrics_text(self, request: web.Request) -> web.Response:
+        """Prometheus text exposition"""
+        return web.Response(text=metrics.registry.render(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def leaderboard_entries(self, entries: List[LeaderboardEntry]) -> List[Dict]:
+        users = await self.user_repo.get_users_by_ids([entry.user_id for entry in entries])
+        return [{"rank": entry.rank, "username": users[entry.user_id].username, "games": entry.total_games,
+                 "correct": entry.total_correct, "questions": entry.total_questions, "accuracy": entry.accuracy}
+                for entry in entries if entry.user_id in users]
+
+    async def leaderboard_top(self, request: web.Request) -> web.Response:
+        self.authenticate(request)
+        try:
+            limit = min(max(int(request.query.get("limit", LEADERBOARD_SIZE)), 1), 100)
+        except ValueError:
+            return json_response({"error": "Invalid limit"}, status=400)
+        return json_response({"players": len(self.leaderboard),
+                              "top": await self.leaderboard_entries(self.leaderboard.top(limit))})
+
+    async def leaderboard_me(self, request: web.Request) -> web.Response:
+        session = self.authenticate(request)
+        try:
+            radius = min(max(int(request.query.get("radius", LEADERBOARD_RADIUS)), 0), 50)
+        except ValueError:
+            return json_response({"error": "Invalid radius"}, status=400)
+        return json_response({"rank": self.leaderboard.rank(session.user_id), "players": len(self.leaderboard),
+                              "around": await self.leaderboard_entries(self.leaderboard.around(session.user_id, radius))})
+
+def main():
+    # METRICS=1 times every repository call and QuizAPI fetch; /metrics
+    # always reports the pools, caches and prepared statements
+    if metrics.enabled():
+        metrics.install()
+    # TRACE_FILE appends a span per request, game step, repository call and
+    # pool checkout there; see python -m tracing for per-game waterfalls
+    tracing.configure()
+    server = QuizServer(environ.get('QUIZ_API_KEY', "Nu4Q4o5IFPwgTUWcEmgWUpwyK06B3yGg3TbmkkTM"))
+    web.run_app(server.create_app(), host=environ.get('SERVER_HOST', '0.0.0.0'),
+                port=int(environ.get('SERVER_PORT', '8080')))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
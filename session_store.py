@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from db.repository import GameSessionRepository, QuestionRepository
+from db.schema import Question
+
+logger = logging.getLogger(__name__)
+
+
+class GameState:
+    """One in-progress game: question ids, a bitmask of correct answers and a cursor.
+
+    Question text lives once in the SessionStore's shared question cache, so
+    a 10-round game costs a couple of hundred bytes here.
+    """
+
+    __slots__ = ("game_id", "user_id", "question_ids", "correct_mask", "current", "last_seen", "spilled")
+
+    def __init__(self, game_id: int, user_id: int, question_ids: Iterable[int],
+                 correct_mask: int = 0, current: int = 0):
+        self.game_id = game_id
+        self.user_id = user_id
+        self.question_ids = array("i", question_ids)
+        self.correct_mask = correct_mask
+        self.current = current
+        self.last_seen = time.monotonic()
+        self.spilled = False  # whether game_sessions may hold a copy
+
+    @property
+    def rounds(self) -> int:
+        return len(self.question_ids)
+
+    @property
+    def score(self) -> int:
+        return bin(self.correct_mask).count("1")
+
+    def is_over(self) -> bool:
+        return self.current >= len(self.question_ids)
+
+    def current_question_id(self) -> Optional[int]:
+        return None if self.is_over() else self.question_ids[self.current]
+
+    def record(self, is_correct: bool) -> None:
+        """Mark the current round answered and move to the next one"""
+        if is_correct:
+            self.correct_mask |= 1 << self.current
+        self.current += 1
+        self.last_seen = time.monotonic()
+
+    def to_row(self) -> tuple:
+        return (self.game_id, self.user_id, list(self.question_ids), self.correct_mask, self.current)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "GameState":
+        game_id, user_id, question_ids, correct_mask, current = row
+        state = cls(game_id, user_id, question_ids, correct_mask, current)
+        state.spilled = True
+        return state
+
+
+class SessionStore:
+    """In-memory store of active games for a server process.
+
+    Games idle for more than ``max_idle`` seconds are evicted by
+    ``evict_idle()``. With a GameSessionRepository they are spilled to
+    Postgres first and transparently restored by ``restore()``; without one
+    they are dropped. Questions are shared between games in an LRU cache of
+    at most ``max_questions`` entries, loaded from the database on a miss.
+
+    Methods that may touch the database (restore, load_questions,
+    evict_idle, spill_all, finish) block; get and question only look in
+    memory.
+    """
+
+    def __init__(self, question_repo: QuestionRepository,
+                 spill_repo: Optional[GameSessionRepository] = None,
+                 max_idle: float = 900.0, max_questions: int = 10000):
+        self.question_repo = question_repo
+        self.spill_repo = spill_repo
+        self.max_idle = max_idle
+        self.max_questions = max_questions
+        self._games: Dict[int, GameState] = {}
+        self._questions: "OrderedDict[int, Question]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.restored = 0
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def add(self, state: GameState, questions: Iterable[Question] = ()) -> None:
+        self.add_questions(questions)
+        with self._lock:
+            self._games[state.game_id] = state
+
+    def get(self, game_id: int) -> Optional[GameState]:
+        with self._lock:
+            state = self._games.get(game_id)
+            if state is not None:
+                state.last_seen = time.monotonic()
+            return state
+
+    def restore(self, game_id: int) -> Optional[GameState]:
+        """get(), falling back to the spilled copy of an evicted game"""
+        state = self.get(game_id)
+        if state is not None or self.spill_repo is None:
+            return state
+        row = self.spill_repo.get_session(game_id)
+        return self._adopt(row)
+
+    def restore_latest(self, user_id: int) -> Optional[GameState]:
+        """The user's most recent spilled unfinished game, e.g. after logging in again"""
+        if self.spill_repo is None:
+            return None
+        return self._adopt(self.spill_repo.get_latest_session(user_id))
+
+    def finish(self, game_id: int) -> None:
+        """Forget a game that is over, including any spilled copy"""
+        with self._lock:
+            state = self._games.pop(game_id, None)
+        if self.spill_repo is not None and (state is None or state.spilled):
+            self.spill_repo.delete_session(game_id)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [state for state in self._games.values() if now - state.last_seen > self.max_idle]
+        return self._evict(idle)
+
+    def spill_all(self) -> int:
+        """Evict every game, e.g. at shutdown, so players can resume elsewhere"""
+        with self._lock:
+            states = list(self._games.values())
+        return self._evict(states)
+
+    def add_questions(self, questions: Iterable[Question]) -> None:
+        with self._lock:
+            for question in questions:
+                self._questions[question.id] = question
+                self._questions.move_to_end(question.id)
+            while len(self._questions) > self.max_questions:
+                self._questions.popitem(last=False)
+
+    def question(self, question_id: int) -> Optional[Question]:
+        with self._lock:
+            question = self._questions.get(question_id)
+            if question is not None:
+                self._questions.move_to_end(question_id)
+            return question
+
+    def load_questions(self, question_ids: List[int]) -> Dict[int, Question]:
+        """Questions by id, loading the ones not in memory in one query"""
+        found, missing = {}, []
+        for question_id in question_ids:
+            question = self.question(question_id)
+            if question is None:
+                missing.append(question_id)
+            else:
+                found[question_id] = question
+        if missing:
+            loaded = self.question_repo.get_questions_by_ids(missing)
+            self.add_questions(loaded.values())
+            found.update(loaded)
+        return found
+
+    def _adopt(self, row: Optional[tuple]) -> Optional[GameState]:
+        if row is None:
+            return None
+        state = GameState.from_row(row)
+        with self._lock:
+            # Another request may have restored it in the meantime
+            state = self._games.setdefault(state.game_id, state)
+            state.last_seen = time.monotonic()
+        self.restored += 1
+        return state
+
+    def _evict(self, states: List[GameState]) -> int:
+        if not states:
+            return 0
+        with self._lock:
+            snapshot = [(state, state.last_seen) for state in states]
+        if self.spill_repo is not None:
+            # If spilling fails the games simply stay in memory
+            self.spill_repo.save_sessions([state.to_row() for state in states])
+            for state in states:
+                state.spilled = True
+        evicted = 0
+        with self._lock:
+            for state, last_seen in snapshot:
+                # A game touched while it was being spilled stays; its spilled
+                # copy is overwritten the next time it is evicted
+                if self._games.get(state.game_id) is state and state.last_seen == last_seen:
+                    del self._games[state.game_id]
+                    evicted += 1
+        self.evicted += evicted
+        logger.info(f"Evicted {evicted} idle game session(s)")
+        return evicted
\ No newline at end of file
@@ -0,0 +1,246 @@
+from contextvars import ContextVar
+from os import environ
+from typing import Dict, Iterable, List, Optional
+import argparse
+import functools
+import inspect
+import json
+import random
+import threading
+import time
+
+# Spans are only built once an exporter is configured (TRACE_FILE); until
+# then span() hands back a shared no-op and costs a single attribute check.
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start", "duration", "error", "_started")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict):
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class _NullSpan:
+    """Stands in for a span while tracing is off"""
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+NULL_SPAN = _NullSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class JsonLinesExporter:
+    """Appends each finished span to a file as one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class _SpanContext:
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.finish()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self.token)
+        self.tracer.exporter.export(self.span)
+
+class Tracer:
+    """Nested spans that follow the current thread or asyncio task.
+
+    The active span lives in a context variable, so spans opened inside
+    it, including in awaited coroutines, become its children. Work handed
+    to other threads keeps its parent only if it runs in a copy of the
+    caller's context (contextvars.copy_context().run).
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    def span(self, name: str, **attributes):
+        """Context manager timing a span; use as ``with tracer.span("name", key=value) as span:``"""
+        if self.exporter is None:
+            return NULL_SPAN
+        return _SpanContext(self, Span(name, _current.get(), attributes))
+
+    def current(self):
+        """The active span, or a no-op stand-in when there is none"""
+        return _current.get() or NULL_SPAN
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+
+tracer = Tracer()
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+def current_span():
+    return tracer.current()
+
+def traced(name: Optional[str] = None):
+    """Decorator running each call of a function, sync or async, in a span named ``name`` (default: its qualname)"""
+    def decorate(func):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return func(*args, **kwargs)
+        wrapper.traced = True
+        return wrapper
+    return decorate
+
+def instrument(cls, methods: Optional[Iterable[str]] = None):
+    """Trace the public methods of ``cls`` (or just ``methods``) as "<class>.<method>" spans"""
+    if methods is None:
+        methods = [name for name, member in vars(cls).items()
+                   if inspect.isfunction(member) and not name.startswith(("_", "iter_"))
+                   and not inspect.isgeneratorfunction(member)]
+    for name in methods:
+        func = getattr(cls, name)
+        if not getattr(func, "traced", False):
+            setattr(cls, name, traced(f"{cls.__name__}.{name}")(func))
+    return cls
+
+def install() -> None:
+    """Trace every repository call, question fetch, answer flush and blocking pool checkout"""
+    # Imported here since game_logic and server import this module
+    from db.answers import AnswerRecorder
+    from db.async_repository import AsyncUserRepository, AsyncQuestionRepository, AsyncGameRepository
+    from db.conn import DatabaseConnection
+    from db.repository import UserRepository, QuestionRepository, GameRepository, GameSessionRepository
+    from db.stats import StatsRepository
+    from question_cache import QuestionCache
+    from question_provider import ApiQuestionProvider, DatabaseQuestionProvider, InMemoryQuestionProvider
+    from quiz_api import QuizAPI, AsyncQuizAPI
+    for cls in (UserRepository, QuestionRepository, GameRepository, GameSessionRepository, StatsRepository,
+                AsyncUserRepository, AsyncQuestionRepository, AsyncGameRepository):
+        instrument(cls)
+    for cls in (QuizAPI, AsyncQuizAPI, QuestionCache, ApiQuestionProvider, DatabaseQuestionProvider,
+                InMemoryQuestionProvider):
+        instrument(cls, ["get_questions"])
+    instrument(AnswerRecorder, ["finish_game", "flush"])
+    instrument(DatabaseConnection, ["get_connection"])
+
+def configure() -> bool:
+    """Start exporting spans to TRACE_FILE, if set. Returns whether tracing is on"""
+    path = environ.get('TRACE_FILE')
+    if not path:
+        return False
+    tracer.exporter = JsonLinesExporter(path)
+    install()
+    return True
+
+def load_traces(path: str) -> Dict[str, List[Dict]]:
+    """Spans in a JSON-lines file, grouped by trace id"""
+    traces: Dict[str, List[Dict]] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                span_data = json.loads(line)
+                traces.setdefault(span_data["trace_id"], []).append(span_data)
+    return traces
+
+def print_waterfall(spans: List[Dict], width: int = 40) -> None:
+    """One trace as an indented tree with offsets, durations and a timeline bar"""
+    spans = sorted(spans, key=lambda s: s["start"])
+    ids = {s["span_id"] for s in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for s in spans:
+        # Spans whose parent wasn't exported (e.g. still open) hang off the top
+        children.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+    begin = spans[0]["start"]
+    total = max(s["start"] + s["duration"] for s in spans) - begin or 1e-9
+    print(f"trace {spans[0]['trace_id']}  {total * 1000:.1f}ms")
+
+    def show(s: Dict, depth: int) -> None:
+        offset = s["start"] - begin
+        left = int(offset / total * width)
+        bar = " " * left + "#" * max(1, int(s["duration"] / total * width))
+        attributes = " ".join(f"{key}={value}" for key, value in s["attributes"].items())
+        error = f"  ERROR {s['error']}" if s["error"] else ""
+        print(f"{offset * 1000:>9.1f}ms {s['duration'] * 1000:>9.1f}ms |{bar[:width]:<{width}}| "
+              f"{'  ' * depth}{s['name']} {attributes}{error}".rstrip())
+        for child in children.get(s["span_id"], ()):
+            show(child, depth + 1)
+
+    for root in children.get(None, ()):
+        show(root, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Print trace waterfalls from a TRACE_FILE")
+    parser.add_argument("file", help="JSON-lines span file")
+    parser.add_argument("--game", type=int, help="only traces that touched this game id")
+    parser.add_argument("--last", type=int, default=5, help="show the N most recent traces (default 5)")
+    args = parser.parse_args()
+
+    traces = list(load_traces(args.file).values())
+    if args.game is not None:
+        traces = [spans for spans in traces
+                  if any(s["attributes"].get("game_id") == args.game for s in spans)]
+    traces.sort(key=lambda spans: min(s["start"] for s in spans))
+    for spans in traces[-args.last:] if args.game is None else traces:
+        print_waterfall(spans)
+        print()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file